@@ -1,117 +1,152 @@
 from fastapi import APIRouter, HTTPException, Path, Body
 from fastapi.responses import FileResponse
 from typing import List, Optional, Set
-import os, pickle, base64, io, datetime, csv, uuid
+import os, pickle, base64, io, datetime, csv, uuid, threading, time
 import numpy as np
 from pydantic import BaseModel
 from PIL import Image
-import face_recognition
-
-# 可选导入dlib相关模块
-try:
-    import dlib
-    import cv2
-    from scipy.spatial import distance as dist
-    DLIB_AVAILABLE = True
-    print("dlib模块导入成功")
-except ImportError as e:
-    DLIB_AVAILABLE = False
-    print(f"dlib模块导入失败: {e}")
-    print("眨眼检测功能将使用模拟模式")
+from app.core.startup import lazy_module, module_available, record_lazy_load, register_warmup
+
+# face_recognition、dlib、cv2、scipy 在首次使用时才导入，不拖慢服务启动
+face_recognition = lazy_module("face_recognition")
+dlib = lazy_module("dlib")
+cv2 = lazy_module("cv2")
+dist = lazy_module("scipy.spatial.distance")
 
 router = APIRouter()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# 初始化dlib的人脸检测器和关键点预测器
+# dlib的人脸检测器和关键点预测器，首次眨眼检测时初始化
 detector = None
 predictor_path = None
 predictor = None
+_dlib_available = None
+_dlib_lock = threading.Lock()
 
-if DLIB_AVAILABLE:
-    try:
-        detector = dlib.get_frontal_face_detector()
-        # 构建模型文件路径，尝试多个可能的位置
-        possible_paths = [
-            os.path.join(BASE_DIR, "..", "..", "models", "shape_predictor_68_face_landmarks.dat"),
-            os.path.join(BASE_DIR, "models", "shape_predictor_68_face_landmarks.dat"),
-            os.path.join(os.path.dirname(BASE_DIR), "models", "shape_predictor_68_face_landmarks.dat"),
-        ]
-        
-        for path in possible_paths:
-            abs_path = os.path.abspath(path)
-            if os.path.exists(abs_path):
-                # 处理中文路径问题：使用原始字节路径
+
+def _find_predictor_path() -> Optional[str]:
+    """查找人脸关键点模型文件，尝试多个可能的位置"""
+    possible_paths = [
+        os.path.join(BASE_DIR, "..", "..", "models", "shape_predictor_68_face_landmarks.dat"),
+        os.path.join(BASE_DIR, "models", "shape_predictor_68_face_landmarks.dat"),
+        os.path.join(os.path.dirname(BASE_DIR), "models", "shape_predictor_68_face_landmarks.dat"),
+    ]
+    
+    for path in possible_paths:
+        abs_path = os.path.abspath(path)
+        if os.path.exists(abs_path):
+            # 处理中文路径问题：使用原始字节路径
+            try:
+                # 尝试使用UTF-8编码
+                return abs_path.encode('utf-8').decode('utf-8')
+            except UnicodeError:
+                # 如果UTF-8失败，尝试使用短路径名
                 try:
-                    # 尝试使用UTF-8编码
-                    predictor_path = abs_path.encode('utf-8').decode('utf-8')
-                    break
-                except UnicodeError:
-                    # 如果UTF-8失败，尝试使用短路径名
-                    try:
-                        import win32api
-                        predictor_path = win32api.GetShortPathName(abs_path)
-                        break
-                    except ImportError:
-                        # 如果win32api不可用，使用原路径
-                        predictor_path = abs_path
-                        break
-        
-        if predictor_path:
-            print(f"dlib检测器初始化成功，模型路径: {predictor_path}")
-        else:
-            print(f"找不到模型文件，尝试的路径: {[os.path.abspath(p) for p in possible_paths]}")
-            DLIB_AVAILABLE = False
-    except Exception as e:
-        print(f"dlib检测器初始化失败: {e}")
-        DLIB_AVAILABLE = False
+                    import win32api
+                    return win32api.GetShortPathName(abs_path)
+                except ImportError:
+                    # 如果win32api不可用，使用原路径
+                    return abs_path
+    
+    print(f"找不到模型文件，尝试的路径: {[os.path.abspath(p) for p in possible_paths]}")
+    return None
+
+
+def dlib_available() -> bool:
+    """
+    dlib眨眼检测是否可用（首次调用时导入dlib并初始化人脸检测器）
+    
+    dlib、cv2、scipy 未安装或找不到模型文件时返回False，眨眼检测使用模拟模式
+    """
+    global _dlib_available, detector, predictor_path
+    if _dlib_available is not None:
+        return _dlib_available
+    with _dlib_lock:
+        if _dlib_available is None:
+            missing = [name for name in ("dlib", "cv2", "scipy") if not module_available(name)]
+            if missing:
+                print(f"dlib模块导入失败: 缺少 {missing}")
+                print("眨眼检测功能将使用模拟模式")
+                _dlib_available = False
+                return _dlib_available
+            try:
+                detector = dlib.get_frontal_face_detector()
+                predictor_path = _find_predictor_path()
+                if predictor_path:
+                    print(f"dlib检测器初始化成功，模型路径: {predictor_path}")
+                _dlib_available = predictor_path is not None
+            except Exception as e:
+                print(f"dlib检测器初始化失败: {e}")
+                _dlib_available = False
+    return _dlib_available
 
 def get_predictor():
     """延迟加载dlib预测器"""
     global predictor
-    if not DLIB_AVAILABLE:
+    if not dlib_available():
         raise HTTPException(500, "dlib模块不可用")
     
     if predictor is None:
-        if not predictor_path:
-            raise HTTPException(500, "模型文件路径未设置")
-            
-        if not os.path.exists(predictor_path):
-            raise HTTPException(500, f"模型文件不存在: {predictor_path}")
-            
-        # 检查文件权限
-        if not os.access(predictor_path, os.R_OK):
-            raise HTTPException(500, f"模型文件无读取权限: {predictor_path}")
-            
+        with _dlib_lock:
+            if predictor is None:
+                predictor = _load_predictor()
+    return predictor
+
+def _load_predictor():
+    """加载人脸关键点模型文件"""
+    if not predictor_path:
+        raise HTTPException(500, "模型文件路径未设置")
+        
+    if not os.path.exists(predictor_path):
+        raise HTTPException(500, f"模型文件不存在: {predictor_path}")
+        
+    # 检查文件权限
+    if not os.access(predictor_path, os.R_OK):
+        raise HTTPException(500, f"模型文件无读取权限: {predictor_path}")
+        
+    started = time.perf_counter()
+    try:
+        print(f"正在加载模型文件: {predictor_path}")
+        print(f"文件大小: {os.path.getsize(predictor_path)} bytes")
+        
+        # 尝试不同的方式加载模型
         try:
-            print(f"正在加载模型文件: {predictor_path}")
-            print(f"文件大小: {os.path.getsize(predictor_path)} bytes")
-            
-            # 尝试不同的方式加载模型
+            loaded = dlib.shape_predictor(str(predictor_path))
+        except Exception as e1:
+            print(f"第一次加载失败: {e1}")
+            # 尝试使用字节路径
             try:
-                predictor = dlib.shape_predictor(str(predictor_path))
-            except Exception as e1:
-                print(f"第一次加载失败: {e1}")
-                # 尝试使用字节路径
-                try:
-                    predictor = dlib.shape_predictor(predictor_path.encode('utf-8'))
-                except Exception as e2:
-                    print(f"第二次加载失败: {e2}")
-                    # 最后尝试：复制文件到临时位置
-                    import tempfile
-                    import shutil
-                    temp_dir = tempfile.gettempdir()
-                    temp_path = os.path.join(temp_dir, "shape_predictor_68_face_landmarks.dat")
-                    shutil.copy2(predictor_path, temp_path)
-                    predictor = dlib.shape_predictor(temp_path)
-                    print(f"使用临时文件加载成功: {temp_path}")
-                    
-            print("模型加载成功")
-        except Exception as e:
-            error_msg = f"无法加载人脸关键点模型: {str(e)}"
-            print(f"模型加载失败: {error_msg}")
-            raise HTTPException(500, error_msg)
-    return predictor
+                loaded = dlib.shape_predictor(predictor_path.encode('utf-8'))
+            except Exception as e2:
+                print(f"第二次加载失败: {e2}")
+                # 最后尝试：复制文件到临时位置
+                import tempfile
+                import shutil
+                temp_dir = tempfile.gettempdir()
+                temp_path = os.path.join(temp_dir, "shape_predictor_68_face_landmarks.dat")
+                shutil.copy2(predictor_path, temp_path)
+                loaded = dlib.shape_predictor(temp_path)
+                print(f"使用临时文件加载成功: {temp_path}")
+                
+        print("模型加载成功")
+    except Exception as e:
+        error_msg = f"无法加载人脸关键点模型: {str(e)}"
+        print(f"模型加载失败: {error_msg}")
+        record_lazy_load("shape_predictor_68_face_landmarks", started, error_msg)
+        raise HTTPException(500, error_msg)
+    record_lazy_load("shape_predictor_68_face_landmarks", started)
+    return loaded
+
+
+def _warmup_face_models():
+    """预热：导入face_recognition，初始化dlib检测器并加载关键点模型"""
+    face_recognition.load()
+    if dlib_available():
+        get_predictor()
+
+
+register_warmup("face_models", _warmup_face_models)
 
 DATA_DIR = os.path.join(BASE_DIR, "..", "..", "..", "faces_data")
 IMAGES_DIR = os.path.join(DATA_DIR, "faces_images")
@@ -204,7 +239,7 @@ def dataurl_to_ndarray(data_url: str) -> np.ndarray:
 
 def eye_aspect_ratio(eye):
     """计算眼部纵横比(EAR)"""
-    if not DLIB_AVAILABLE:
+    if not dlib_available():
         return 0.3  # 默认值
     
     # 计算垂直方向的眼部距离
@@ -230,7 +265,7 @@ def detect_blink(image_array):
     # EAR阈值 - 降低敏感度
     EAR_THRESHOLD = 0.21  # 从默认的0.3降低到0.21，减少误检
     
-    if not DLIB_AVAILABLE:
+    if not dlib_available():
         # 降级模式：返回更保守的模拟数据
         import random
         # 减少随机眨眼的概率，从20%降低到5%
@@ -453,7 +488,7 @@ async def detect_blink_api(body: BlinkDetectionBody):
     """检测图像中的眨眼动作"""
     try:
         print(f"收到眨眼检测请求，图像数据长度: {len(body.image) if body.image else 'None'}")
-        print(f"dlib可用状态: {DLIB_AVAILABLE}")
+        print(f"dlib可用状态: {dlib_available()}")
         
         # 启用眨眼检测（会自动降级到模拟模式如果dlib不可用）
         img = dataurl_to_ndarray(body.image)
@@ -0,0 +1,245 @@
+"""
+延迟加载、启动耗时统计与启动预热
+
+- lazy_module: 重型依赖（face_recognition、dlib、cv2、scipy 等）在首次使用时才导入，
+  不再拖慢 worker 启动
+- phase: 记录启动各阶段（导入路由、创建应用等）的耗时
+- 预热：服务开始接收请求后，按预热配置在后台线程中预加载模块、模型、热点时间窗口的数据
+  并预先计算热力图和分析结果；预热完成前 readiness() 报告未就绪，负载均衡不会把流量转发到冷的 worker
+- startup_report: 启动耗时、各阶段耗时、延迟加载和预热耗时的汇总
+
+预热配置为 JSON 文件（默认 backend/warmup.json，可通过环境变量 APP_WARMUP_CONFIG 指定）：
+
+    {
+        "modules": ["sklearn.cluster", "geopy.distance"],
+        "tasks": ["face_models"],
+        "traffic": {
+            "windows": [{"start": "2013-09-13T08:00:00", "end": "2013-09-13T10:00:00"}, {"last_hours": 6}],
+            "heatmap_resolutions": [0.001],
+            "analyses": [{"path": "/stats", "params": {"group_by": "hour"}}]
+        }
+    }
+
+- modules: 预先导入的模块
+- tasks: 预先执行的已登记预热任务（register_warmup）；不配置时，设置 APP_WARMUP=1 则执行全部已登记任务
+- 其余每一节交给 WARMUP_HANDLERS 中对应的处理函数（首次用到时才导入）
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+# 服务启动后是否在后台执行全部已登记的预热任务，可通过环境变量 APP_WARMUP 调整（1 启用）
+WARMUP_ENABLED = os.environ.get("APP_WARMUP", "0") == "1"
+# 预热配置文件路径，可通过环境变量 APP_WARMUP_CONFIG 调整
+WARMUP_CONFIG_PATH = os.environ.get(
+    "APP_WARMUP_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "warmup.json")
+)
+# 预热配置中各节的处理函数（"模块:函数"），处理函数接收该节的配置
+WARMUP_HANDLERS = {
+    "traffic": "detect.traffic_visualization.warmup:warmup",
+}
+
+_boot_started = time.perf_counter()
+_boot_finished: Optional[float] = None
+_phases: List[Dict[str, Any]] = []
+_lazy_loads: List[Dict[str, Any]] = []
+_warmups: List[Dict[str, Any]] = []
+_warmup_tasks: List[tuple] = []
+_warmup_state = {'status': 'pending', 'stage': None, 'done': 0, 'total': 0}
+_ready = threading.Event()
+_lock = threading.Lock()
+
+
+def _record(target: List[Dict[str, Any]], name: str, started: float, error: str = None):
+    entry = {'name': name, 'seconds': round(time.perf_counter() - started, 4)}
+    if error is not None:
+        entry['error'] = error
+    with _lock:
+        target.append(entry)
+
+
+@contextmanager
+def phase(name: str):
+    """记录一个启动阶段的耗时"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(_phases, name, started)
+
+
+def module_available(name: str) -> bool:
+    """模块是否已安装（只查找，不导入）"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule(ModuleType):
+    """首次访问属性时才导入的模块代理，导入耗时计入启动报告"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+        self.__dict__['_load_lock'] = threading.Lock()
+        self.__dict__['_error'] = None
+
+    def load(self) -> ModuleType:
+        """导入模块（只导入一次）"""
+        module = self.__dict__['_module']
+        if module is not None:
+            return module
+        with self.__dict__['_load_lock']:
+            if self.__dict__['_error'] is not None:
+                # 未安装的模块只尝试导入一次
+                raise ImportError(self.__dict__['_error'])
+            if self.__dict__['_module'] is None:
+                started = time.perf_counter()
+                try:
+                    self.__dict__['_module'] = importlib.import_module(self.__name__)
+                except ImportError as e:
+                    self.__dict__['_error'] = str(e)
+                    _record(_lazy_loads, self.__name__, started, str(e))
+                    raise
+                _record(_lazy_loads, self.__name__, started)
+        return self.__dict__['_module']
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+
+def lazy_module(name: str) -> LazyModule:
+    """
+    延迟导入模块
+
+    Args:
+        name: 模块名（如 "cv2"、"scipy.spatial.distance"）
+
+    Returns:
+        模块代理，首次访问属性时导入；模块未安装时在那时抛出 ImportError
+    """
+    return LazyModule(name)
+
+
+def record_lazy_load(name: str, started: float, error: str = None):
+    """记录一次延迟加载（如模型文件）的耗时，started 为 time.perf_counter() 的起始值"""
+    _record(_lazy_loads, name, started, error)
+
+
+def register_warmup(name: str, func: Callable[[], Any]):
+    """登记预热任务：预热配置的 tasks 中列出（或设置 APP_WARMUP=1）时，服务启动后在后台线程中执行"""
+    _warmup_tasks.append((name, func))
+
+
+def load_warmup_config(path: str = None) -> Dict[str, Any]:
+    """读取预热配置，文件不存在时返回空配置"""
+    path = path or WARMUP_CONFIG_PATH
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"无法读取预热配置 {path}: {str(e)}")
+        return {}
+
+
+def _resolve_handler(spec: str) -> Callable[[Any], Any]:
+    module_name, func_name = spec.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _plan_warmup(config: Dict[str, Any]) -> List[tuple]:
+    """把预热配置展开为 (名称, 函数) 列表"""
+    steps = [
+        (f"module:{name}", LazyModule(name).load) for name in config.get('modules', [])
+    ]
+    registered = dict(_warmup_tasks)
+    if 'tasks' in config:
+        task_names = config['tasks']
+    else:
+        task_names = list(registered) if WARMUP_ENABLED else []
+    for name in task_names:
+        if name not in registered:
+            print(f"未知的预热任务: {name}")
+            continue
+        steps.append((f"task:{name}", registered[name]))
+    for section, spec in WARMUP_HANDLERS.items():
+        if config.get(section):
+            steps.append((section, lambda spec=spec, section=section: _resolve_handler(spec)(config[section])))
+    return steps
+
+
+def _run_warmup(steps: List[tuple]):
+    _warmup_state.update(status='running', total=len(steps))
+    for name, func in steps:
+        _warmup_state['stage'] = name
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"预热 {name} 失败: {str(e)}")
+            _record(_warmups, name, started, str(e))
+        else:
+            _record(_warmups, name, started)
+        _warmup_state['done'] += 1
+    # 预热失败不影响就绪：未预热的部分在首次请求时再加载
+    _warmup_state.update(status='finished', stage=None)
+    _ready.set()
+    print(f"后台预热完成，共 {len(steps)} 项")
+
+
+def mark_started():
+    """服务开始接收请求时调用：记录启动总耗时，有预热内容时启动后台预热线程，否则直接就绪"""
+    global _boot_finished
+    _boot_finished = time.perf_counter()
+    print(f"服务启动耗时 {_boot_finished - _boot_started:.3f} 秒")
+    for entry in _phases:
+        print(f"  {entry['name']}: {entry['seconds']:.3f} 秒")
+    steps = _plan_warmup(load_warmup_config())
+    if not steps:
+        _warmup_state['status'] = 'skipped'
+        _ready.set()
+        return
+    threading.Thread(target=_run_warmup, args=(steps,), name="app-warmup", daemon=True).start()
+
+
+def is_ready() -> bool:
+    """服务是否就绪（已启动且预热完成）"""
+    return _ready.is_set()
+
+
+def readiness() -> Dict[str, Any]:
+    """就绪状态：是否就绪及预热进度"""
+    return {'ready': is_ready(), 'warmup': dict(_warmup_state)}
+
+
+def startup_report() -> Dict[str, Any]:
+    """启动耗时报告：总耗时、各启动阶段、首次使用时的延迟加载和后台预热的耗时"""
+    boot_seconds = None
+    if _boot_finished is not None:
+        boot_seconds = round(_boot_finished - _boot_started, 4)
+    with _lock:
+        return {
+            'boot_seconds': boot_seconds,
+            'phases': list(_phases),
+            'lazy_loads': list(_lazy_loads),
+            'warmup': {
+                **_warmup_state,
+                'registered_tasks': [name for name, _ in _warmup_tasks],
+                'finished': list(_warmups),
+            },
+        }
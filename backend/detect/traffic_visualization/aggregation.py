@@ -0,0 +1,205 @@
+"""
+外存聚合
+逐批遍历查询范围内的全部数据，每批计算部分聚合结果后合并，
+得到完整时间范围上的精确结果（不截断、不采样），内存占用只与分组数和去重值个数有关
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .streaming import time_groups, TIME_GROUP_FORMATS
+
+# 支持的聚合操作
+AGGREGATION_OPS = ('count', 'sum', 'mean', 'min', 'max', 'distinct', 'histogram')
+
+# 全部数据视为一个分组时使用的键
+TOTAL_GROUP = 'all'
+
+
+class AggregationSpec:
+    """一个聚合指标：操作、列，以及直方图的分箱边界"""
+
+    def __init__(self, op: str, column: str = None, bins: List[float] = None):
+        if op not in AGGREGATION_OPS:
+            raise ValueError(f"不支持的聚合操作: {op}")
+        if op != 'count' and not column:
+            raise ValueError(f"聚合操作 {op} 需要指定列")
+        if op == 'histogram' and (bins is None or len(bins) < 2):
+            raise ValueError("直方图需要至少两个分箱边界")
+        self.op = op
+        self.column = column
+        self.bins = np.asarray(bins, dtype=np.float64) if bins is not None else None
+
+    @classmethod
+    def parse(cls, text: str) -> Tuple[str, 'AggregationSpec']:
+        """
+        解析文本形式的聚合指标
+
+        格式: count | sum:列 | mean:列 | min:列 | max:列 | distinct:列 | histogram:列:最小值:最大值:分箱数
+
+        Returns:
+            (指标名, 聚合指标)
+        """
+        parts = text.strip().split(':')
+        op = parts[0]
+        if op == 'histogram':
+            if len(parts) != 5:
+                raise ValueError("直方图格式应为 histogram:列:最小值:最大值:分箱数")
+            low, high, count = float(parts[2]), float(parts[3]), int(parts[4])
+            return text.strip(), cls(op, parts[1], np.linspace(low, high, count + 1).tolist())
+        return text.strip(), cls(op, parts[1] if len(parts) > 1 else None)
+
+
+class _GroupState:
+    """单个分组上某个指标的部分聚合状态"""
+
+    __slots__ = ('count', 'sum', 'min', 'max', 'values', 'hist')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.values = set()
+        self.hist = None
+
+
+class OutOfCoreAggregator:
+    """
+    对 TrafficDataProcessor.iter_chunks 的输出做分块聚合
+
+    每个批次先在批内按分组计算部分结果（计数、求和、最值、去重集合、直方图计数），
+    再合并到全局状态；均值由合并后的和与计数得出，因此结果与一次性计算完全一致
+    """
+
+    def __init__(self, specs: Dict[str, AggregationSpec], group_by: Optional[str] = None):
+        """
+        初始化聚合器
+
+        Args:
+            specs: 指标名到聚合指标的映射
+            group_by: 时间分组方式（hour, day, week, month），None表示不分组
+        """
+        if group_by is not None and group_by not in TIME_GROUP_FORMATS:
+            raise ValueError(f"不支持的分组方式: {group_by}")
+        self.specs = specs
+        self.group_by = group_by
+        self.rows = 0
+        self._states: Dict[Any, Dict[str, _GroupState]] = {}
+
+    @property
+    def required_columns(self) -> List[str]:
+        """聚合需要读取的列（总是包含 UTC：只计数时也要读出带行数的批次）"""
+        columns = {spec.column for spec in self.specs.values() if spec.column}
+        columns.add('UTC')
+        return sorted(columns)
+
+    def update(self, chunk: pd.DataFrame):
+        """合并一个数据批次的部分聚合结果"""
+        if chunk.empty:
+            return
+        self.rows += len(chunk)
+        if self.group_by is None:
+            self._update_group(TOTAL_GROUP, chunk)
+            return
+        groups = time_groups(chunk['UTC'], self.group_by)
+        for key, index in pd.Series(np.arange(len(chunk))).groupby(groups).indices.items():
+            self._update_group(int(key), chunk.iloc[index])
+
+    def _update_group(self, key, chunk: pd.DataFrame):
+        """在一个分组上合并一批数据"""
+        states = self._states.setdefault(key, {name: _GroupState() for name in self.specs})
+        for name, spec in self.specs.items():
+            state = states[name]
+            if spec.op == 'count':
+                state.count += len(chunk)
+                continue
+
+            column = chunk[spec.column]
+            if spec.op == 'distinct':
+                if isinstance(column.dtype, pd.CategoricalDtype):
+                    # 字典编码列先对整数编码去重，只解码批内出现过的取值
+                    codes = column.cat.codes.to_numpy()
+                    codes = np.unique(codes[codes >= 0])
+                    state.values.update(column.cat.categories[codes].tolist())
+                else:
+                    state.values.update(column.dropna().unique().tolist())
+                continue
+
+            values = column.to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            if spec.op in ('sum', 'mean'):
+                state.sum += float(values.sum())
+                state.count += len(values)
+            elif spec.op == 'min':
+                state.min = float(values.min()) if state.min is None else min(state.min, float(values.min()))
+            elif spec.op == 'max':
+                state.max = float(values.max()) if state.max is None else max(state.max, float(values.max()))
+            elif spec.op == 'histogram':
+                counts, _ = np.histogram(values, bins=spec.bins)
+                state.hist = counts if state.hist is None else state.hist + counts
+
+    def _result_of(self, spec: AggregationSpec, state: _GroupState):
+        """由合并后的状态得到一个指标的结果"""
+        if spec.op == 'count':
+            return state.count
+        if spec.op == 'sum':
+            return state.sum
+        if spec.op == 'mean':
+            return state.sum / state.count if state.count else None
+        if spec.op == 'min':
+            return state.min
+        if spec.op == 'max':
+            return state.max
+        if spec.op == 'distinct':
+            return len(state.values)
+        counts = state.hist if state.hist is not None else np.zeros(len(spec.bins) - 1, dtype=np.int64)
+        return {'edges': spec.bins.tolist(), 'counts': [int(c) for c in counts]}
+
+    def result(self) -> Dict[str, Any]:
+        """
+        聚合结果
+
+        Returns:
+            不分组时为 {指标名: 值}；分组时为 {分组显示名: {指标名: 值}}，按分组键排序
+        """
+        if self.group_by is None:
+            states = self._states.get(TOTAL_GROUP, {name: _GroupState() for name in self.specs})
+            return {name: self._result_of(spec, states[name]) for name, spec in self.specs.items()}
+
+        group_format = TIME_GROUP_FORMATS[self.group_by]
+        return {
+            group_format.format(key): {
+                name: self._result_of(spec, self._states[key][name]) for name, spec in self.specs.items()
+            }
+            for key in sorted(self._states)
+        }
+
+
+def aggregate(processor, start_time: float, end_time: float, specs: Dict[str, AggregationSpec],
+              group_by: Optional[str] = None, vehicle_id: str = None,
+              batch_size: int = 200000) -> Dict[str, Any]:
+    """
+    在完整时间范围上执行外存聚合
+
+    Args:
+        processor: TrafficDataProcessor 实例
+        start_time: 开始时间戳
+        end_time: 结束时间戳
+        specs: 指标名到聚合指标的映射
+        group_by: 时间分组方式，None表示不分组
+        vehicle_id: 车辆ID，可选
+        batch_size: 每批的行数
+
+    Returns:
+        {'rows': 参与聚合的行数, 'results': 聚合结果}
+    """
+    aggregator = OutOfCoreAggregator(specs, group_by)
+    for chunk in processor.iter_chunks(start_time, end_time, columns=aggregator.required_columns,
+                                       vehicle_id=vehicle_id, batch_size=batch_size):
+        aggregator.update(chunk)
+    return {'rows': aggregator.rows, 'results': aggregator.result()}
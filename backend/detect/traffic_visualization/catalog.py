@@ -0,0 +1,279 @@
+"""
+数据集目录（catalog）
+导入时记录每个源文件和每个分区文件的时间范围、行数、经纬度范围和车辆数，
+查询时据此裁剪文件、校验时间范围，不必再扫描数据
+"""
+
+import os
+import json
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 目录文件名（位于数据目录下）
+CATALOG_FILENAME = 'catalog.json'
+# 各分区文件的车辆编码及行数
+CATALOG_VEHICLES_FILENAME = 'catalog_vehicles.npz'
+
+
+def summarize_frame(df: pd.DataFrame) -> Dict:
+    """
+    统计一块数据的时间范围、行数和经纬度范围
+
+    Args:
+        df: 已规整类型的交通数据
+
+    Returns:
+        统计信息字典，bbox 为 [最小LAT, 最小LON, 最大LAT, 最大LON]（原始整数坐标）
+    """
+    if df.empty:
+        return {'min_utc': None, 'max_utc': None, 'rows': 0, 'bbox': None}
+    return {
+        'min_utc': int(df['UTC'].min()),
+        'max_utc': int(df['UTC'].max()),
+        'rows': int(len(df)),
+        'bbox': [int(df['LAT'].min()), int(df['LON'].min()),
+                 int(df['LAT'].max()), int(df['LON'].max())],
+    }
+
+
+def merge_summaries(a: Dict, b: Dict) -> Dict:
+    """合并两个统计信息"""
+    if not a or not a.get('rows'):
+        return dict(b)
+    if not b or not b.get('rows'):
+        return dict(a)
+    return {
+        'min_utc': min(a['min_utc'], b['min_utc']),
+        'max_utc': max(a['max_utc'], b['max_utc']),
+        'rows': a['rows'] + b['rows'],
+        'bbox': [min(a['bbox'][0], b['bbox'][0]), min(a['bbox'][1], b['bbox'][1]),
+                 max(a['bbox'][2], b['bbox'][2]), max(a['bbox'][3], b['bbox'][3])],
+    }
+
+
+class DatasetCatalog:
+    """
+    数据集目录
+
+    catalog.json 结构:
+        sources: {源文件名: {size, mtime, min_utc, max_utc, rows, bbox, vehicles}}
+        parts:   [{path, source, hour, min_utc, max_utc, rows, bbox, vehicles}, ...]
+    catalog_vehicles.npz 按 parts 的顺序保存每个分区文件的车辆编码和行数
+    （codes/counts 拼接存放，offsets 给出每个分区文件的区间）
+    """
+
+    def __init__(self, data_dir: str):
+        """
+        初始化数据集目录
+
+        Args:
+            data_dir: 数据目录
+        """
+        self.data_dir = data_dir
+        self.catalog_path = os.path.join(data_dir, CATALOG_FILENAME)
+        self.vehicles_path = os.path.join(data_dir, CATALOG_VEHICLES_FILENAME)
+        self._loaded_mtime = None
+        self.sources: Dict[str, Dict] = {}
+        self.parts: List[Dict] = []
+        self._part_vehicles: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    # ------------------------------------------------------------------
+    # 加载与保存
+    # ------------------------------------------------------------------
+
+    def reload(self) -> bool:
+        """
+        目录文件有更新时重新加载
+
+        Returns:
+            目录是否存在
+        """
+        if not os.path.exists(self.catalog_path):
+            return False
+        mtime = os.path.getmtime(self.catalog_path)
+        if mtime == self._loaded_mtime:
+            return True
+
+        with open(self.catalog_path, 'r') as f:
+            catalog = json.load(f)
+        self.sources = catalog.get('sources', {})
+        self.parts = catalog.get('parts', [])
+
+        self._part_vehicles = [(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))] * len(self.parts)
+        if os.path.exists(self.vehicles_path):
+            arrays = np.load(self.vehicles_path)
+            offsets = arrays['offsets']
+            if len(offsets) == len(self.parts) + 1:
+                self._part_vehicles = [
+                    (arrays['codes'][s:e], arrays['counts'][s:e])
+                    for s, e in zip(offsets[:-1], offsets[1:])
+                ]
+        self._loaded_mtime = mtime
+        return True
+
+    def is_available(self) -> bool:
+        """目录是否已生成"""
+        return self.reload()
+
+    def save(self):
+        """保存目录（先写临时文件再替换）"""
+        codes = [codes for codes, _ in self._part_vehicles]
+        counts = [counts for _, counts in self._part_vehicles]
+        offsets = np.concatenate(([0], np.cumsum([len(c) for c in codes]))).astype(np.int64)
+        tmp_vehicles = self.vehicles_path + '.tmp.npz'
+        np.savez(
+            tmp_vehicles,
+            codes=np.concatenate(codes).astype(np.int32) if codes else np.zeros(0, dtype=np.int32),
+            counts=np.concatenate(counts).astype(np.int64) if counts else np.zeros(0, dtype=np.int64),
+            offsets=offsets,
+        )
+        os.replace(tmp_vehicles, self.vehicles_path)
+
+        catalog = {
+            'summary': self.summary(),
+            'sources': self.sources,
+            'parts': self.parts,
+        }
+        tmp_path = self.catalog_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(catalog, f, ensure_ascii=False)
+        os.replace(tmp_path, self.catalog_path)
+        self._loaded_mtime = os.path.getmtime(self.catalog_path)
+
+    # ------------------------------------------------------------------
+    # 写入（导入时调用）
+    # ------------------------------------------------------------------
+
+    def remove_source(self, source: str):
+        """删除某个源文件及其分区文件的记录"""
+        self.sources.pop(source, None)
+        keep = [i for i, part in enumerate(self.parts) if part['source'] != source]
+        self.parts = [self.parts[i] for i in keep]
+        self._part_vehicles = [self._part_vehicles[i] for i in keep]
+
+    def add_source(self, source: str, file_path: str, summary: Dict, vehicles: int):
+        """记录一个源文件"""
+        stat = os.stat(file_path)
+        self.sources[source] = dict(summary, file=os.path.basename(file_path),
+                                    size=stat.st_size, mtime=stat.st_mtime, vehicles=int(vehicles))
+
+    def add_part(self, path: str, source: str, hour: int, df: pd.DataFrame, codes: np.ndarray):
+        """
+        记录一个分区文件
+
+        Args:
+            path: 分区文件相对数据集目录的路径
+            source: 源文件名（不含扩展名）
+            hour: 分区小时时间戳
+            df: 分区文件中的数据
+            codes: 每行的车辆编码
+        """
+        vehicle_codes, vehicle_counts = np.unique(codes, return_counts=True)
+        self.parts.append(dict(summarize_frame(df), path=path, source=source, hour=int(hour),
+                               vehicles=int(len(vehicle_codes))))
+        self._part_vehicles.append((vehicle_codes.astype(np.int32), vehicle_counts.astype(np.int64)))
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def summary(self) -> Dict:
+        """整个数据集的时间范围、行数和经纬度范围"""
+        total = {}
+        for entry in self.sources.values():
+            total = merge_summaries(total, entry)
+        if not total:
+            total = summarize_frame(pd.DataFrame())
+        total['files'] = len(self.sources)
+        total['vehicles'] = int(len(np.unique(np.concatenate(
+            [codes for codes, _ in self._part_vehicles] or [np.zeros(0, dtype=np.int32)]
+        ))))
+        return total
+
+    def time_range(self) -> Optional[Tuple[int, int]]:
+        """数据集的时间范围 (最小UTC, 最大UTC)，目录不存在时返回None"""
+        if not self.reload():
+            return None
+        starts = [e['min_utc'] for e in self.sources.values() if e.get('rows')]
+        ends = [e['max_utc'] for e in self.sources.values() if e.get('rows')]
+        if not starts:
+            return None
+        return min(starts), max(ends)
+
+    def prune_csv_files(self, csv_files: List[str], start_time: float, end_time: float) -> List[str]:
+        """
+        去掉时间范围与查询不相交的CSV文件
+
+        未记录或记录后被修改过（大小/修改时间不一致）的文件无法判断，保留
+        """
+        if not self.reload():
+            return csv_files
+        kept = []
+        for file_path in csv_files:
+            entry = self.sources.get(os.path.splitext(os.path.basename(file_path))[0])
+            if entry is not None and self._is_current(entry, file_path):
+                if not entry.get('rows') or entry['max_utc'] < start_time or entry['min_utc'] > end_time:
+                    continue
+            kept.append(file_path)
+        return kept
+
+    def source_time_range(self, file_path: str) -> Optional[Tuple[int, int]]:
+        """
+        目录中记录的源文件时间范围
+
+        Returns:
+            (最小UTC, 最大UTC)；文件未记录、记录后已被修改或没有数据时返回None
+        """
+        self.reload()
+        entry = self.sources.get(os.path.splitext(os.path.basename(file_path))[0])
+        if entry is None or not entry.get('rows') or not self._is_current(entry, file_path):
+            return None
+        return entry['min_utc'], entry['max_utc']
+
+    @staticmethod
+    def _is_current(entry: Dict, file_path: str) -> bool:
+        """源文件自记录以来是否未被修改"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        return stat.st_size == entry.get('size') and stat.st_mtime == entry.get('mtime')
+
+    def _overlapping_parts(self, start_time: float, end_time: float) -> List[int]:
+        """与时间范围相交的分区文件下标"""
+        return [
+            i for i, part in enumerate(self.parts)
+            if part.get('rows') and part['max_utc'] >= np.floor(start_time) and part['min_utc'] <= end_time
+        ]
+
+    def part_files(self, dataset_dir: str, start_time: float, end_time: float) -> Optional[List[str]]:
+        """
+        与时间范围相交的分区文件路径
+
+        Returns:
+            文件路径列表，目录中没有分区文件记录时返回None
+        """
+        if not self.reload() or not self.parts:
+            return None
+        return [os.path.join(dataset_dir, self.parts[i]['path'])
+                for i in self._overlapping_parts(start_time, end_time)]
+
+    def vehicle_counts(self, start_time: float, end_time: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        与时间范围相交的分区文件中每辆车的数据点数（按小时分区粒度统计）
+
+        Returns:
+            (车辆编码数组, 数据点数数组)，目录中没有分区文件记录时返回None
+        """
+        if not self.reload() or not self.parts:
+            return None
+        selected = self._overlapping_parts(start_time, end_time)
+        if not selected:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+        codes = np.concatenate([self._part_vehicles[i][0] for i in selected])
+        counts = np.concatenate([self._part_vehicles[i][1] for i in selected])
+        totals = np.bincount(codes, weights=counts).astype(np.int64)
+        vehicle_codes = np.flatnonzero(totals).astype(np.int32)
+        return vehicle_codes, totals[vehicle_codes]
@@ -11,6 +11,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import silhouette_score, calinski_harabasz_score
 import math
 from abc import ABC, abstractmethod
+from .jobs import report_progress
 
 class ClusteringAlgorithm(ABC):
     """聚类算法抽象基类"""
@@ -400,8 +401,11 @@ class ClusteringEngine:
         param_names = list(param_ranges.keys())
         param_values = list(param_ranges.values())
         
-        for param_combination in product(*param_values):
+        combinations = list(product(*param_values))
+        for index, param_combination in enumerate(combinations):
             params = dict(zip(param_names, param_combination))
+            # 在后台任务中报告进度（取消请求在此处生效）
+            report_progress(f'尝试参数组合 {index + 1}/{len(combinations)}', progress=index / len(combinations))
             
             try:
                 labels, metrics = self.cluster_data(data, algorithm, params)
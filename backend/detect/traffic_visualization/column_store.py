@@ -0,0 +1,371 @@
+"""
+内存映射列存储
+每列一个连续的 .npy 文件，通过 np.memmap 打开，多个进程共享同一份页缓存
+"""
+
+import os
+import json
+import shutil
+import argparse
+from typing import List, Dict, Optional, Iterator
+
+import numpy as np
+import pandas as pd
+
+from .dataset_store import PartitionedDatasetStore, PYARROW_AVAILABLE
+from .vehicle_index import vehicle_offsets, mark_vehicle_sorted
+from .vehicle_dictionary import VehicleDictionary, DICTIONARY_FILENAME
+
+if PYARROW_AVAILABLE:
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+# 列存储包含的列及其类型（COMMADDR 存储为车辆字典的 int32 编码）
+STORE_COLUMNS = {
+    'UTC': np.int64,
+    'LAT': np.int32,
+    'LON': np.int32,
+    'COMMADDR': np.int32,
+    'SPEED': np.float32,
+    'DIRECTION': np.float32,
+    'STATUS': np.int16,
+}
+
+
+class ColumnStore:
+    """
+    按 (车辆, UTC) 排序的内存映射列存储
+
+    目录结构: {store_dir}/{列名}.npy + OFFSETS.npy + TIME_ORDER.npy + TIME_UTC.npy
+              + vehicle_dictionary.json + meta.json
+    COMMADDR 列保存车辆编码，数据按编码排序，OFFSETS[c]:OFFSETS[c+1] 是编码为c的车辆的连续行区间，
+    单车查询直接返回 memmap 上的零拷贝切片；目录内保存构建时的车辆字典快照，保证编码与数据一致。
+    TIME_ORDER 是按UTC排序的行号排列，TIME_UTC 是对应的有序UTC，
+    全部车辆的时间范围查询用二分查找定位，代价与命中行数成正比而不是总行数
+    """
+
+    def __init__(self, data_dir: str, store_dir: str = None):
+        """
+        初始化列存储
+
+        Args:
+            data_dir: 数据目录
+            store_dir: 列存储目录，默认为 {data_dir}/columns
+        """
+        self.data_dir = data_dir
+        self.store_dir = store_dir or os.path.join(data_dir, 'columns')
+        self._meta = None
+        self._columns = {}
+        self._dictionary = None
+
+    def is_available(self) -> bool:
+        """列存储是否已构建"""
+        return os.path.exists(os.path.join(self.store_dir, 'meta.json'))
+
+    @property
+    def meta(self) -> Dict:
+        """列存储元数据"""
+        if self._meta is None:
+            with open(os.path.join(self.store_dir, 'meta.json'), 'r') as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    @property
+    def dictionary(self) -> VehicleDictionary:
+        """构建时的车辆字典快照"""
+        if self._dictionary is None:
+            self._dictionary = VehicleDictionary.load(os.path.join(self.store_dir, DICTIONARY_FILENAME))
+        return self._dictionary
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+
+    def build(self, dataset_store: PartitionedDatasetStore = None) -> Dict:
+        """
+        从分区Parquet数据集构建列存储
+
+        数据按 (车辆编码, UTC) 物理排序：
+        第一遍只读取车辆ID列，统计每辆车的行数，得到每辆车的偏移区间；
+        第二遍按小时分区的时间顺序读取数据，把每辆车的行依次写到该车区间内的写游标处，
+        因为分区之间时间不重叠，写完后每辆车区间内天然按UTC有序
+
+        Args:
+            dataset_store: 分区数据集，默认使用数据目录下的数据集
+
+        Returns:
+            列存储元数据
+        """
+        if dataset_store is None:
+            dataset_store = PartitionedDatasetStore(self.data_dir)
+        if not dataset_store.is_available():
+            raise RuntimeError("分区数据集不存在，请先运行 dataset_store 导入命令")
+
+        partitions = [
+            (hour, sorted(os.path.join(partition_dir, f)
+                          for f in os.listdir(partition_dir) if f.endswith('.parquet')))
+            for hour, partition_dir in dataset_store._iter_partitions()
+        ]
+
+        # 使用导入时生成的车辆字典，数据集中出现的新车辆追加到字典末尾
+        dictionary = dataset_store.dictionary
+
+        # 第一遍：统计每个车辆编码的行数和可用列
+        count_values, count_numbers = [], [np.zeros(0, dtype=np.int64)]
+        available = set(STORE_COLUMNS)
+        for _, files in partitions:
+            for file_path in files:
+                parquet_file = pq.ParquetFile(file_path)
+                available &= set(parquet_file.schema_arrow.names)
+                ids = parquet_file.read(columns=['COMMADDR']).column('COMMADDR')
+                counts = pc.value_counts(ids)
+                count_values.extend(counts.field('values').to_pylist())
+                count_numbers.append(counts.field('counts').to_numpy())
+
+        dictionary.add(count_values)
+        vehicle_counts = np.bincount(
+            dictionary.encode(count_values), weights=np.concatenate(count_numbers), minlength=len(dictionary)
+        ).astype(np.int64)
+
+        offsets = np.concatenate(([0], np.cumsum(vehicle_counts))).astype(np.int64)
+        total_rows = int(offsets[-1])
+
+        columns = [col for col in STORE_COLUMNS if col in available]
+        dtypes = {col: np.dtype(STORE_COLUMNS[col]) for col in columns}
+        print(f"构建列存储: {total_rows} 行, {int(np.count_nonzero(vehicle_counts))} 辆车, 列: {columns}")
+
+        # 第二遍：写入临时目录，完成后整体替换，避免读取到半成品
+        tmp_dir = self.store_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        outputs = {
+            col: np.lib.format.open_memmap(
+                os.path.join(tmp_dir, f'{col}.npy'), mode='w+', dtype=dtypes[col], shape=(total_rows,)
+            )
+            for col in columns
+        }
+        cursors = offsets[:-1].copy()
+
+        for hour, files in partitions:
+            if not files:
+                continue
+            part_df = pd.concat(
+                [pq.read_table(f, columns=columns).to_pandas() for f in files],
+                ignore_index=True
+            )
+            # 分区内按 (车辆编码, UTC) 排序后，计算每行在目标文件中的位置
+            part_df['COMMADDR'] = dictionary.encode(part_df['COMMADDR'])
+            vehicle_idx = part_df['COMMADDR'].to_numpy()
+            order = np.lexsort((part_df['UTC'].to_numpy(), vehicle_idx))
+            vehicle_idx = vehicle_idx[order]
+            group_offsets = vehicle_offsets(vehicle_idx)
+            group_starts = np.repeat(group_offsets[:-1], np.diff(group_offsets))
+            dest = cursors[vehicle_idx] + (np.arange(len(order)) - group_starts)
+
+            for col in columns:
+                outputs[col][dest] = part_df[col].to_numpy()[order]
+            np.add.at(cursors, vehicle_idx[group_offsets[:-1]], np.diff(group_offsets))
+
+        for array in outputs.values():
+            array.flush()
+        del outputs
+
+        np.save(os.path.join(tmp_dir, 'OFFSETS.npy'), offsets)
+        # 时间索引：按UTC排序的行号排列及对应的有序UTC
+        utc = np.load(os.path.join(tmp_dir, 'UTC.npy'), mmap_mode='r')
+        time_order = np.argsort(utc, kind='stable')
+        np.save(os.path.join(tmp_dir, 'TIME_ORDER.npy'), time_order)
+        np.save(os.path.join(tmp_dir, 'TIME_UTC.npy'), np.asarray(utc)[time_order])
+        del utc, time_order
+        dictionary.save(os.path.join(tmp_dir, DICTIONARY_FILENAME))
+        dictionary.save(dataset_store.dictionary_path)
+
+        meta = {
+            'rows': total_rows,
+            'vehicles': int(np.count_nonzero(vehicle_counts)),
+            'sorted_by': ['COMMADDR', 'UTC'],
+            'time_index': True,
+            'columns': {col: dtypes[col].str for col in columns},
+            'min_utc': None,
+            'max_utc': None,
+        }
+        if total_rows:
+            utc = np.load(os.path.join(tmp_dir, 'UTC.npy'), mmap_mode='r')
+            meta['min_utc'] = int(utc.min())
+            meta['max_utc'] = int(utc.max())
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        os.rename(tmp_dir, self.store_dir)
+
+        self._meta = None
+        self._columns = {}
+        self._dictionary = None
+        print(f"列存储构建完成: {self.store_dir}")
+        return meta
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def column(self, name: str) -> np.ndarray:
+        """以只读内存映射方式打开某一列（OFFSETS 为车辆偏移索引，TIME_ORDER/TIME_UTC 为时间索引）"""
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.store_dir, f'{name}.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def vehicle_slice(self, vehicle_id: str) -> slice:
+        """
+        某辆车在存储中的连续行区间
+
+        Args:
+            vehicle_id: 车辆ID
+
+        Returns:
+            行区间，车辆不存在时为空区间
+        """
+        code = self.dictionary.code_of(vehicle_id)
+        offsets = self.column('OFFSETS')
+        if code is None or code + 1 >= len(offsets):
+            return slice(0, 0)
+        return slice(int(offsets[code]), int(offsets[code + 1]))
+
+    def vehicle_time_slice(self, vehicle_id: str, start_time: float, end_time: float) -> slice:
+        """某辆车在时间范围 [start_time, end_time] 内的行区间（车辆区间内按UTC二分查找）"""
+        rows = self.vehicle_slice(vehicle_id)
+        utc = self.column('UTC')[rows]
+        start = rows.start + int(np.searchsorted(utc, np.floor(start_time), side='left'))
+        end = rows.start + int(np.searchsorted(utc, np.floor(end_time), side='right'))
+        return slice(start, end)
+
+    def time_rows(self, start_time: float, end_time: float) -> np.ndarray:
+        """
+        全部车辆在时间范围 [start_time, end_time] 内的行号，升序（即保持 (COMMADDR, UTC) 顺序）
+
+        有时间索引时二分查找后只对命中的行号排序；没有时间索引的旧版列存储对UTC列做一次向量化筛选
+        """
+        if not self.meta.get('time_index'):
+            utc = self.column('UTC')
+            return np.flatnonzero((utc >= np.floor(start_time)) & (utc <= np.floor(end_time)))
+        return np.sort(self.column('TIME_ORDER')[self.time_order_slice(start_time, end_time)])
+
+    def time_order_slice(self, start_time: float, end_time: float) -> slice:
+        """时间索引（TIME_ORDER/TIME_UTC）中落在时间范围 [start_time, end_time] 内的连续区间，二分查找"""
+        time_utc = self.column('TIME_UTC')
+        start = int(np.searchsorted(time_utc, np.floor(start_time), side='left'))
+        end = int(np.searchsorted(time_utc, np.floor(end_time), side='right'))
+        return slice(start, end)
+
+    def load_columns(self, start_time: float, end_time: float, columns: List[str] = None,
+                     vehicle_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        返回时间范围内各列的数据，结果保持 (COMMADDR, UTC) 顺序
+
+        指定车辆时返回 memmap 上的零拷贝切片；
+        查询全部车辆时由时间索引得到命中的行号后按行号取数
+
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            columns: 需要的列，None表示全部列
+            vehicle_id: 车辆ID，可选
+
+        Returns:
+            列名到数组的映射
+        """
+        names = [col for col in (columns or self.meta['columns']) if col in self.meta['columns']]
+        if vehicle_id:
+            rows = self.vehicle_time_slice(vehicle_id, start_time, end_time)
+        else:
+            rows = self.time_rows(start_time, end_time)
+        return {col: self.column(col)[rows] for col in names}
+
+    def load_frame(self, start_time: float, end_time: float, columns: List[str] = None,
+                   vehicle_id: Optional[str] = None) -> pd.DataFrame:
+        """
+        读取时间范围内的数据为DataFrame（已按 (COMMADDR, UTC) 排序，COMMADDR 为字典编码的 Categorical）
+
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            columns: 需要的列，None表示全部列
+            vehicle_id: 车辆ID，可选
+
+        Returns:
+            符合条件的数据DataFrame
+        """
+        data = self.load_columns(start_time, end_time, columns, vehicle_id)
+        if not data or len(next(iter(data.values()))) == 0:
+            return pd.DataFrame()
+
+        df = self._frame(data)
+        if 'COMMADDR' in df.columns and 'UTC' in df.columns:
+            mark_vehicle_sorted(df)
+        return df
+
+    def _frame(self, data: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """由列数组构造DataFrame，车辆编码转换为 Categorical"""
+        if 'COMMADDR' in data:
+            data['COMMADDR'] = self.dictionary.to_categorical(data['COMMADDR'])
+        return pd.DataFrame(data, copy=False)
+
+    def iter_batches(self, start_time: float, end_time: float, columns: List[str] = None,
+                     vehicle_id: Optional[str] = None, batch_size: int = 200000) -> Iterator[pd.DataFrame]:
+        """
+        按批次读取时间范围内的数据，内存占用与批次大小成正比
+
+        指定车辆时在该车的连续区间内按批切片；
+        查询全部车辆时按时间顺序逐批读取时间索引，批内按行号取数（批次之间不保持 (COMMADDR, UTC) 顺序；
+        旧版列存储按固定行数分块扫描 UTC 列）
+
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            columns: 需要的列，None表示全部列
+            vehicle_id: 车辆ID，可选
+            batch_size: 每批扫描的行数
+
+        Yields:
+            数据批次DataFrame
+        """
+        names = [col for col in (columns or self.meta['columns']) if col in self.meta['columns']]
+        if not names:
+            # 零列的批次没有行数，至少读取 UTC 列
+            names = ['UTC']
+        if vehicle_id:
+            rows = self.vehicle_time_slice(vehicle_id, start_time, end_time)
+            for start in range(rows.start, rows.stop, batch_size):
+                block = slice(start, min(start + batch_size, rows.stop))
+                yield self._frame({col: np.asarray(self.column(col)[block]) for col in names})
+            return
+
+        if self.meta.get('time_index'):
+            # 逐批取时间索引的区间，每批单独排序行号，不为整个时间范围分配行号数组
+            order = self.column('TIME_ORDER')
+            span = self.time_order_slice(start_time, end_time)
+            for start in range(span.start, span.stop, batch_size):
+                block = np.sort(order[start:min(start + batch_size, span.stop)])
+                yield self._frame({col: self.column(col)[block] for col in names})
+            return
+
+        utc = self.column('UTC')
+        low, high = np.floor(start_time), np.floor(end_time)
+        for start in range(0, len(utc), batch_size):
+            block_utc = utc[start:start + batch_size]
+            hits = np.flatnonzero((block_utc >= low) & (block_utc <= high))
+            if len(hits) == 0:
+                continue
+            yield self._frame({col: self.column(col)[start:start + batch_size][hits] for col in names})
+
+
+if __name__ == "__main__":
+    # 构建命令: 在backend目录下执行（需先运行 dataset_store 导入命令）
+    #   python -m detect.traffic_visualization.column_store --data-dir <CSV目录>
+    parser = argparse.ArgumentParser(description="从分区Parquet数据集构建内存映射列存储")
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(__file__), 'data'),
+                        help="数据目录")
+    args = parser.parse_args()
+
+    ColumnStore(args.data_dir).build()
@@ -1,16 +1,200 @@
 import pandas as pd
 import numpy as np
 import os
+import io
 import json
+import glob
 import pickle
+import shutil
+import hashlib
 from typing import Dict, List, Tuple
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import math
 
+from .sparse_grid import SparseGrid
+
+# 空间网格分辨率（高、中、低）
+GRID_RESOLUTIONS = [0.001, 0.005, 0.01]
+# 日热力图分辨率
+HEATMAP_RESOLUTION = 0.002
+# 每小时数据文件最多保留的采样点数（合并各片段后采样）
+HOURLY_SAMPLE_SIZE = 10000
+# 预处理产物格式版本，版本变化时全部重新处理
+ARTIFACT_FORMAT = 3
+# 并行导入时单个分片的目标字节数
+DEFAULT_SHARD_SIZE = 256 * 1024 * 1024
+
+
+def file_fingerprint(file_path: str, with_hash: bool = True) -> Dict:
+    """
+    文件指纹：大小、修改时间和内容哈希（SHA1）
+    
+    Args:
+        file_path: 文件路径
+        with_hash: 是否计算内容哈希
+    """
+    stat = os.stat(file_path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    if with_hash:
+        sha1 = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        fingerprint['sha1'] = sha1.hexdigest()
+    return fingerprint
+
+
+def new_partial() -> Dict:
+    """空的部分索引"""
+    return {
+        'grids': {resolution: SparseGrid(resolution) for resolution in GRID_RESOLUTIONS},
+        'vehicles': defaultdict(list),  # vehicle_id -> [时间段列表]
+        'heatmaps': {},  # day -> SparseGrid
+    }
+
+
+def merge_partial(target: Dict, partial: Dict):
+    """把一个部分索引累加到 target 中（网格为稀疏数组相加）"""
+    for resolution, grid in partial['grids'].items():
+        target['grids'][resolution] = target['grids'].get(resolution, SparseGrid(resolution)) + grid
+    for vehicle_id, hours in partial['vehicles'].items():
+        target['vehicles'][vehicle_id].extend(hours)
+    for day, grid in partial['heatmaps'].items():
+        target['heatmaps'][day] = target['heatmaps'].get(day, SparseGrid(HEATMAP_RESOLUTION)) + grid
+
+
+def accumulate_partial(partial: Dict, hour: int, df: pd.DataFrame):
+    """一次遍历小时数据，同时累计空间网格、车辆索引和日热力图"""
+    if 'LAT' in df.columns and 'LON' in df.columns:
+        # 转换坐标
+        lat = df['LAT'].to_numpy() / 1e5
+        lng = df['LON'].to_numpy() / 1e5
+        
+        for resolution in GRID_RESOLUTIONS:
+            partial['grids'][resolution] += SparseGrid.from_points(lat, lng, resolution)
+        
+        # 所属天的热力图
+        day = hour // (24 * 3600) * (24 * 3600)
+        partial['heatmaps'][day] = (partial['heatmaps'].get(day, SparseGrid(HEATMAP_RESOLUTION))
+                                    + SparseGrid.from_points(lat, lng, HEATMAP_RESOLUTION))
+    
+    if 'COMMADDR' in df.columns:
+        # 记录每个车辆在这个时间段出现
+        for vehicle_id in df['COMMADDR'].unique():
+            partial['vehicles'][str(vehicle_id)].append(hour)
+
+
+class _ByteRangeReader(io.RawIOBase):
+    """只读取文件中 [start, end) 字节区间的只读流"""
+    
+    def __init__(self, f, start: int, end: int):
+        self._f = f
+        self._f.seek(start)
+        self._remaining = end - start
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        n = self._f.readinto(memoryview(buffer)[:size])
+        self._remaining -= n
+        return n
+
+
+def _align_to_line(f, position: int) -> int:
+    """把字节位置对齐到下一行的行首（位置恰好在行首时不变）"""
+    if position <= 0:
+        return 0
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+
+def plan_shards(file_path: str, shard_size: int) -> List[Tuple[int, int]]:
+    """
+    把CSV文件按字节切分为若干分片，分片边界对齐到行首
+    
+    Args:
+        file_path: CSV文件路径
+        shard_size: 每个分片的目标字节数
+    
+    Returns:
+        [(起始字节, 结束字节), ...]，第一个分片包含表头
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        bounds = sorted({_align_to_line(f, pos) for pos in range(0, size, max(shard_size, 1))} | {size})
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def process_shard(file_path: str, fragment_dir: str, shard_index: int,
+                  byte_range: Tuple[int, int] = None) -> Tuple[Dict, List[int]]:
+    """
+    处理CSV文件的一个分片：按小时写出完整的数据片段，并在同一遍中累计部分索引
+    
+    片段不采样：采样在合并小时文件时进行，结果与分片方式无关
+    
+    定义在模块级别，可以直接提交到进程池执行
+    
+    Args:
+        file_path: CSV文件路径
+        fragment_dir: 片段输出目录
+        shard_index: 分片序号（用于片段文件名，保证合并顺序确定）
+        byte_range: 分片的字节区间，None表示整个文件
+    
+    Returns:
+        (部分索引, 涉及的小时时间戳列表)
+    """
+    os.makedirs(fragment_dir, exist_ok=True)
+    hourly_data = defaultdict(list)
+    
+    with open(file_path, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        start, end = byte_range if byte_range else (0, os.path.getsize(file_path))
+        if start == 0:
+            # 第一个分片包含表头
+            stream = io.BufferedReader(_ByteRangeReader(f, 0, end))
+            reader = pd.read_csv(stream, chunksize=100000)
+        else:
+            stream = io.BufferedReader(_ByteRangeReader(f, start, end))
+            reader = pd.read_csv(stream, chunksize=100000, header=None, names=header)
+        
+        # 分块读取
+        for chunk in reader:
+            if 'UTC' not in chunk.columns:
+                continue
+            
+            # 转换为小时
+            chunk['hour'] = (chunk['UTC'] // 3600) * 3600
+            
+            # 按小时分组
+            for hour, group in chunk.groupby('hour'):
+                hourly_data[hour].append(group)
+    
+    partial = new_partial()
+    for hour, data_list in hourly_data.items():
+        hour_df = pd.concat(data_list, ignore_index=True)
+        hour_df.to_parquet(os.path.join(fragment_dir, f"hour_{int(hour)}-{shard_index:04d}.parquet"),
+                           compression='snappy')
+        accumulate_partial(partial, int(hour), hour_df)
+    
+    return partial, sorted(int(hour) for hour in hourly_data)
+
+
 class TrafficDataPreprocessor:
     """
     交通数据预处理器
     将原始CSV数据预处理为可快速查询的格式
+    
+    预处理是增量的：indexes/manifest.json 记录每个已处理CSV的路径、大小、修改时间和内容哈希，
+    每次运行只处理新增或内容有变化的文件。每个源文件在一次遍历中生成自己的小时数据片段
+    （processed/fragments/{源文件}/hour_{小时}-{分片}.parquet）和部分索引（indexes/partials/{源文件}.pkl），
+    最后只重写受影响的小时文件，并由全部部分索引合并出空间网格、车辆索引和日热力图。
+    workers 大于1时，文件按字节区间切分后在进程池中并行处理
     """
     
     def __init__(self, data_dir: str = None):
@@ -21,169 +205,261 @@ class TrafficDataPreprocessor:
         
         self.processed_dir = os.path.join(self.data_dir, 'processed')
         self.index_dir = os.path.join(self.data_dir, 'indexes')
+        self.fragment_dir = os.path.join(self.processed_dir, 'fragments')
+        self.partial_dir = os.path.join(self.index_dir, 'partials')
+        self.manifest_path = os.path.join(self.index_dir, 'manifest.json')
         
         # 创建处理后的数据目录
         os.makedirs(self.processed_dir, exist_ok=True)
         os.makedirs(self.index_dir, exist_ok=True)
+        os.makedirs(self.fragment_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
     
-    def preprocess_all_data(self):
-        """预处理所有原始数据"""
-        print("开始预处理所有数据...")
+    def preprocess_all_data(self, force: bool = False, workers: int = 1,
+                            shard_size: int = DEFAULT_SHARD_SIZE):
+        """
+        预处理原始数据（只处理新增或变化的文件）
+        
+        Args:
+            force: 是否忽略清单，全部重新处理
+            workers: 并行进程数，大于1时按文件和字节区间分片并行处理
+            shard_size: 并行处理时单个分片的目标字节数
+        """
+        print("开始预处理数据...")
         
-        # 1. 时间分片预聚合
-        self._create_time_based_aggregations()
+        manifest = {'format': ARTIFACT_FORMAT, 'sources': {}, 'pending_hours': []} if force else self._load_manifest()
+        changed, removed = self._diff_manifest(manifest)
         
-        # 2. 空间网格化
-        self._create_spatial_grids()
+        if not changed and not removed and not manifest['pending_hours']:
+            self._save_manifest(manifest)
+            print("原始数据没有变化，无需预处理")
+            return
+        print(f"需要处理 {len(changed)} 个文件，移除 {len(removed)} 个文件")
+        
+        # 先记录受影响的小时并删除旧结果，中途中断后下次运行会继续处理这些文件
+        pending = set(manifest['pending_hours'])
+        for source in [self._source_name(path) for path, _ in changed] + removed:
+            entry = manifest['sources'].pop(source, None)
+            if entry:
+                pending.update(entry.get('hours', []))
+            self._remove_source_outputs(source)
+        manifest['pending_hours'] = sorted(pending)
+        self._save_manifest(manifest)
+        
+        # 1. 处理源文件：按小时切分，并在同一遍中统计网格、车辆和热力图
+        if workers > 1 and changed:
+            self._process_sources_parallel(changed, manifest, workers, shard_size)
+        else:
+            for file_path, fingerprint in changed:
+                source = self._source_name(file_path)
+                hours = self._process_source(file_path, source)
+                manifest['sources'][source] = dict(fingerprint, hours=hours)
+                manifest['pending_hours'] = sorted(set(manifest['pending_hours']) | set(hours))
+                self._save_manifest(manifest)
         
-        # 3. 车辆轨迹索引
-        self._create_vehicle_indexes()
+        # 2. 只重写受影响的小时数据文件
+        self._merge_hour_files(manifest['pending_hours'])
         
-        # 4. 热力图预计算
-        self._create_heatmap_precomputed()
+        # 3. 合并全部部分索引，生成空间网格、车辆索引和日热力图
+        self._merge_indexes(list(manifest['sources']))
         
+        manifest['pending_hours'] = []
+        self._save_manifest(manifest)
         print("数据预处理完成！")
     
-    def _create_time_based_aggregations(self):
-        """按时间分片聚合数据"""
-        print("创建时间分片聚合...")
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+    
+    def _load_manifest(self) -> Dict:
+        """加载处理清单（产物格式版本不一致时视为空清单）"""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('format') == ARTIFACT_FORMAT:
+                manifest.setdefault('sources', {})
+                manifest.setdefault('pending_hours', [])
+                return manifest
+            print("预处理产物格式已更新，将全部重新处理")
+        return {'format': ARTIFACT_FORMAT, 'sources': {}, 'pending_hours': []}
+    
+    def _save_manifest(self, manifest: Dict):
+        """保存处理清单（先写临时文件再替换）"""
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def _source_name(self, file_path: str) -> str:
+        """源文件在清单中的键（相对数据目录的路径）"""
+        return os.path.relpath(file_path, self.data_dir)
+    
+    def _diff_manifest(self, manifest: Dict) -> Tuple[List[Tuple[str, Dict]], List[str]]:
+        """
+        比较清单和数据目录中的CSV文件
         
-        csv_files = self._get_csv_files()
-        hourly_data = defaultdict(list)
+        大小和修改时间都未变的文件视为未变化；否则再比较内容哈希，
+        哈希相同（如只是被touch过）时只更新清单中的修改时间
         
-        for file_path in csv_files:
-            print(f"处理文件: {os.path.basename(file_path)}")
-            
-            # 分块读取大文件
-            for chunk in pd.read_csv(file_path, chunksize=100000):
-                if 'UTC' not in chunk.columns:
-                    continue
-                
-                # 转换为小时
-                chunk['hour'] = (chunk['UTC'] // 3600) * 3600
-                
-                # 按小时分组
-                for hour, group in chunk.groupby('hour'):
-                    # 采样到合理大小（每小时最多1万个点）
-                    if len(group) > 10000:
-                        group = group.sample(10000, random_state=42)
-                    
-                    hourly_data[hour].append(group)
-        
-        # 保存每小时的数据
-        for hour, data_list in hourly_data.items():
-            if data_list:
-                hour_df = pd.concat(data_list, ignore_index=True)
-                filename = f"hour_{int(hour)}.parquet"
-                filepath = os.path.join(self.processed_dir, filename)
-                hour_df.to_parquet(filepath, compression='snappy')
-                print(f"保存小时数据: {filename}, 记录数: {len(hour_df)}")
+        Returns:
+            (需要处理的 [(文件路径, 指纹)], 已删除的源文件键)
+        """
+        changed = []
+        current = set()
+        for file_path in self._get_csv_files():
+            source = self._source_name(file_path)
+            current.add(source)
+            entry = manifest['sources'].get(source)
+            fingerprint = file_fingerprint(file_path, with_hash=False)
+            if entry and entry['size'] == fingerprint['size'] and entry['mtime'] == fingerprint['mtime']:
+                continue
+            fingerprint = file_fingerprint(file_path)
+            if entry and entry.get('sha1') == fingerprint['sha1']:
+                entry['mtime'] = fingerprint['mtime']
+                continue
+            changed.append((file_path, fingerprint))
+        removed = [source for source in manifest['sources'] if source not in current]
+        return changed, removed
+    
+    # ------------------------------------------------------------------
+    # 单个源文件处理
+    # ------------------------------------------------------------------
+    
+    def _source_key(self, source: str) -> str:
+        """源文件对应的片段目录名和部分索引文件名"""
+        return source.replace(os.sep, '__')
     
-    def _create_spatial_grids(self):
-        """创建空间网格索引"""
-        print("创建空间网格索引...")
+    def _remove_source_outputs(self, source: str):
+        """删除某个源文件的小时数据片段和部分索引"""
+        key = self._source_key(source)
+        shutil.rmtree(os.path.join(self.fragment_dir, key), ignore_errors=True)
+        partial_path = os.path.join(self.partial_dir, f"{key}.pkl")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    
+    def _write_partial(self, source: str, partial: Dict):
+        """保存源文件的部分索引"""
+        with open(os.path.join(self.partial_dir, f"{self._source_key(source)}.pkl"), 'wb') as f:
+            pickle.dump(partial, f)
+    
+    def _process_source(self, file_path: str, source: str) -> List[int]:
+        """
+        在当前进程中处理单个源文件（作为一个分片）
         
-        # 不同分辨率的网格
-        resolutions = [0.001, 0.005, 0.01]  # 高、中、低分辨率
+        Returns:
+            该文件涉及的小时时间戳列表
+        """
+        print(f"处理文件: {os.path.basename(file_path)}")
+        fragment_dir = os.path.join(self.fragment_dir, self._source_key(source))
+        partial, hours = process_shard(file_path, fragment_dir, 0)
+        self._write_partial(source, partial)
+        print(f"文件处理完成: {os.path.basename(file_path)}, 小时数: {len(hours)}")
+        return hours
+    
+    def _process_sources_parallel(self, changed: List[Tuple[str, Dict]], manifest: Dict,
+                                  workers: int, shard_size: int):
+        """
+        用进程池并行处理多个源文件
         
-        for resolution in resolutions:
-            print(f"创建 {resolution} 度分辨率网格...")
-            grid_data = defaultdict(int)
+        每个文件按字节区间切分为若干分片，所有分片一起提交到进程池；
+        各分片写出自己的片段文件，再按源文件、分片序号的固定顺序合并部分索引并更新清单，
+        因此结果与完成顺序无关
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            submitted = []
+            for file_path, fingerprint in changed:
+                source = self._source_name(file_path)
+                fragment_dir = os.path.join(self.fragment_dir, self._source_key(source))
+                shards = plan_shards(file_path, shard_size)
+                print(f"提交文件: {os.path.basename(file_path)}, 分片数: {len(shards)}")
+                futures = [
+                    executor.submit(process_shard, file_path, fragment_dir, index, byte_range)
+                    for index, byte_range in enumerate(shards)
+                ]
+                submitted.append((file_path, source, fingerprint, futures))
             
-            # 读取所有小时数据
-            for filename in os.listdir(self.processed_dir):
-                if filename.endswith('.parquet'):
-                    filepath = os.path.join(self.processed_dir, filename)
-                    df = pd.read_parquet(filepath)
-                    
-                    if 'LAT' in df.columns and 'LON' in df.columns:
-                        # 转换坐标
-                        df['lat'] = df['LAT'] / 1e5
-                        df['lng'] = df['LON'] / 1e5
-                        
-                        # 网格化
-                        df['lat_grid'] = (df['lat'] / resolution).round() * resolution
-                        df['lng_grid'] = (df['lng'] / resolution).round() * resolution
-                        
-                        # 统计每个网格的点数
-                        grid_counts = df.groupby(['lat_grid', 'lng_grid']).size()
-                        
-                        for (lat, lng), count in grid_counts.items():
-                            grid_key = f"{lat:.6f},{lng:.6f}"
-                            grid_data[grid_key] += count
+            for file_path, source, fingerprint, futures in submitted:
+                partial = new_partial()
+                hours = set()
+                for future in futures:
+                    shard_partial, shard_hours = future.result()
+                    merge_partial(partial, shard_partial)
+                    hours.update(shard_hours)
+                self._write_partial(source, partial)
+                
+                manifest['sources'][source] = dict(fingerprint, hours=sorted(hours))
+                manifest['pending_hours'] = sorted(set(manifest['pending_hours']) | hours)
+                self._save_manifest(manifest)
+                print(f"文件处理完成: {os.path.basename(file_path)}, 小时数: {len(hours)}")
+    
+    # ------------------------------------------------------------------
+    # 合并
+    # ------------------------------------------------------------------
+    
+    def _merge_hour_files(self, hours: List[int]):
+        """
+        由各源文件的片段重写指定小时的数据文件
+        
+        片段按源文件、分片序号的顺序拼接后即为原始行序（与分片方式无关），再采样到 HOURLY_SAMPLE_SIZE 行，
+        因此串行和并行、不同分片大小得到的小时文件相同
+        """
+        print(f"合并小时数据: {len(hours)} 个小时")
+        for hour in hours:
+            filename = f"hour_{int(hour)}.parquet"
+            filepath = os.path.join(self.processed_dir, filename)
+            # 按源文件、分片序号排序，保证合并结果确定
+            fragments = sorted(glob.glob(os.path.join(self.fragment_dir, '*', f"hour_{int(hour)}-*.parquet")))
             
-            # 保存网格数据
-            grid_filename = f"spatial_grid_{resolution}.json"
-            grid_filepath = os.path.join(self.index_dir, grid_filename)
-            with open(grid_filepath, 'w') as f:
-                json.dump(dict(grid_data), f)
+            if not fragments:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                continue
             
-            print(f"保存空间网格: {grid_filename}, 网格数: {len(grid_data)}")
+            hour_df = pd.concat([pd.read_parquet(path) for path in fragments], ignore_index=True)
+            # 采样到合理大小（每小时最多1万个点）
+            if len(hour_df) > HOURLY_SAMPLE_SIZE:
+                hour_df = hour_df.sample(HOURLY_SAMPLE_SIZE, random_state=42).reset_index(drop=True)
+            hour_df.to_parquet(filepath, compression='snappy')
+            print(f"保存小时数据: {filename}, 记录数: {len(hour_df)}")
     
-    def _create_vehicle_indexes(self):
-        """创建车辆索引"""
-        print("创建车辆索引...")
+    def _merge_indexes(self, sources: List[str]):
+        """合并全部源文件的部分索引，写出空间网格、车辆索引和日热力图"""
+        print("合并索引...")
+        merged = new_partial()
         
-        vehicle_index = defaultdict(list)  # vehicle_id -> [时间段列表]
+        for source in sources:
+            partial_path = os.path.join(self.partial_dir, f"{self._source_key(source)}.pkl")
+            if not os.path.exists(partial_path):
+                continue
+            with open(partial_path, 'rb') as f:
+                merge_partial(merged, pickle.load(f))
         
-        for filename in os.listdir(self.processed_dir):
-            if filename.endswith('.parquet'):
-                hour = int(filename.split('_')[1].split('.')[0])
-                filepath = os.path.join(self.processed_dir, filename)
-                df = pd.read_parquet(filepath)
-                
-                if 'COMMADDR' in df.columns:
-                    # 记录每个车辆在这个时间段出现
-                    unique_vehicles = df['COMMADDR'].unique()
-                    for vehicle_id in unique_vehicles:
-                        vehicle_index[str(vehicle_id)].append(hour)
+        # 保存网格数据
+        for resolution, grid in merged['grids'].items():
+            grid_filename = f"spatial_grid_{resolution}.npz"
+            grid.save(os.path.join(self.index_dir, grid_filename))
+            print(f"保存空间网格: {grid_filename}, 网格数: {len(grid)}")
         
         # 保存车辆索引
-        index_filepath = os.path.join(self.index_dir, 'vehicle_index.json')
-        with open(index_filepath, 'w') as f:
-            json.dump(dict(vehicle_index), f)
-        
+        vehicle_index = {vehicle_id: sorted(set(hours)) for vehicle_id, hours in merged['vehicles'].items()}
+        with open(os.path.join(self.index_dir, 'vehicle_index.json'), 'w') as f:
+            json.dump(vehicle_index, f)
         print(f"车辆索引创建完成，索引车辆数: {len(vehicle_index)}")
-    
-    def _create_heatmap_precomputed(self):
-        """预计算不同时间段的热力图"""
-        print("预计算热力图数据...")
-        
-        # 按天预计算热力图
-        daily_heatmaps = defaultdict(lambda: defaultdict(int))
-        
-        for filename in os.listdir(self.processed_dir):
-            if filename.endswith('.parquet'):
-                hour = int(filename.split('_')[1].split('.')[0])
-                day = hour // (24 * 3600) * (24 * 3600)  # 所属天
-                
-                filepath = os.path.join(self.processed_dir, filename)
-                df = pd.read_parquet(filepath)
-                
-                if 'LAT' in df.columns and 'LON' in df.columns:
-                    # 转换坐标并网格化
-                    df['lat'] = df['LAT'] / 1e5
-                    df['lng'] = df['LON'] / 1e5
-                    
-                    resolution = 0.002  # 热力图使用中等分辨率
-                    df['lat_grid'] = (df['lat'] / resolution).round() * resolution
-                    df['lng_grid'] = (df['lng'] / resolution).round() * resolution
-                    
-                    # 统计网格密度
-                    grid_counts = df.groupby(['lat_grid', 'lng_grid']).size()
-                    
-                    for (lat, lng), count in grid_counts.items():
-                        grid_key = f"{lat:.6f},{lng:.6f}"
-                        daily_heatmaps[day][grid_key] += count
         
         # 保存每日热力图
-        for day, heatmap_data in daily_heatmaps.items():
-            filename = f"heatmap_day_{int(day)}.json"
-            filepath = os.path.join(self.index_dir, filename)
-            with open(filepath, 'w') as f:
-                json.dump(dict(heatmap_data), f)
-            
-            print(f"保存日热力图: {filename}, 网格数: {len(heatmap_data)}")
+        day_files = set()
+        for day, grid in merged['heatmaps'].items():
+            filename = f"heatmap_day_{int(day)}.npz"
+            day_files.add(filename)
+            grid.save(os.path.join(self.index_dir, filename))
+            print(f"保存日热力图: {filename}, 网格数: {len(grid)}")
+        
+        # 删除已没有数据的日期，以及旧版本的JSON网格文件
+        for filename in os.listdir(self.index_dir):
+            if filename.startswith('heatmap_day_') and filename not in day_files:
+                os.remove(os.path.join(self.index_dir, filename))
+            elif filename.startswith('spatial_grid_') and filename.endswith('.json'):
+                os.remove(os.path.join(self.index_dir, filename))
     
     def _get_csv_files(self) -> List[str]:
         """获取所有CSV文件路径"""
@@ -220,17 +496,30 @@ class FastTrafficDataLoader:
                 return json.load(f)
         return {}
     
-    def _load_spatial_grids(self) -> Dict:
-        """加载空间网格"""
+    def _load_spatial_grids(self) -> Dict[float, SparseGrid]:
+        """加载空间网格（分辨率 -> 稀疏网格）"""
         grids = {}
+        if not os.path.isdir(self.index_dir):
+            return grids
         for filename in os.listdir(self.index_dir):
-            if filename.startswith('spatial_grid_') and filename.endswith('.json'):
-                resolution = float(filename.split('_')[2].split('.')[0])
-                filepath = os.path.join(self.index_dir, filename)
-                with open(filepath, 'r') as f:
-                    grids[resolution] = json.load(f)
+            if filename.startswith('spatial_grid_') and filename.endswith('.npz'):
+                grid = SparseGrid.load(os.path.join(self.index_dir, filename))
+                grids[grid.resolution] = grid
         return grids
     
+    def available_hours(self) -> set:
+        """已预处理的小时时间戳集合"""
+        if not os.path.isdir(self.processed_dir):
+            return set()
+        hours = set()
+        for filename in os.listdir(self.processed_dir):
+            if filename.startswith('hour_') and filename.endswith('.parquet'):
+                try:
+                    hours.add(int(filename[len('hour_'):-len('.parquet')]))
+                except ValueError:
+                    continue
+        return hours
+    
     def fast_load_data(self, start_time: float, end_time: float, vehicle_id: str = None) -> pd.DataFrame:
         """快速加载数据"""
         print(f"快速加载数据: {start_time} - {end_time}")
@@ -285,45 +574,51 @@ class FastTrafficDataLoader:
         start_day = (int(start_time) // (24 * 3600)) * (24 * 3600)
         end_day = (int(end_time) // (24 * 3600)) * (24 * 3600)
         
-        combined_heatmap = defaultdict(int)
+        day_grids = []
         current_day = start_day
         
         while current_day <= end_day:
-            filename = f"heatmap_day_{int(current_day)}.json"
+            filename = f"heatmap_day_{int(current_day)}.npz"
             filepath = os.path.join(self.index_dir, filename)
             
             if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    day_heatmap = json.load(f)
-                
-                for grid_key, count in day_heatmap.items():
-                    combined_heatmap[grid_key] += count
+                day_grids.append(SparseGrid.load(filepath))
             
             current_day += 24 * 3600  # 下一天
         
+        # 多天的稀疏网格一次拼接求和
+        combined_heatmap = SparseGrid.combine(day_grids, HEATMAP_RESOLUTION)
+        
         # 转换为热力图点格式
-        heatmap_points = []
-        for grid_key, count in combined_heatmap.items():
-            lat, lng = map(float, grid_key.split(','))
-            heatmap_points.append({
-                'lat': lat,
-                'lng': lng,
-                'count': count
-            })
+        lats, lngs, counts = combined_heatmap.to_points()
+        heatmap_points = [
+            {'lat': lat, 'lng': lng, 'count': count}
+            for lat, lng, count in zip(np.round(lats, 6).tolist(), np.round(lngs, 6).tolist(), counts.tolist())
+        ]
         
         print(f"快速热力图生成完成，共 {len(heatmap_points)} 个点")
         return heatmap_points
 
 if __name__ == "__main__":
-    # 使用示例
-    preprocessor = TrafficDataPreprocessor()
+    # 使用示例（在backend目录下执行）:
+    #   python -m detect.traffic_visualization.data_preprocessor --workers 8
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="预处理原始CSV数据")
+    parser.add_argument('--data-dir', default=None, help="数据目录")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="单个分片的目标字节数")
+    parser.add_argument('--force', action='store_true', help="忽略清单，全部重新处理")
+    args = parser.parse_args()
+    
+    preprocessor = TrafficDataPreprocessor(args.data_dir)
     
-    # 运行预处理（只需要运行一次）
+    # 运行预处理（只处理新增或变化的文件）
     print("开始数据预处理...")
-    preprocessor.preprocess_all_data()
+    preprocessor.preprocess_all_data(force=args.force, workers=args.workers, shard_size=args.shard_size)
     
     # 测试快速加载
-    fast_loader = FastTrafficDataLoader()
+    fast_loader = FastTrafficDataLoader(args.data_dir)
     
     # 测试时间范围查询
     start_time = 1379030400  # 2013-09-13 08:00
@@ -1,13 +1,67 @@
 import pandas as pd
 import numpy as np
 import os
-from typing import List, Dict, Tuple, Optional, Union, Any
+import json
+import hashlib
+from typing import List, Dict, Tuple, Optional, Union, Any, Iterator
 from datetime import datetime
 import math
 from collections import defaultdict
-from .models import HeatmapPoint, TrackPoint, VehicleTrack
+from .models import TrackPoint, VehicleTrack
+from .dataset_store import PartitionedDatasetStore, normalize_chunk
+from .column_store import ColumnStore
+from .data_preprocessor import FastTrafficDataLoader
+from .streaming import HeatmapAccumulator, SpeedAnomalyCounter
+from .aggregation import AggregationSpec, OutOfCoreAggregator, aggregate
+from .sparse_grid import SparseGrid
+from .heatmap_engine import COORD_SCALE, KDE_OVERSAMPLE, SpaceTimeCube
+from .frame_cache import FrameCache
+from .heatmap_tiles import TileCache, build_tile, tile_resolution, time_bucket, validate_tile
+from .result_cache import ResultCache, RESULT_CACHE_FILENAME
+from .jobs import report_progress
+from .vehicle_index import (
+    iter_vehicle_groups, ensure_vehicle_sorted, is_vehicle_sorted, mark_vehicle_sorted, select_vehicle
+)
 import logging
 
+# DataFrame.attrs 中记录数据来源的键
+DATA_SOURCE_ATTR = 'data_source'
+# DataFrame.attrs 中记录 load_data 截断、限行、采样说明的键
+DATA_LIMITS_ATTR = 'data_limits'
+# 数据来源（按优先级排列）
+SOURCE_COLUMN_STORE = 'column_store'
+SOURCE_DATASET = 'dataset'
+SOURCE_PREPROCESSED = 'preprocessed'
+SOURCE_CSV = 'csv'
+
+
+def data_source_of(df: pd.DataFrame) -> Optional[str]:
+    """
+    返回 load_data 结果的数据来源说明，如 column_store 或 preprocessed+csv
+
+    结果被截断时间范围、限制行数或采样时附带说明，如 csv（时间范围截断到24小时；随机采样 100000/350000 行）
+    """
+    source = df.attrs.get(DATA_SOURCE_ATTR)
+    limits = data_limits_of(df)
+    if source is None or not limits:
+        return source
+    return f"{source}（{'；'.join(limits)}）"
+
+
+def data_limits_of(df: pd.DataFrame) -> List[str]:
+    """返回 load_data 结果的截断、限行、采样说明，完整结果为空列表"""
+    return list(df.attrs.get(DATA_LIMITS_ATTR, []))
+
+
+def _with_limits(df: pd.DataFrame, limits: List[str]) -> pd.DataFrame:
+    """在结果的浅拷贝上追加本次查询的说明（缓存中的结果不受影响）"""
+    if not limits:
+        return df
+    df = df.copy(deep=False)
+    df.attrs[DATA_LIMITS_ATTR] = limits + data_limits_of(df)
+    return df
+
+
 class TrafficDataProcessor:
     """交通数据处理类，负责加载、处理和转换交通数据"""
     
@@ -41,9 +95,364 @@ class TrafficDataProcessor:
             
         print(f"数据目录: {self.data_dir}")
         
-        # 缓存已加载的数据
-        self._cached_data = {}
+        # 缓存已加载的数据（按字节数限制容量的LRU，子范围查询可由缓存的超集切片得到）
+        self.frame_cache = FrameCache()
+        # 持久化的分析结果缓存（SQLite，重启后仍有效，多个worker进程共享）
+        self.result_cache = ResultCache(os.path.join(self.data_dir, RESULT_CACHE_FILENAME))
+        # 热力图瓦片缓存（按时间桶和缩放级别统计的网格及其切出的瓦片）
+        self.tile_cache = TileCache()
+        self._csv_files = None
+        # 数据集版本（数据目录监视器运行时由其维护，见 dataset_watcher）
+        self._dataset_version = None
+        
+        # 分区Parquet数据集（通过 dataset_store 的导入命令生成）
+        self.dataset_store = PartitionedDatasetStore(self.data_dir)
+        # 内存映射列存储（由分区数据集构建，多个worker共享页缓存）
+        self.column_store = ColumnStore(self.data_dir)
+        # 数据集目录（导入时生成，记录各文件的时间范围、行数和车辆数）
+        self.catalog = self.dataset_store.catalog
+        # 预处理的小时数据（由 data_preprocessor 生成，首次使用时加载索引）
+        self._fast_loader = None
+    
+    @property
+    def fast_loader(self) -> FastTrafficDataLoader:
+        """预处理数据加载器"""
+        if self._fast_loader is None:
+            self._fast_loader = FastTrafficDataLoader(self.data_dir)
+        return self._fast_loader
+    
+    def _source_coverage(self, allow_sampled: bool = True) -> List[Tuple[str, Any]]:
+        """
+        各数据来源覆盖的小时，按优先级排列
+        
+        Args:
+            allow_sampled: 是否可以使用预处理数据（每小时已采样，不是完整数据）
+        
+        Returns:
+            [(来源名, 判断某小时是否被覆盖的函数), ...]
+        """
+        coverage = []
+        if self.column_store.is_available() and self.column_store.meta.get('min_utc') is not None:
+            first_hour = self.column_store.meta['min_utc'] // 3600 * 3600
+            last_hour = self.column_store.meta['max_utc'] // 3600 * 3600
+            coverage.append((SOURCE_COLUMN_STORE, lambda hour: first_hour <= hour <= last_hour))
+        if self.dataset_store.is_available():
+            if self.catalog.reload() and self.catalog.parts:
+                dataset_hours = {part['hour'] for part in self.catalog.parts if part.get('rows')}
+            else:
+                dataset_hours = {hour for hour, _ in self.dataset_store._iter_partitions()}
+            coverage.append((SOURCE_DATASET, dataset_hours.__contains__))
+        preprocessed_hours = self.fast_loader.available_hours() if allow_sampled else None
+        if preprocessed_hours:
+            coverage.append((SOURCE_PREPROCESSED, preprocessed_hours.__contains__))
+        return coverage
+    
+    def plan_sources(self, start_time: float, end_time: float,
+                     allow_sampled: bool = True) -> List[Tuple[str, float, float]]:
+        """
+        为查询时间范围选择数据来源
+        
+        按小时逐段选择优先级最高的可用来源（列存储 > 分区数据集 > 预处理数据），
+        都不覆盖的小时回退到原始CSV，相邻且来源相同的小时合并为一段
+        
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            allow_sampled: 是否可以使用预处理数据；需要完整数据时为False，这些小时改由原始CSV提供
+        
+        Returns:
+            [(来源名, 段开始时间, 段结束时间), ...]
+        """
+        coverage = self._source_coverage(allow_sampled)
+        plan = []
+        hour = int(start_time) // 3600 * 3600
+        while hour <= end_time:
+            source = next((name for name, covers in coverage if covers(hour)), SOURCE_CSV)
+            segment_start = max(start_time, hour)
+            segment_end = min(end_time, hour + 3599)
+            if plan and plan[-1][0] == source:
+                plan[-1] = (source, plan[-1][1], segment_end)
+            else:
+                plan.append((source, segment_start, segment_end))
+            hour += 3600
+        return plan
+    
+    def _load_segment(self, source: str, start_time: float, end_time: float, vehicle_id: str = None,
+                      columns: List[str] = None) -> pd.DataFrame:
+        """从指定来源加载一段时间范围的数据"""
+        if source == SOURCE_COLUMN_STORE:
+            # 内存映射列存储，按时间二分定位后直接切片
+            return self.column_store.load_frame(start_time, end_time, columns=columns, vehicle_id=vehicle_id)
+        if source == SOURCE_DATASET:
+            # 分区Parquet数据集，只读取重叠的分区和行组
+            return self.dataset_store.read(start_time, end_time, columns=columns, vehicle_id=vehicle_id)
+        if source == SOURCE_PREPROCESSED:
+            # 预处理的小时数据（每小时已采样）
+            df = self.fast_loader.fast_load_data(start_time, end_time, vehicle_id)
+            if not df.empty:
+                df = df.drop(columns=['hour'], errors='ignore')
+                if columns:
+                    df = df[[col for col in columns if col in df.columns]]
+                if 'COMMADDR' in df.columns:
+                    df['COMMADDR'] = self.dataset_store.dictionary.categorize(df['COMMADDR'])
+            return df
+        df = self._load_from_csv(start_time, end_time, vehicle_id)
+        if columns and not df.empty:
+            df = df[[col for col in columns if col in df.columns]]
+        return df
+    
+    def iter_chunks(self, start_time: float, end_time: float, columns: List[str] = None,
+                    vehicle_id: str = None, batch_size: int = 200000) -> Iterator[pd.DataFrame]:
+        """
+        按批次流式读取时间范围内的全部数据
+        
+        与 load_data 不同，不截断查询时间、不限制行数、不采样，也不在内存中拼接结果；
+        不使用已采样的预处理数据（这些小时由原始CSV提供），每个批次的 attrs['data_source'] 记录其来源
+        
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            columns: 需要的列，None表示全部列
+            vehicle_id: 车辆ID，可选
+            batch_size: 每批的行数上限（按来源不同为扫描行数或结果行数）
+            
+        Yields:
+            类型规整的数据批次（COMMADDR 为字典编码的 Categorical）
+        """
+        for source, segment_start, segment_end in self.plan_sources(start_time, end_time, allow_sampled=False):
+            if source == SOURCE_COLUMN_STORE:
+                batches = self.column_store.iter_batches(segment_start, segment_end, columns, vehicle_id, batch_size)
+            elif source == SOURCE_DATASET:
+                batches = self.dataset_store.iter_batches(segment_start, segment_end, columns, vehicle_id, batch_size)
+            else:
+                batches = self._iter_csv_chunks(segment_start, segment_end, columns, vehicle_id, batch_size)
+            
+            for batch in batches:
+                if batch.empty:
+                    continue
+                batch.attrs[DATA_SOURCE_ATTR] = source
+                yield batch
+    
+    def _typed_chunk(self, chunk: pd.DataFrame, start_time: float, end_time: float,
+                     columns: List[str] = None, vehicle_id: str = None) -> pd.DataFrame:
+        """规整原始数据块的类型，按时间和车辆过滤，并对车辆列做字典编码"""
+        chunk = normalize_chunk(chunk)
+        if chunk.empty:
+            return chunk
+        mask = (chunk['UTC'] >= np.floor(start_time)) & (chunk['UTC'] <= np.floor(end_time))
+        if vehicle_id:
+            mask &= chunk['COMMADDR'] == str(vehicle_id)
+        chunk = chunk[mask]
+        if columns:
+            chunk = chunk[[col for col in columns if col in chunk.columns]]
+        if 'COMMADDR' in chunk.columns:
+            chunk = chunk.assign(COMMADDR=self.dataset_store.dictionary.categorize(chunk['COMMADDR']))
+        return chunk
+    
+    def _iter_csv_chunks(self, start_time: float, end_time: float, columns: List[str] = None,
+                         vehicle_id: str = None, batch_size: int = 200000) -> Iterator[pd.DataFrame]:
+        """分块扫描时间范围相交的原始CSV文件"""
+        csv_files = self.catalog.prune_csv_files(self.get_csv_files(), start_time, end_time)
+        for file_path in csv_files:
+            for chunk in pd.read_csv(file_path, chunksize=batch_size, dtype={'COMMADDR': str}):
+                yield self._typed_chunk(chunk, start_time, end_time, columns, vehicle_id)
+    
+    def aggregate(self, start_time: float, end_time: float, specs: Dict[str, AggregationSpec],
+                  group_by: str = None, vehicle_id: str = None) -> Dict[str, Any]:
+        """
+        外存聚合：逐批遍历完整时间范围并合并部分聚合结果
+        
+        不受 load_data 的24小时截断、行数上限和采样影响，结果是精确值
+        
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            specs: 指标名到聚合指标的映射（count, sum, mean, min, max, distinct, histogram）
+            group_by: 时间分组方式（hour, day, week, month），None表示不分组
+            vehicle_id: 车辆ID，可选
+            
+        Returns:
+            {'rows': 参与聚合的行数, 'results': 聚合结果, 'data_source': 数据来源}
+        """
+        result = aggregate(self, start_time, end_time, specs, group_by, vehicle_id)
+        result['data_source'] = self.describe_sources(start_time, end_time, allow_sampled=False)
+        return result
+    
+    def describe_sources(self, start_time: float, end_time: float, allow_sampled: bool = True) -> str:
+        """时间范围内使用的数据来源说明，如 column_store 或 preprocessed+csv（allow_sampled 同 plan_sources）"""
+        return '+'.join(dict.fromkeys(
+            source for source, _, _ in self.plan_sources(start_time, end_time, allow_sampled)
+        ))
+    
+    def calculate_statistics_streaming(self, start_time: float, end_time: float,
+                                       group_by: str = 'hour') -> Dict[str, Any]:
+        """
+        以外存聚合计算完整时间范围的精确统计信息（不截断、不采样，内存占用恒定）
+        
+        Returns:
+            与 calculate_statistics 格式相同的统计结果
+        """
+        if group_by not in ('hour', 'day', 'week', 'month'):
+            group_by = 'hour'
+        overall = OutOfCoreAggregator({
+            'points': AggregationSpec('count'),
+            'vehicles': AggregationSpec('distinct', 'COMMADDR'),
+            'speed': AggregationSpec('mean', 'SPEED'),
+            'min_time': AggregationSpec('min', 'UTC'),
+            'max_time': AggregationSpec('max', 'UTC'),
+        })
+        by_time = OutOfCoreAggregator({'points': AggregationSpec('count')}, group_by)
+        for chunk in self.iter_chunks(start_time, end_time, columns=['UTC', 'COMMADDR', 'SPEED']):
+            overall.update(chunk)
+            by_time.update(chunk)
+        
+        totals = overall.result()
+        if totals['points'] == 0:
+            return {
+                'total_vehicles': 0,
+                'total_points': 0,
+                'active_vehicles': 0,
+                'time_span': '0小时',
+                'coverage_area': '未知',
+                'average_speed': 0,
+                'time_distribution': []
+            }
+        return {
+            'total_vehicles': totals['vehicles'],
+            'total_points': totals['points'],
+            'active_vehicles': totals['vehicles'],
+            'time_span': f"{(totals['max_time'] - totals['min_time']) / 3600:.1f}小时",
+            'coverage_area': '济南市区',  # 简化处理，与 calculate_statistics 一致
+            'average_speed': round(totals['speed'] or 0, 1),
+            'time_distribution': [
+                {'time_key': time_key, 'count': values['points']}
+                for time_key, values in by_time.result().items()
+            ]
+        }
+    
+    def generate_heatmap_data_streaming(self, start_time: float, end_time: float,
+                                        resolution: float = 0.001) -> List[Dict[str, Any]]:
+        """流式生成完整时间范围的热力图（网格划分与 generate_heatmap_data 相同）"""
+        accumulator = HeatmapAccumulator(resolution)
+        for chunk in self.iter_chunks(start_time, end_time, columns=['LAT', 'LON']):
+            accumulator.update(chunk)
+        return accumulator.result()
+    
+    def generate_kde_heatmap_streaming(self, start_time: float, end_time: float, resolution: float = 0.001,
+                                       bandwidth: float = 0.002, threshold: float = 0.05) -> List[Dict[str, Any]]:
+        """流式生成完整时间范围的核密度热力图（参数与 generate_kde_heatmap 相同）"""
+        accumulator = HeatmapAccumulator(resolution / KDE_OVERSAMPLE)
+        for chunk in self.iter_chunks(start_time, end_time, columns=['LAT', 'LON']):
+            accumulator.update(chunk)
+        return accumulator.grid.kde_records(bandwidth, KDE_OVERSAMPLE, threshold)
+    
+    def generate_heatmap_tile(self, start_time: float, end_time: float,
+                              z: int, x: int, y: int) -> Dict[str, Any]:
+        """
+        生成一个 XYZ 热力图瓦片
+        
+        时间范围向外取整到时间桶，整个时间桶的数据按缩放级别对应的分辨率流式统计一次（层级网格），
+        瓦片只包含网格中心落在瓦片内的单元；层级网格和瓦片都进入瓦片缓存
+        
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            z: 缩放级别
+            x: 瓦片列号
+            y: 瓦片行号
+            
+        Returns:
+            瓦片数据，见 heatmap_tiles.build_tile
+        """
+        validate_tile(z, x, y)
+        bucket = time_bucket(start_time, end_time)
+        key = (bucket[0], bucket[1], z, x, y)
+        tile = self.tile_cache.get_tile(key)
+        if tile is not None:
+            return tile
+        
+        resolution = tile_resolution(z)
+        
+        def compute_level() -> SparseGrid:
+            accumulator = HeatmapAccumulator(resolution)
+            for chunk in self.iter_chunks(bucket[0], bucket[1], columns=['LAT', 'LON']):
+                accumulator.update(chunk)
+            return accumulator.grid
+        
+        grid = self.tile_cache.level((bucket[0], bucket[1], z), compute_level)
+        tile = build_tile(grid, z, x, y, bucket)
+        self.tile_cache.put_tile(key, tile)
+        return tile
+    
+    def count_speed_anomalies_streaming(self, start_time: float, end_time: float,
+                                        thresholds: Dict[str, Any] = None) -> Dict[str, Any]:
+        """流式统计完整时间范围内的速度异常点数"""
+        thresholds = thresholds or {}
+        counter = SpeedAnomalyCounter(thresholds.get("speed_threshold_low", 5),
+                                      thresholds.get("speed_threshold_high", 80))
+        for chunk in self.iter_chunks(start_time, end_time, columns=['SPEED']):
+            counter.update(chunk)
+        return counter.result()
+    
+    def get_time_range(self) -> Optional[Tuple[int, int]]:
+        """
+        数据集的时间范围
+        
+        Returns:
+            (最小UTC, 最大UTC)，尚未生成数据集目录或列存储时返回None
+        """
+        time_range = self.catalog.time_range()
+        if time_range is None and self.column_store.is_available():
+            meta = self.column_store.meta
+            if meta.get('min_utc') is not None:
+                time_range = (meta['min_utc'], meta['max_utc'])
+        return time_range
+    
+    def partition_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """数据目录中原始CSV分区文件的快照：文件路径 -> (大小, 修改时间纳秒)"""
+        snapshot = {}
+        if os.path.isdir(self.data_dir):
+            for entry in os.scandir(self.data_dir):
+                if entry.name.endswith('.csv') and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+    
+    def derived_store_mtimes(self) -> Dict[str, float]:
+        """派生存储（数据集目录、列存储、预处理清单）元数据文件的修改时间"""
+        paths = (
+            self.catalog.catalog_path,
+            os.path.join(self.column_store.store_dir, 'meta.json'),
+            os.path.join(self.data_dir, 'indexes', 'manifest.json'),
+        )
+        return {os.path.basename(path): os.path.getmtime(path) for path in paths if os.path.exists(path)}
+    
+    @staticmethod
+    def snapshot_version(snapshot: Dict[str, Tuple[int, int]], derived_mtimes: Dict[str, float]) -> str:
+        """分区快照和派生存储修改时间的版本哈希"""
+        entries = sorted((os.path.basename(path), size, mtime) for path, (size, mtime) in snapshot.items())
+        return hashlib.sha1(json.dumps([entries, sorted(derived_mtimes.items())]).encode('utf-8')).hexdigest()
+    
+    def dataset_fingerprint(self) -> str:
+        """
+        数据集版本指纹（由原始CSV分区文件的名称、大小、修改时间和派生存储的修改时间计算）
+        
+        数据目录监视器运行时返回它维护的版本，分区变化时由监视器更新；
+        未启用监视器时每次调用都重新计算
+        """
+        if self._dataset_version is not None:
+            return self._dataset_version
+        return self.snapshot_version(self.partition_snapshot(), self.derived_store_mtimes())
+    
+    def set_dataset_version(self, version: str):
+        """设置数据集版本（由数据目录监视器在分区变化后调用）"""
+        self._dataset_version = version
+    
+    def refresh_sources(self):
+        """重新发现数据来源：CSV文件列表、列存储和预处理索引在下次使用时重新加载"""
         self._csv_files = None
+        self.column_store = ColumnStore(self.data_dir)
+        self._fast_loader = None
     
     def get_csv_files(self) -> List[str]:
         """获取数据目录中的所有CSV文件"""
@@ -56,46 +465,121 @@ class TrafficDataProcessor:
             ]
         return self._csv_files
     
-    def load_data(self, start_time: float, end_time: float, vehicle_id: str = None) -> pd.DataFrame:
+    def load_data(self, start_time: float, end_time: float, vehicle_id: str = None,
+                  columns: List[str] = None, full_rows: bool = False) -> pd.DataFrame:
         """
         加载指定时间范围和车辆ID的数据
         
+        已采样的预处理数据只用于不指定车辆、不需要完整轨迹的查询；
+        指定车辆或 full_rows 为True时，这些小时改由原始CSV提供
+        full_rows 不取消24小时截断和行数上限（需要精确结果时使用 iter_chunks/aggregate），
+        发生截断、限行或采样时说明记录在结果的 attrs 中，由 data_source_of 随响应返回
+        
         Args:
             start_time: 开始时间戳
             end_time: 结束时间戳
             vehicle_id: 车辆ID，如果为None则加载所有车辆数据
+            columns: 需要的列，None表示全部列（列存储和分区数据集支持列裁剪）
+            full_rows: 是否需要每辆车的完整轨迹点（轨迹、OD提取、停车检测等）
             
         Returns:
             符合条件的数据DataFrame
         """
         print(f"开始加载数据: {start_time} 到 {end_time}")
         
-        # 添加数据集时间范围验证
-        # 2013年9月12日到9月18日的UTC时间戳范围（示例值，需要根据实际数据调整）
-        min_valid_time = 1378944000  # 2013-09-12 00:00:00 UTC
-        max_valid_time = 1379548799  # 2013-09-18 23:59:59 UTC
+        # 检查请求的时间范围是否与数据集时间范围有交集（时间范围来自数据集目录）
+        time_range = self.get_time_range()
+        if time_range is not None:
+            min_valid_time, max_valid_time = time_range
+            if end_time < min_valid_time or start_time > max_valid_time:
+                print(f"警告：请求的时间范围 ({start_time}-{end_time}) 超出数据集范围 ({min_valid_time}-{max_valid_time})")
+                return pd.DataFrame()  # 返回空数据框
         
-        # 检查请求的时间范围是否与数据集时间范围有交集
-        if end_time < min_valid_time or start_time > max_valid_time:
-            print(f"警告：请求的时间范围 ({start_time}-{end_time}) 超出数据集范围 ({min_valid_time}-{max_valid_time})")
-            return pd.DataFrame()  # 返回空数据框
-        
-        # 限制查询时间范围，避免处理过多数据
+        # 限制查询时间范围，避免处理过多数据（截断说明随结果返回，见 data_source_of）
+        query_limits = []
         time_span_hours = (end_time - start_time) / 3600
         if time_span_hours > 24:
             print(f"警告：查询时间跨度过大 ({time_span_hours:.1f} 小时)，建议缩短到24小时以内")
             # 可以选择截断到24小时或返回警告
             end_time = start_time + 24 * 3600
             print(f"自动截断到24小时: {start_time} 到 {end_time}")
+            query_limits.append(f"时间范围截断到24小时，请求 {time_span_hours:.1f} 小时")
         
-        # 生成缓存键
-        cache_key = f"{start_time}_{end_time}_{vehicle_id}"
-        
-        # 如果已缓存，直接返回
-        if cache_key in self._cached_data:
+        # 如果已缓存（或已缓存覆盖该查询的完整结果），直接返回
+        allow_sampled = not (vehicle_id or full_rows)
+        cached = self.frame_cache.get(start_time, end_time, vehicle_id, columns, allow_sampled)
+        if cached is not None:
             print("使用缓存数据")
-            return self._cached_data[cache_key]
+            return _with_limits(cached, query_limits)
+        
+        # 按小时选择数据来源，未被任何预处理数据覆盖的时段才回退到原始CSV
+        plan = self.plan_sources(start_time, end_time, allow_sampled)
+        frames = []
+        row_limits = []
+        for source, segment_start, segment_end in plan:
+            print(f"从 {source} 加载: {segment_start} 到 {segment_end}")
+            frame = self._load_segment(source, segment_start, segment_end, vehicle_id, columns)
+            row_limits.extend(data_limits_of(frame))
+            if not frame.empty:
+                frames.append(frame)
+        data_source = '+'.join(dict.fromkeys(source for source, _, _ in plan))
+        
+        if len(frames) == 1:
+            result_df = frames[0]
+        elif frames:
+            # 多个来源拼接后统一车辆编码（拼接结果不再保持按车辆排序）
+            result_df = pd.concat(frames, ignore_index=True)
+            result_df.attrs = {}
+            if 'COMMADDR' in result_df.columns:
+                result_df['COMMADDR'] = self.dataset_store.dictionary.categorize(result_df['COMMADDR'])
+        else:
+            result_df = pd.DataFrame()
         
+        if not result_df.empty:
+            print(f"最终数据集大小: {len(result_df)} 行")
+            
+            # 调整采样策略：对于大数据集进行智能采样（采样后恢复原有行序，保留按车辆排序的布局）
+            sorted_by_vehicle = is_vehicle_sorted(result_df)
+            # 含预处理数据的结果已被采样，不能用于回答子范围或单辆车的查询
+            sampled = any(source == SOURCE_PREPROCESSED for source, _, _ in plan)
+            complete = len(result_df) <= 100000 and not sampled
+            if sampled:
+                row_limits.append("含每小时已采样的预处理数据")
+            total_rows = len(result_df)
+            if total_rows > 200000:
+                print(f"数据量很大，随机采样到 200000 行")
+                result_df = result_df.sample(n=200000, random_state=42).sort_index().reset_index(drop=True)
+            elif total_rows > 100000:
+                print(f"数据量较大，随机采样到 100000 行")
+                result_df = result_df.sample(n=100000, random_state=42).sort_index().reset_index(drop=True)
+            if len(result_df) < total_rows:
+                row_limits.append(f"随机采样 {len(result_df)}/{total_rows} 行")
+            if sorted_by_vehicle:
+                mark_vehicle_sorted(result_df)
+            result_df.attrs[DATA_SOURCE_ATTR] = data_source
+            result_df.attrs[DATA_LIMITS_ATTR] = row_limits
+            print(f"数据来源: {data_source_of(result_df)}")
+            
+            # 缓存结果（采样过的结果只用于精确命中）
+            self.frame_cache.put(start_time, end_time, result_df, vehicle_id, columns, complete, sampled)
+            
+            return _with_limits(result_df, query_limits)
+        else:
+            print("未找到符合条件的数据")
+            return pd.DataFrame()
+    
+    def _load_from_csv(self, start_time: float, end_time: float, vehicle_id: str = None) -> pd.DataFrame:
+        """
+        逐个扫描原始CSV文件加载数据（未生成分区数据集时使用）
+        
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            vehicle_id: 车辆ID，可选
+            
+        Returns:
+            符合条件的数据DataFrame
+        """
         # 获取所有CSV文件
         csv_files = self.get_csv_files()
         
@@ -103,7 +587,10 @@ class TrafficDataProcessor:
             print("未找到CSV文件")
             return pd.DataFrame()
         
-        print(f"找到 {len(csv_files)} 个CSV文件")
+        # 按数据集目录记录的时间范围跳过不可能包含查询时段的文件
+        total_files = len(csv_files)
+        csv_files = self.catalog.prune_csv_files(csv_files, start_time, end_time)
+        print(f"找到 {total_files} 个CSV文件，时间范围相交的 {len(csv_files)} 个")
         
         # 存储所有符合条件的数据
         all_data = []
@@ -116,7 +603,7 @@ class TrafficDataProcessor:
             try:
                 # 使用分块读取大文件
                 chunk_size = 50000  # 减小chunk_size以提高响应速度
-                chunks = pd.read_csv(file_path, chunksize=chunk_size)
+                chunks = pd.read_csv(file_path, chunksize=chunk_size, dtype={'COMMADDR': str})
                 
                 for chunk_num, chunk in enumerate(chunks):
                     if total_rows_processed >= max_rows_limit:
@@ -137,10 +624,8 @@ class TrafficDataProcessor:
                     if len(filtered_chunk) > 0:
                         print(f"  时间过滤后保留 {len(filtered_chunk)} 行")
                     
-                    # 车辆ID过滤
+                    # 车辆ID过滤（读取时已按字符串解析车辆列）
                     if vehicle_id:
-                        # 确保类型匹配，避免因类型不一致导致过滤失败
-                        filtered_chunk['COMMADDR'] = filtered_chunk['COMMADDR'].astype(str)
                         filtered_chunk = filtered_chunk[filtered_chunk['COMMADDR'] == str(vehicle_id)]
                         if len(filtered_chunk) > 0:
                             print(f"  车辆过滤后保留 {len(filtered_chunk)} 行")
@@ -156,66 +641,63 @@ class TrafficDataProcessor:
             except Exception as e:
                 print(f"处理文件 {os.path.basename(file_path)} 时出错: {e}")
         
-        # 合并所有数据
+        # 合并所有数据，车辆列转换为字典编码
         if all_data:
             print("合并数据...")
             result_df = pd.concat(all_data, ignore_index=True)
-            print(f"最终数据集大小: {len(result_df)} 行")
-            
-            # 调整采样策略：对于大数据集进行智能采样
-            if len(result_df) > 200000:
-                print(f"数据量很大，随机采样到 200000 行")
-                result_df = result_df.sample(n=200000, random_state=42)
-            elif len(result_df) > 100000:
-                print(f"数据量较大，随机采样到 100000 行")
-                result_df = result_df.sample(n=100000, random_state=42)
-            
-            # 缓存结果（限制缓存大小）
-            if len(self._cached_data) < 3:  # 减少缓存数量，节省内存
-                self._cached_data[cache_key] = result_df
-            
+            result_df['COMMADDR'] = self.dataset_store.dictionary.categorize(result_df['COMMADDR'])
+            if total_rows_processed >= max_rows_limit:
+                result_df.attrs[DATA_LIMITS_ATTR] = [f"原始CSV只读取前 {max_rows_limit} 行"]
             return result_df
-        else:
-            print("未找到符合条件的数据")
-            return pd.DataFrame()
+        return pd.DataFrame()
     
-    def generate_heatmap_data(self, df: pd.DataFrame, resolution: float = 0.001) -> List[HeatmapPoint]:
+    def heatmap_grid(self, df: pd.DataFrame, resolution: float = 0.001) -> SparseGrid:
         """
-        生成热力图数据
+        热力图网格计数（列式数组，不修改传入的DataFrame）
         
         Args:
             df: 包含经纬度数据的DataFrame
             resolution: 热力图分辨率（经纬度网格大小）
             
         Returns:
-            热力图点列表
+            稀疏网格计数
         """
-        if df.empty:
-            return []
-        
-        # 确保经纬度列存在
-        if 'LAT' not in df.columns or 'LON' not in df.columns:
+        if not df.empty and ('LAT' not in df.columns or 'LON' not in df.columns):
             print("数据中缺少经纬度列")
-            return []
-        
-        # 转换坐标（假设原始数据需要除以1e5）
-        df['lat'] = df['LAT'] / 1e5
-        df['lng'] = df['LON'] / 1e5
-        
-        # 按分辨率网格化
-        df['lat_grid'] = (df['lat'] / resolution).round() * resolution
-        df['lng_grid'] = (df['lng'] / resolution).round() * resolution
+        return SparseGrid.from_frame(df, resolution)
+    
+    def generate_kde_heatmap(self, df: pd.DataFrame, resolution: float = 0.001, bandwidth: float = 0.002,
+                             threshold: float = 0.05) -> List[Dict[str, Any]]:
+        """
+        生成核密度估计（KDE）热力图
         
-        # 统计每个网格的点数
-        grid_counts = df.groupby(['lat_grid', 'lng_grid']).size().reset_index(name='count')
+        先按 resolution / KDE_OVERSAMPLE 的细网格计数，再用 FFT 与高斯核卷积，
+        按 resolution 取样并去掉低于阈值的单元：比直接按细网格计数平滑，返回的单元也少得多
         
-        # 转换为热力图点列表
-        heatmap_points = [
-            HeatmapPoint(lat=row['lat_grid'], lng=row['lng_grid'], count=row['count'])
-            for _, row in grid_counts.iterrows()
-        ]
+        Args:
+            df: 包含经纬度数据的DataFrame
+            resolution: 输出分辨率（经纬度网格大小）
+            bandwidth: 高斯核带宽（度）
+            threshold: 相对最大密度的阈值
+            
+        Returns:
+            热力图点字典列表 [{'lat', 'lng', 'count', 'intensity'}]，按纬度、经度排序
+        """
+        grid = self.heatmap_grid(df, resolution / KDE_OVERSAMPLE)
+        return grid.kde_records(bandwidth, KDE_OVERSAMPLE, threshold)
+    
+    def generate_heatmap_data(self, df: pd.DataFrame, resolution: float = 0.001) -> List[Dict[str, Any]]:
+        """
+        生成热力图数据
         
-        return heatmap_points
+        Args:
+            df: 包含经纬度数据的DataFrame
+            resolution: 热力图分辨率（经纬度网格大小）
+            
+        Returns:
+            热力图点字典列表 [{'lat', 'lng', 'count'}]，按纬度、经度排序
+        """
+        return self.heatmap_grid(df, resolution).to_records()
     
     def generate_track_data(self, df: pd.DataFrame, vehicle_id: str = None) -> List[VehicleTrack]:
         """
@@ -237,22 +719,17 @@ class TrafficDataProcessor:
             print("数据中缺少必要的列")
             return []
         
-        # 如果指定了车辆ID，则只处理该车辆
+        # 如果指定了车辆ID，则只处理该车辆（在车辆编码上比较）
         if vehicle_id:
-            # 确保类型匹配，避免因类型不一致导致过滤失败
-            df['COMMADDR'] = df['COMMADDR'].astype(str)
-            df = df[df['COMMADDR'] == str(vehicle_id)]
+            df = select_vehicle(df, vehicle_id)
             if df.empty:
                 return []
         
         # 存储所有车辆的轨迹
         all_tracks = []
         
-        # 按车辆ID分组处理
-        for veh_id, group in df.groupby('COMMADDR'):
-            # 按时间排序
-            group = group.sort_values('UTC')
-            
+        # 按车辆逐段处理（数据按车辆和时间排序，每辆车是一段连续切片）
+        for veh_id, group in iter_vehicle_groups(df):
             # 提取轨迹点
             track_points = []
             for _, row in group.iterrows():
@@ -333,27 +810,27 @@ class TrafficDataProcessor:
         lon_range = df['LON'].max() - df['LON'].min()
         coverage_area = '济南市区'  # 简化处理，实际应根据经纬度范围确定
         
-        # 时间分布统计
-        df['datetime'] = pd.to_datetime(df['UTC'], unit='s')
+        # 时间分布统计（分组键单独计算，不修改传入的DataFrame）
+        datetimes = pd.to_datetime(df['UTC'], unit='s')
         
         if group_by == 'hour':
-            df['time_group'] = df['datetime'].dt.hour
+            time_group = datetimes.dt.hour
             group_format = '{:02d}时'
         elif group_by == 'day':
-            df['time_group'] = df['datetime'].dt.day
+            time_group = datetimes.dt.day
             group_format = '{:02d}日'
         elif group_by == 'week':
-            df['time_group'] = df['datetime'].dt.isocalendar().week
+            time_group = datetimes.dt.isocalendar().week
             group_format = '第{:02d}周'
         elif group_by == 'month':
-            df['time_group'] = df['datetime'].dt.month
+            time_group = datetimes.dt.month
             group_format = '{:02d}月'
         else:
-            df['time_group'] = df['datetime'].dt.hour
+            time_group = datetimes.dt.hour
             group_format = '{:02d}时'
         
         # 计算每个时间段的数据点数量
-        time_counts = df.groupby('time_group').size()
+        time_counts = time_group.groupby(time_group).size()
         
         # 转换为列表格式
         time_distribution = [
@@ -373,8 +850,10 @@ class TrafficDataProcessor:
         }
     
     def clear_cache(self):
-        """清除数据缓存"""
-        self._cached_data = {}
+        """清除数据缓存和持久化结果缓存"""
+        self.frame_cache.clear()
+        self.result_cache.clear()
+        self.tile_cache.clear()
         print("数据缓存已清除")
     
     def detect_anomalies(self, df: pd.DataFrame, detection_types: str = "all", thresholds: Dict[str, Any] = None) -> List[Dict[str, Any]]:
@@ -433,10 +912,8 @@ class TrafficDataProcessor:
         stop_duration_threshold = thresholds.get("long_stop_duration", 300)
         distance_threshold = thresholds.get("stop_distance_threshold", 0.0001)
         
-        # 按车辆分组
-        for vehicle_id, group in df.groupby('COMMADDR'):
-            group = group.sort_values('UTC').reset_index(drop=True)
-            
+        # 按车辆逐段处理
+        for vehicle_id, group in iter_vehicle_groups(df):
             if len(group) < 2:
                 continue
             
@@ -528,6 +1005,7 @@ class TrafficDataProcessor:
         
         # 使用空间网格来检测聚集
         grid_size = 0.005  # 约500米
+        df = df.copy(deep=False)
         df['lat_grid'] = (df['LAT'] / 1e5 / grid_size).round() * grid_size
         df['lng_grid'] = (df['LON'] / 1e5 / grid_size).round() * grid_size
         
@@ -570,10 +1048,8 @@ class TrafficDataProcessor:
         anomalies = []
         detour_ratio = thresholds.get("detour_ratio", 1.5)
         
-        # 按车辆分组检测绕路
-        for vehicle_id, group in df.groupby('COMMADDR'):
-            group = group.sort_values('UTC').reset_index(drop=True)
-            
+        # 按车辆逐段检测绕路
+        for vehicle_id, group in iter_vehicle_groups(df):
             if len(group) < 3:
                 continue
             
@@ -623,24 +1099,24 @@ class TrafficDataProcessor:
     
     def _calculate_speed(self, df: pd.DataFrame) -> pd.DataFrame:
         """计算车辆速度"""
-        df = df.copy()
-        df['SPEED'] = 0.0
-        
-        for vehicle_id, group in df.groupby('COMMADDR'):
-            group = group.sort_values('UTC').reset_index()
-            
-            for i in range(1, len(group)):
-                lat1, lon1 = group.iloc[i-1]['LAT'] / 1e5, group.iloc[i-1]['LON'] / 1e5
-                lat2, lon2 = group.iloc[i]['LAT'] / 1e5, group.iloc[i]['LON'] / 1e5
-                time_diff = group.iloc[i]['UTC'] - group.iloc[i-1]['UTC']
-                
-                if time_diff > 0:
-                    # 计算距离（公里）
-                    distance = math.sqrt((lat2 - lat1)**2 + (lon2 - lon1)**2) * 111
-                    # 计算速度（km/h）
-                    speed = distance / (time_diff / 3600)
-                    df.loc[group.iloc[i]['index'], 'SPEED'] = speed
-        
+        # 按车辆和时间排序后，相邻两行属于同一车辆时即为连续的轨迹点
+        df = ensure_vehicle_sorted(df).copy()
+        
+        ids = df['COMMADDR'].to_numpy()
+        lat = df['LAT'].to_numpy(dtype=float) / 1e5
+        lon = df['LON'].to_numpy(dtype=float) / 1e5
+        utc = df['UTC'].to_numpy(dtype=float)
+        
+        speed = np.zeros(len(df))
+        if len(df) > 1:
+            time_diff = np.diff(utc)
+            # 计算距离（公里）
+            distance = np.sqrt(np.diff(lat)**2 + np.diff(lon)**2) * 111
+            valid = (ids[1:] == ids[:-1]) & (time_diff > 0)
+            # 计算速度（km/h）
+            speed[1:][valid] = distance[valid] / (time_diff[valid] / 3600)
+        
+        df['SPEED'] = speed
         return df
     
     def _calculate_severity(self, anomaly_type: str, params: Dict[str, Any]) -> str:
@@ -801,7 +1277,9 @@ class TrafficDataProcessor:
         df: pd.DataFrame, 
         temporal_resolution: int = 15,
         spatial_resolution: float = 0.001,
-        smoothing: bool = True
+        smoothing: bool = True,
+        smoothing_window: int = 3,
+        smoothing_kernel: str = 'boxcar'
     ) -> List[Dict[str, Any]]:
         """
         生成动态热力图数据（时间序列热力图帧）
@@ -811,6 +1289,8 @@ class TrafficDataProcessor:
             temporal_resolution: 时间分辨率（分钟）
             spatial_resolution: 空间分辨率（度）
             smoothing: 是否平滑处理
+            smoothing_window: 平滑窗口大小（帧数，正奇数）
+            smoothing_kernel: 平滑卷积核（boxcar 或 gaussian）
             
         Returns:
             时间帧列表，每帧包含该时间段的热力图数据
@@ -818,101 +1298,55 @@ class TrafficDataProcessor:
         if df.empty:
             return []
         
-        # 确保时间列存在
-        if 'UTC' not in df.columns:
+        # 确保时间列和经纬度列存在
+        if 'UTC' not in df.columns or 'LAT' not in df.columns or 'LON' not in df.columns:
             return []
         
         # 计算时间范围
         min_time = df['UTC'].min()
         max_time = df['UTC'].max()
         
-        # 创建时间窗口
+        # 时间窗口从最早时间起每 temporal_resolution 分钟一个，共 ceil((最晚-最早)/窗口) 个，
+        # 每个窗口左闭右开（与逐窗口过滤时相同，恰好落在最后一个窗口右端的点不计入）
         time_window_seconds = temporal_resolution * 60
-        time_frames = []
+        frame_count = int(math.ceil((max_time - min_time) / time_window_seconds))
+        utc = df['UTC'].to_numpy(dtype=np.float64)
+        buckets = np.floor((utc - min_time) / time_window_seconds)
+        in_range = buckets < frame_count
+        buckets = buckets[in_range].astype(np.int64)
+        
+        # 一次遍历构建 (时间桶, 纬度单元, 经度单元) 稀疏计数立方体，各帧按下标切片得到
+        cube = SpaceTimeCube.from_points(
+            buckets,
+            df['LAT'].to_numpy(dtype=np.float64)[in_range] / COORD_SCALE,
+            df['LON'].to_numpy(dtype=np.float64)[in_range] / COORD_SCALE,
+            spatial_resolution
+        )
         
-        current_time = min_time
-        while current_time < max_time:
+        # 如果需要平滑处理：沿时间轴对立方体做加权移动平均（每帧的 point_count 仍为平滑前的单元数）
+        point_counts = cube.frame_sizes().tolist()
+        if smoothing:
+            cube = cube.smooth(smoothing_window, smoothing_kernel)
+        
+        time_frames = []
+        for position, bucket in enumerate(cube.buckets.tolist()):
+            current_time = min_time + bucket * time_window_seconds
             end_time = current_time + time_window_seconds
+            heatmap_points, total_intensity = cube.frame_records(position)
             
-            # 过滤当前时间窗口的数据
-            window_data = df[(df['UTC'] >= current_time) & (df['UTC'] < end_time)]
+            # 计算时间标签
+            time_label = f"{datetime.fromtimestamp(current_time).strftime('%H:%M')}-{datetime.fromtimestamp(end_time).strftime('%H:%M')}"
             
-            if not window_data.empty:
-                # 生成该时间窗口的热力图
-                heatmap_points = self.generate_heatmap_data(window_data, spatial_resolution)
-                
-                # 计算时间标签
-                time_label = f"{datetime.fromtimestamp(current_time).strftime('%H:%M')}-{datetime.fromtimestamp(end_time).strftime('%H:%M')}"
-                
-                # 计算总强度
-                total_intensity = sum(point.count for point in heatmap_points)
-                
-                frame_data = {
-                    "timestamp": current_time,
-                    "time_label": time_label,
-                    "heatmap_points": [
-                        {"lat": point.lat, "lng": point.lng, "intensity": point.count}
-                        for point in heatmap_points
-                    ],
-                    "total_intensity": total_intensity,
-                    "point_count": len(heatmap_points)
-                }
-                
-                time_frames.append(frame_data)
-            
-            current_time = end_time
-        
-        # 如果需要平滑处理
-        if smoothing and len(time_frames) > 2:
-            time_frames = self._smooth_temporal_data(time_frames)
+            time_frames.append({
+                "timestamp": current_time,
+                "time_label": time_label,
+                "heatmap_points": heatmap_points,
+                "total_intensity": total_intensity,
+                "point_count": point_counts[position]
+            })
         
         return time_frames
     
-    def _smooth_temporal_data(self, time_frames: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """对时间序列数据进行平滑处理"""
-        # 简单的移动平均平滑
-        smoothed_frames = []
-        window_size = 3
-        
-        for i, frame in enumerate(time_frames):
-            if i < window_size // 2 or i >= len(time_frames) - window_size // 2:
-                # 边界帧不平滑
-                smoothed_frames.append(frame)
-                continue
-            
-            # 计算窗口内的平均值
-            window_frames = time_frames[i - window_size//2:i + window_size//2 + 1]
-            
-            # 对热力图点进行平滑
-            point_dict = {}
-            for w_frame in window_frames:
-                for point in w_frame['heatmap_points']:
-                    key = f"{point['lat']:.4f},{point['lng']:.4f}"
-                    if key not in point_dict:
-                        point_dict[key] = {
-                            'lat': point['lat'],
-                            'lng': point['lng'],
-                            'intensities': []
-                        }
-                    point_dict[key]['intensities'].append(point['intensity'])
-            
-            # 计算平均强度
-            smoothed_points = []
-            for point_data in point_dict.values():
-                avg_intensity = sum(point_data['intensities']) / len(point_data['intensities'])
-                smoothed_points.append({
-                    'lat': point_data['lat'],
-                    'lng': point_data['lng'],
-                    'intensity': avg_intensity
-                })
-            
-            smoothed_frame = frame.copy()
-            smoothed_frame['heatmap_points'] = smoothed_points
-            smoothed_frame['total_intensity'] = sum(p['intensity'] for p in smoothed_points)
-            smoothed_frames.append(smoothed_frame)
-        
-        return smoothed_frames
-    
     def extract_od_pairs_from_data(
         self, 
         df: pd.DataFrame,
@@ -934,6 +1368,7 @@ class TrafficDataProcessor:
         """
         from .od_analysis_engine import ODAnalysisEngine
         
+        report_progress('提取OD对', rows=len(df))
         od_engine = ODAnalysisEngine()
         od_pairs = od_engine.extract_od_pairs(
             df, 
@@ -965,15 +1400,65 @@ class TrafficDataProcessor:
         """
         from .clustering_engine import ClusteringEngine
         
-        if df.empty:
+        cluster_data = self._prepare_cluster_data(df, data_type)
+        if not cluster_data:
             return [], {}
         
+        # 执行聚类
+        clustering_engine = ClusteringEngine()
+        labels, metrics = clustering_engine.cluster_data(
+            cluster_data,
+            algorithm=algorithm,
+            params=params or {}
+        )
+        
+        # 分析聚类结果
+        clusters = clustering_engine.analyze_clusters(
+            cluster_data,
+            labels,
+            cluster_type=data_type
+        )
+        
+        return clusters, metrics
+    
+    def optimize_clustering_params(
+        self,
+        df: pd.DataFrame,
+        data_type: str = "pickup",
+        algorithm: str = "dbscan",
+        param_ranges: Dict[str, List] = None
+    ) -> Dict[str, Any]:
+        """
+        在交通数据上搜索最佳聚类参数
+        
+        Args:
+            df: 交通数据DataFrame
+            data_type: 数据类型 ("pickup", "dropoff", "all_points")
+            algorithm: 聚类算法
+            param_ranges: 参数范围字典，None时使用默认范围
+            
+        Returns:
+            最佳参数和对应的指标
+        """
+        from .clustering_engine import ClusteringEngine
+        
+        cluster_data = self._prepare_cluster_data(df, data_type)
+        if not cluster_data:
+            return {}
+        return ClusteringEngine().optimize_clustering_params(cluster_data, algorithm, param_ranges)
+    
+    def _prepare_cluster_data(self, df: pd.DataFrame, data_type: str) -> List[Dict[str, float]]:
+        """按数据类型提取聚类使用的点（起点、终点或采样后的全部点）"""
+        if df.empty:
+            return []
+        report_progress('准备聚类数据', rows=len(df))
+        
         # 准备聚类数据
         if data_type == "pickup":
             # 提取起点数据（假设每个车辆的第一个点是起点）
             pickup_data = []
-            for vehicle_id, group in df.groupby('COMMADDR'):
-                first_point = group.sort_values('UTC').iloc[0]
+            for vehicle_id, group in iter_vehicle_groups(df):
+                first_point = group.iloc[0]
                 pickup_data.append({
                     'lat': first_point['LAT'] / 1e5,
                     'lng': first_point['LON'] / 1e5,
@@ -984,8 +1469,8 @@ class TrafficDataProcessor:
         elif data_type == "dropoff":
             # 提取终点数据（假设每个车辆的最后一个点是终点）
             dropoff_data = []
-            for vehicle_id, group in df.groupby('COMMADDR'):
-                last_point = group.sort_values('UTC').iloc[-1]
+            for vehicle_id, group in iter_vehicle_groups(df):
+                last_point = group.iloc[-1]
                 dropoff_data.append({
                     'lat': last_point['LAT'] / 1e5,
                     'lng': last_point['LON'] / 1e5,
@@ -1006,32 +1491,17 @@ class TrafficDataProcessor:
                     'weight': 1.0
                 })
         
-        if not cluster_data:
-            return [], {}
-        
-        # 执行聚类
-        clustering_engine = ClusteringEngine()
-        labels, metrics = clustering_engine.cluster_data(
-            cluster_data,
-            algorithm=algorithm,
-            params=params or {}
-        )
-        
-        # 分析聚类结果
-        clusters = clustering_engine.analyze_clusters(
-            cluster_data,
-            labels,
-            cluster_type=data_type
-        )
-        
-        return clusters, metrics
+        return cluster_data
     
     def generate_spatiotemporal_heatmap(
         self, 
         df: pd.DataFrame,
         analysis_type: str = "density",
         temporal_resolution: int = 15,
-        spatial_resolution: float = 0.001
+        spatial_resolution: float = 0.001,
+        smoothing: bool = True,
+        smoothing_window: int = 3,
+        smoothing_kernel: str = 'boxcar'
     ) -> Dict[str, Any]:
         """
         生成时空热力图分析
@@ -1041,6 +1511,9 @@ class TrafficDataProcessor:
             analysis_type: 分析类型 ("density", "speed", "flow")
             temporal_resolution: 时间分辨率（分钟）
             spatial_resolution: 空间分辨率（度）
+            smoothing: 是否平滑处理
+            smoothing_window: 平滑窗口大小（帧数，正奇数）
+            smoothing_kernel: 平滑卷积核（boxcar 或 gaussian）
             
         Returns:
             时空分析结果
@@ -1052,7 +1525,10 @@ class TrafficDataProcessor:
         heatmap_frames = self.generate_dynamic_heatmap(
             df, 
             temporal_resolution=temporal_resolution,
-            spatial_resolution=spatial_resolution
+            spatial_resolution=spatial_resolution,
+            smoothing=smoothing,
+            smoothing_window=smoothing_window,
+            smoothing_kernel=smoothing_kernel
         )
         
         # 计算时间序列统计
@@ -1201,6 +1677,7 @@ class TrafficDataProcessor:
             
             # 提取路段信息
             print("提取路段信息...")
+            report_progress('提取路段信息', rows=len(df))
             road_segments = road_engine.extract_road_segments(df)
             
             if not road_segments:
@@ -1208,6 +1685,7 @@ class TrafficDataProcessor:
             
             # 分析路段交通数据
             print("分析路段交通数据...")
+            report_progress('分析路段交通数据')
             traffic_data = road_engine.analyze_road_traffic(df, road_segments)
             
             if not traffic_data:
@@ -1228,6 +1706,7 @@ class TrafficDataProcessor:
             
             # 计算路段统计
             print("计算路段统计...")
+            report_progress('计算路段统计')
             segment_stats = road_engine.calculate_segment_statistics(filtered_traffic_data, time_range)
             
             # 分析结果
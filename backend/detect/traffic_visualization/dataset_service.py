@@ -0,0 +1,78 @@
+"""
+进程级共享的数据集服务
+整个进程只创建一个 TrafficDataProcessor，数据加载、缓存和索引由所有接口共享，
+一个接口加载过的数据可以直接被其他接口复用；接口通过 FastAPI 依赖注入获取。
+数据处理器创建时同时启动数据目录监视器，数据集更新后按时间范围让缓存失效
+"""
+
+import threading
+
+from .data_processor import TrafficDataProcessor
+from .dataset_watcher import DatasetWatcher
+from .heatmap import HeatmapGenerator
+from .track import TrackAnalyzer
+
+_lock = threading.Lock()
+_data_processor = None
+_heatmap_generator = None
+_track_analyzer = None
+_dataset_watcher = None
+
+
+def get_data_processor() -> TrafficDataProcessor:
+    """共享的数据处理器（首次调用时创建）"""
+    global _data_processor
+    if _data_processor is None:
+        with _lock:
+            if _data_processor is None:
+                processor = TrafficDataProcessor()
+                _watch(processor)
+                _data_processor = processor
+    return _data_processor
+
+
+def _watch(processor: TrafficDataProcessor):
+    """为数据处理器启动数据目录监视器（替换之前的监视器）"""
+    global _dataset_watcher
+    if _dataset_watcher is not None:
+        _dataset_watcher.stop()
+    _dataset_watcher = DatasetWatcher(processor)
+    _dataset_watcher.start()
+
+
+def get_dataset_watcher() -> DatasetWatcher:
+    """共享数据处理器的数据目录监视器"""
+    get_data_processor()
+    return _dataset_watcher
+
+
+def get_heatmap_generator() -> HeatmapGenerator:
+    """使用共享数据处理器的热力图生成器"""
+    global _heatmap_generator
+    if _heatmap_generator is None:
+        processor = get_data_processor()
+        with _lock:
+            if _heatmap_generator is None:
+                _heatmap_generator = HeatmapGenerator(processor)
+    return _heatmap_generator
+
+
+def get_track_analyzer() -> TrackAnalyzer:
+    """使用共享数据处理器的轨迹分析器"""
+    global _track_analyzer
+    if _track_analyzer is None:
+        processor = get_data_processor()
+        with _lock:
+            if _track_analyzer is None:
+                _track_analyzer = TrackAnalyzer(processor)
+    return _track_analyzer
+
+
+def set_data_processor(processor: TrafficDataProcessor):
+    """替换共享的数据处理器（如指定其他数据目录），依赖它的生成器和分析器随之重建"""
+    global _data_processor, _heatmap_generator, _track_analyzer
+    with _lock:
+        _watch(processor)
+        _data_processor = processor
+        _heatmap_generator = None
+        _track_analyzer = None
@@ -0,0 +1,358 @@
+"""
+分区Parquet数据集存储
+将原始CSV转换为按天/小时分区的Parquet数据集，查询时只读取与时间范围重叠的分区和行组
+"""
+
+import os
+import glob
+import argparse
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterator
+
+import numpy as np
+import pandas as pd
+
+from .vehicle_dictionary import VehicleDictionary
+from .catalog import DatasetCatalog, summarize_frame, merge_summaries
+
+# 可选导入pyarrow（Parquet读写依赖）
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 原始数据列及其存储类型
+COLUMN_TYPES = {
+    'UTC': 'int64',
+    'LAT': 'int32',
+    'LON': 'int32',
+    'COMMADDR': 'string',
+    'SPEED': 'float32',
+    'DIRECTION': 'float32',
+    'STATUS': 'int16',
+}
+
+# 必须存在的列
+REQUIRED_COLUMNS = ['UTC', 'LAT', 'LON', 'COMMADDR']
+
+
+def normalize_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    将原始CSV块转换为统一的列类型
+
+    Args:
+        chunk: 原始数据块
+
+    Returns:
+        类型规整后的数据块（缺少必要列时返回空DataFrame）
+    """
+    if not all(col in chunk.columns for col in REQUIRED_COLUMNS):
+        return pd.DataFrame()
+
+    columns = [col for col in COLUMN_TYPES if col in chunk.columns]
+    chunk = chunk[columns].copy()
+
+    # 数值列先强制转换，无法解析的值置为空
+    for col in columns:
+        if col != 'COMMADDR':
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    chunk = chunk.dropna(subset=REQUIRED_COLUMNS)
+
+    for col in columns:
+        if col == 'COMMADDR':
+            chunk[col] = chunk[col].astype(str)
+        elif COLUMN_TYPES[col].startswith('int') and col not in REQUIRED_COLUMNS:
+            # 可选整数列允许缺失，缺失值填0
+            chunk[col] = chunk[col].fillna(0).astype(COLUMN_TYPES[col])
+        else:
+            chunk[col] = chunk[col].astype(COLUMN_TYPES[col])
+
+    return chunk
+
+
+class PartitionedDatasetStore:
+    """
+    按天/小时分区的Parquet数据集
+
+    目录结构: {dataset_dir}/day=YYYY-MM-DD/hour=HH/part-{源文件名}-{序号}.parquet
+    每个分区文件内按UTC排序，并写入行组的最小/最大值统计信息；
+    导入时同时维护数据目录下的车辆ID字典和数据集目录（catalog），读取时车辆列以字典编码的 Categorical 返回
+    """
+
+    def __init__(self, data_dir: str, dataset_dir: str = None):
+        """
+        初始化数据集存储
+
+        Args:
+            data_dir: 原始CSV所在目录
+            dataset_dir: 分区数据集目录，默认为 {data_dir}/dataset
+        """
+        self.data_dir = data_dir
+        self.dataset_dir = dataset_dir or os.path.join(data_dir, 'dataset')
+        self.dictionary_path = VehicleDictionary.default_path(data_dir)
+        self._dictionary = None
+        self.catalog = DatasetCatalog(data_dir)
+
+    @property
+    def dictionary(self) -> VehicleDictionary:
+        """车辆ID字典（首次访问时从文件加载）"""
+        if self._dictionary is None:
+            self._dictionary = VehicleDictionary.load(self.dictionary_path)
+        return self._dictionary
+
+    def is_available(self) -> bool:
+        """数据集是否已生成且可读"""
+        if not PYARROW_AVAILABLE or not os.path.isdir(self.dataset_dir):
+            return False
+        return any(True for _ in self._iter_partitions())
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def ingest(self, csv_files: List[str] = None, chunk_size: int = 200000,
+               row_group_size: int = 50000, flush_rows: int = 2000000) -> Dict[str, Any]:
+        """
+        将原始CSV转换为分区Parquet数据集
+
+        Args:
+            csv_files: 要导入的CSV文件，默认为数据目录下全部CSV
+            chunk_size: 读取CSV的分块大小
+            row_group_size: Parquet行组大小
+            flush_rows: 单个源文件缓冲多少行后写出一次
+
+        Returns:
+            导入统计信息
+        """
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("未安装pyarrow，无法生成Parquet数据集")
+
+        if csv_files is None:
+            csv_files = sorted(glob.glob(os.path.join(self.data_dir, '*.csv')))
+
+        os.makedirs(self.dataset_dir, exist_ok=True)
+        summary = {'files': 0, 'rows': 0, 'partitions': set()}
+        dictionary = self.dictionary
+        catalog = self.catalog
+        catalog.reload()
+
+        for file_path in csv_files:
+            stem = os.path.splitext(os.path.basename(file_path))[0]
+            print(f"导入文件: {os.path.basename(file_path)}")
+
+            # 重新导入同一源文件时先删除旧的分区文件及其目录记录
+            self._remove_source_parts(stem)
+            catalog.remove_source(stem)
+
+            buffers = {}
+            buffered_rows = 0
+            part_seq = 0
+            source_summary = {}
+            source_codes = np.zeros(0, dtype=np.int32)
+
+            for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype={'COMMADDR': str}):
+                chunk = normalize_chunk(chunk)
+                if chunk.empty:
+                    continue
+
+                dictionary.add(chunk['COMMADDR'].unique())
+                source_summary = merge_summaries(source_summary, summarize_frame(chunk))
+                source_codes = np.union1d(source_codes, dictionary.encode(chunk['COMMADDR'].unique()))
+                hours = (chunk['UTC'].to_numpy() // 3600) * 3600
+                for hour, group in chunk.groupby(hours):
+                    buffers.setdefault(int(hour), []).append(group)
+                buffered_rows += len(chunk)
+                summary['rows'] += len(chunk)
+
+                if buffered_rows >= flush_rows:
+                    summary['partitions'].update(
+                        self._flush_buffers(buffers, stem, part_seq, row_group_size)
+                    )
+                    buffers = {}
+                    buffered_rows = 0
+                    part_seq += 1
+
+            if buffers:
+                summary['partitions'].update(
+                    self._flush_buffers(buffers, stem, part_seq, row_group_size)
+                )
+            catalog.add_source(stem, file_path, source_summary or summarize_frame(pd.DataFrame()),
+                               len(source_codes))
+            summary['files'] += 1
+
+        # 已有车辆的编码保持不变，新车辆追加在字典末尾
+        dictionary.save(self.dictionary_path)
+        catalog.save()
+        summary['vehicles'] = len(dictionary)
+        print(f"导入完成: {summary['files']} 个文件, {summary['rows']} 行, "
+              f"{len(summary['partitions'])} 个分区, {summary['vehicles']} 辆车")
+        summary['partitions'] = sorted(summary['partitions'])
+        return summary
+
+    def _flush_buffers(self, buffers: Dict[int, List[pd.DataFrame]], stem: str,
+                       part_seq: int, row_group_size: int) -> List[str]:
+        """将缓冲的分组数据写出到对应的小时分区"""
+        written = []
+        for hour, frames in buffers.items():
+            part_df = pd.concat(frames, ignore_index=True).sort_values('UTC', kind='stable')
+            partition_dir = self.partition_path(hour)
+            os.makedirs(partition_dir, exist_ok=True)
+
+            part_path = os.path.join(partition_dir, f"part-{stem}-{part_seq:04d}.parquet")
+            table = pa.Table.from_pandas(part_df, preserve_index=False)
+            pq.write_table(
+                table,
+                part_path,
+                row_group_size=row_group_size,
+                compression='snappy',
+                write_statistics=True,
+                use_dictionary=['COMMADDR'],
+            )
+            self.catalog.add_part(os.path.relpath(part_path, self.dataset_dir), stem, hour,
+                                  part_df, self.dictionary.encode(part_df['COMMADDR']))
+            written.append(os.path.relpath(partition_dir, self.dataset_dir))
+        return written
+
+    def _remove_source_parts(self, stem: str):
+        """删除某个源文件生成的全部分区文件"""
+        pattern = os.path.join(self.dataset_dir, 'day=*', 'hour=*', f"part-{stem}-*.parquet")
+        for path in glob.glob(pattern):
+            os.remove(path)
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def partition_path(self, hour: int) -> str:
+        """小时时间戳对应的分区目录"""
+        dt = datetime.fromtimestamp(hour, tz=timezone.utc)
+        return os.path.join(self.dataset_dir, f"day={dt:%Y-%m-%d}", f"hour={dt:%H}")
+
+    def _iter_partitions(self):
+        """遍历全部分区，返回 (小时时间戳, 分区目录)"""
+        if not os.path.isdir(self.dataset_dir):
+            return
+        for day_name in sorted(os.listdir(self.dataset_dir)):
+            if not day_name.startswith('day='):
+                continue
+            day_dir = os.path.join(self.dataset_dir, day_name)
+            for hour_name in sorted(os.listdir(day_dir)):
+                if not hour_name.startswith('hour='):
+                    continue
+                try:
+                    dt = datetime.strptime(f"{day_name[4:]} {hour_name[5:]}", '%Y-%m-%d %H')
+                except ValueError:
+                    continue
+                hour = int(dt.replace(tzinfo=timezone.utc).timestamp())
+                yield hour, os.path.join(day_dir, hour_name)
+
+    def list_files(self, start_time: float, end_time: float) -> List[str]:
+        """
+        列出与时间范围重叠的Parquet文件
+
+        有数据集目录时按每个分区文件记录的最小/最大UTC裁剪，否则按小时分区目录裁剪
+        """
+        files = self.catalog.part_files(self.dataset_dir, start_time, end_time)
+        if files is not None:
+            return files
+        files = []
+        for hour, partition_dir in self._iter_partitions():
+            if hour + 3600 <= start_time or hour > end_time:
+                continue
+            files.extend(sorted(glob.glob(os.path.join(partition_dir, '*.parquet'))))
+        return files
+
+    def read(self, start_time: float, end_time: float, columns: List[str] = None,
+             vehicle_id: str = None) -> pd.DataFrame:
+        """
+        读取时间范围内的数据
+
+        先按目录裁剪小时分区，再由pyarrow根据行组统计信息跳过不相交的行组，
+        并只读取需要的列
+
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            columns: 需要的列，None表示全部列
+            vehicle_id: 车辆ID，可选
+
+        Returns:
+            符合条件的数据DataFrame（COMMADDR 为字典编码的 Categorical）
+        """
+        scan = self._scan_args(start_time, end_time, columns, vehicle_id)
+        if scan is None:
+            return pd.DataFrame()
+        dataset, columns, expression = scan
+
+        table = dataset.to_table(columns=columns, filter=expression)
+        return self._to_frame(table)
+
+    def iter_batches(self, start_time: float, end_time: float, columns: List[str] = None,
+                     vehicle_id: str = None, batch_size: int = 200000) -> Iterator[pd.DataFrame]:
+        """
+        按记录批次流式读取时间范围内的数据，不在内存中拼接整个结果
+
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            columns: 需要的列，None表示全部列
+            vehicle_id: 车辆ID，可选
+            batch_size: 每批最多的行数
+
+        Yields:
+            数据批次DataFrame（COMMADDR 为字典编码的 Categorical）
+        """
+        scan = self._scan_args(start_time, end_time, columns, vehicle_id)
+        if scan is None:
+            return
+        dataset, columns, expression = scan
+
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            if batch.num_rows:
+                yield self._to_frame(batch)
+
+    def _scan_args(self, start_time: float, end_time: float, columns: List[str] = None,
+                   vehicle_id: str = None):
+        """构造扫描用的数据集、列和过滤表达式，没有相交的文件时返回None"""
+        files = self.list_files(start_time, end_time)
+        if not files:
+            return None
+
+        # 车辆列按Parquet字典读取，避免为每行创建字符串对象
+        file_format = ds.ParquetFileFormat(read_options={'dictionary_columns': ['COMMADDR']})
+        dataset = ds.dataset(files, format=file_format)
+        if columns is not None:
+            columns = [col for col in columns if col in dataset.schema.names]
+            if not columns:
+                # 零列的批次没有行数，至少读取 UTC 列
+                columns = ['UTC']
+
+        expression = (ds.field('UTC') >= int(np.floor(start_time))) & \
+                     (ds.field('UTC') <= int(np.floor(end_time)))
+        if vehicle_id:
+            expression = expression & (ds.field('COMMADDR') == str(vehicle_id))
+        return dataset, columns, expression
+
+    def _to_frame(self, table) -> pd.DataFrame:
+        """Arrow表或记录批次转换为DataFrame，车辆列按字典编码"""
+        df = table.to_pandas()
+        if 'COMMADDR' in df.columns:
+            df['COMMADDR'] = self.dictionary.categorize(df['COMMADDR'])
+        return df
+
+
+if __name__ == "__main__":
+    # 导入命令: 在backend目录下执行
+    #   python -m detect.traffic_visualization.dataset_store --data-dir <CSV目录>
+    parser = argparse.ArgumentParser(description="将原始CSV导入为分区Parquet数据集")
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(__file__), 'data'),
+                        help="原始CSV所在目录")
+    parser.add_argument('--dataset-dir', default=None, help="输出数据集目录，默认为 <data-dir>/dataset")
+    parser.add_argument('--row-group-size', type=int, default=50000, help="Parquet行组大小")
+    args = parser.parse_args()
+
+    store = PartitionedDatasetStore(args.data_dir, args.dataset_dir)
+    store.ingest(row_group_size=args.row_group_size)
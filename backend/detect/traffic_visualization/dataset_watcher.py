@@ -0,0 +1,162 @@
+"""
+数据目录监视器
+后台线程定期轮询数据目录中的CSV分区文件（名称、大小、修改时间）和派生存储
+（数据集目录、列存储、预处理清单）的修改时间。发生变化时：
+
+- 更新数据集版本
+- 只让时间范围与变化分区相交的内存缓存和持久化结果缓存失效，其余结果迁移到新版本继续使用
+- 重新发现数据来源（CSV文件列表、列存储、预处理索引）
+
+CSV分区变化后，派生存储要等重新导入后才包含新数据，因此这些分区的时间范围会被记下，
+在派生存储更新时再失效一次
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# 轮询间隔（秒），可通过环境变量 TRAFFIC_WATCH_INTERVAL 调整，0 表示不启用
+DEFAULT_WATCH_INTERVAL = float(os.environ.get("TRAFFIC_WATCH_INTERVAL", "30"))
+
+
+class DatasetWatcher:
+    """轮询数据目录，分区变化时更新数据集版本并按时间范围让缓存失效"""
+
+    def __init__(self, processor, interval: float = DEFAULT_WATCH_INTERVAL):
+        """
+        初始化监视器
+
+        Args:
+            processor: 共享的 TrafficDataProcessor
+            interval: 轮询间隔（秒）
+        """
+        self.processor = processor
+        self.interval = interval
+        self.snapshot = processor.partition_snapshot()
+        self.derived_mtimes = processor.derived_store_mtimes()
+        # 已知的分区时间范围（文件路径 -> (最小UTC, 最大UTC)），None表示未知
+        self.ranges: Dict[str, Optional[Tuple[int, int]]] = {
+            path: processor.catalog.source_time_range(path) for path in self.snapshot
+        }
+        # 已变化但尚未反映到派生存储中的时间范围，None表示范围未知
+        self.pending_ranges: Optional[List[Tuple[int, int]]] = []
+        self.changes = 0
+        processor.set_dataset_version(processor.snapshot_version(self.snapshot, self.derived_mtimes))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _partition_range(self, path: str) -> Optional[Tuple[int, int]]:
+        """分区文件的时间范围：优先使用数据集目录中的记录，否则读取UTC列计算"""
+        time_range = self.processor.catalog.source_time_range(path)
+        if time_range is not None:
+            return time_range
+        try:
+            utc = pd.read_csv(path, usecols=['UTC'])['UTC']
+        except (OSError, ValueError) as e:
+            print(f"无法读取分区时间范围 {path}: {str(e)}")
+            return None
+        if utc.empty:
+            return None
+        return int(utc.min()), int(utc.max())
+
+    def _changed_ranges(self, snapshot: Dict[str, Tuple[int, int]]) -> Tuple[List[str], Optional[List[Tuple[int, int]]]]:
+        """
+        比较分区快照，返回变化的分区和它们变化前后的时间范围
+
+        Returns:
+            (变化的分区路径, 时间范围列表)；存在变化前范围未知的分区时时间范围为None
+        """
+        changed = sorted(
+            path for path in set(snapshot) | set(self.snapshot)
+            if snapshot.get(path) != self.snapshot.get(path)
+        )
+        ranges: Optional[List[Tuple[int, int]]] = []
+        for path in changed:
+            old_range = self.ranges.get(path)
+            new_range = self._partition_range(path) if path in snapshot else None
+            if path in self.snapshot and old_range is None:
+                ranges = None
+            if ranges is not None:
+                ranges.extend(r for r in (old_range, new_range) if r is not None)
+            if path in snapshot:
+                self.ranges[path] = new_range
+            else:
+                self.ranges.pop(path, None)
+        return changed, ranges
+
+    @staticmethod
+    def _merge_ranges(first: Optional[List[Tuple[int, int]]],
+                      second: Optional[List[Tuple[int, int]]]) -> Optional[List[Tuple[int, int]]]:
+        """合并两组时间范围（任一组未知则结果未知）"""
+        if first is None or second is None:
+            return None
+        return first + second
+
+    def check(self) -> bool:
+        """
+        检查一次数据目录
+
+        Returns:
+            数据集版本是否发生变化
+        """
+        processor = self.processor
+        snapshot = processor.partition_snapshot()
+        derived_mtimes = processor.derived_store_mtimes()
+        if snapshot == self.snapshot and derived_mtimes == self.derived_mtimes:
+            return False
+
+        changed, ranges = [], []
+        if snapshot != self.snapshot:
+            changed, ranges = self._changed_ranges(snapshot)
+            self.pending_ranges = self._merge_ranges(self.pending_ranges, ranges)
+        if derived_mtimes != self.derived_mtimes:
+            # 派生存储已重新生成，此前变化的分区从现在起才以新数据提供
+            ranges = self._merge_ranges(ranges, self.pending_ranges)
+            self.pending_ranges = []
+
+        old_version = processor.dataset_fingerprint()
+        new_version = processor.snapshot_version(snapshot, derived_mtimes)
+        if ranges is None:
+            processor.frame_cache.clear()
+            processor.tile_cache.clear()
+        else:
+            processor.frame_cache.invalidate_ranges(ranges)
+            processor.tile_cache.invalidate_ranges(ranges)
+        removed, kept = processor.result_cache.rebase(old_version, new_version, ranges)
+        processor.set_dataset_version(new_version)
+        processor.refresh_sources()
+
+        self.snapshot = snapshot
+        self.derived_mtimes = derived_mtimes
+        self.changes += 1
+        print(f"数据集已更新（变化分区: {[os.path.basename(path) for path in changed]}），"
+              f"版本 {old_version[:8]} -> {new_version[:8]}，失效结果 {removed} 个，保留 {kept} 个")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"数据目录检查失败: {str(e)}")
+
+    def start(self):
+        """启动后台轮询线程"""
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="traffic-dataset-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台轮询"""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, object]:
+        """监视器状态：数据集版本、分区数和已检测到的变化次数"""
+        return {
+            'version': self.processor.dataset_fingerprint(),
+            'partitions': len(self.snapshot),
+            'changes': self.changes,
+            'interval': self.interval,
+        }
@@ -0,0 +1,125 @@
+"""
+分析任务执行层
+pandas、sklearn、geopy 等耗时的分析在有界线程池中运行，接口协程只等待结果，
+事件循环不被阻塞，重查询并发时 /test、登录等其他请求仍能及时响应
+
+线程数和排队上限可通过环境变量 TRAFFIC_ANALYTICS_WORKERS、TRAFFIC_ANALYTICS_QUEUE 调整；
+使用线程而不是进程，是为了让任务共享 dataset_service 中的数据处理器及其缓存
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+
+# 并行执行的分析任务数
+DEFAULT_WORKERS = int(os.environ.get("TRAFFIC_ANALYTICS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 除正在执行的任务外，最多允许排队等待的任务数
+DEFAULT_QUEUE_SIZE = int(os.environ.get("TRAFFIC_ANALYTICS_QUEUE", str(DEFAULT_WORKERS * 4)))
+
+
+class ExecutorBusyError(RuntimeError):
+    """执行队列已满"""
+
+
+class AnalyticsExecutor:
+    """有界的分析任务线程池：执行中加排队中的任务数超过上限时直接拒绝"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        初始化执行器
+
+        Args:
+            workers: 线程数
+            queue_size: 排队上限
+        """
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="traffic-analytics")
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, func: Callable, *args, **kwargs):
+        """
+        提交任务
+
+        Returns:
+            concurrent.futures.Future
+
+        Raises:
+            ExecutorBusyError: 队列已满
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorBusyError(f"分析任务过多（{self.workers}个执行中，{self.queue_size}个排队），请稍后重试")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._pool.submit(func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行任务并等待结果"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        """执行器状态：线程数、排队上限、当前任务数、已完成和被拒绝的任务数"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self._pool.shutdown(wait=wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> AnalyticsExecutor:
+    """进程内共享的分析执行器（首次调用时创建）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = AnalyticsExecutor()
+    return _executor
+
+
+def offload(func: Callable) -> Callable:
+    """
+    把同步的接口函数包装为协程，函数体在分析执行器中运行
+
+    保留原函数签名（FastAPI 据此解析参数和依赖）；队列已满时返回 503
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await get_executor().run(func, *args, **kwargs)
+        except ExecutorBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return wrapper
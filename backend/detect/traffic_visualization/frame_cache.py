@@ -0,0 +1,202 @@
+"""
+按字节数限制容量的 DataFrame 缓存
+缓存 load_data 的结果，按最近最少使用淘汰；完整（未采样）的缓存结果
+可以切片回答其时间子范围、单辆车或列子集的查询
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .vehicle_index import select_vehicle
+
+# 缓存容量（字节），可通过环境变量 TRAFFIC_FRAME_CACHE_MB 调整
+DEFAULT_MAX_BYTES = int(os.environ.get("TRAFFIC_FRAME_CACHE_MB", "512")) * 1024 * 1024
+
+CacheKey = Tuple[float, float, Optional[str], Optional[Tuple[str, ...]]]
+
+
+class _CacheEntry:
+    """一个缓存项"""
+
+    __slots__ = ('frame', 'nbytes', 'complete', 'sampled')
+
+    def __init__(self, frame: pd.DataFrame, nbytes: int, complete: bool, sampled: bool = False):
+        self.frame = frame
+        self.nbytes = nbytes
+        self.complete = complete
+        self.sampled = sampled
+
+
+class FrameCache:
+    """
+    LRU DataFrame 缓存
+
+    - 总占用按 DataFrame.memory_usage(deep=True) 计算，超出容量时淘汰最久未使用的项
+    - 精确命中直接返回；否则在完整的缓存项中查找覆盖请求时间范围、车辆和列的超集并切片
+    - 缓存中的 DataFrame 不会被修改：每次返回的都是浅拷贝，调用方增删列不影响缓存
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存容量（字节）
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.range_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[CacheKey, _CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(start_time: float, end_time: float, vehicle_id: str = None,
+                 columns: List[str] = None) -> CacheKey:
+        """缓存键：(开始时间, 结束时间, 车辆ID, 排序后的列名元组)"""
+        return (
+            float(start_time),
+            float(end_time),
+            str(vehicle_id) if vehicle_id else None,
+            tuple(sorted(columns)) if columns else None,
+        )
+
+    def get(self, start_time: float, end_time: float, vehicle_id: str = None,
+            columns: List[str] = None, allow_sampled: bool = True) -> Optional[pd.DataFrame]:
+        """
+        查询缓存
+
+        Args:
+            allow_sampled: 是否接受由已采样的预处理数据得到的缓存项
+
+        Returns:
+            命中时返回结果的浅拷贝，否则返回None
+        """
+        key = self.make_key(start_time, end_time, vehicle_id, columns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (allow_sampled or not entry.sampled):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.frame.copy(deep=False)
+
+            superset = self._find_superset(key)
+            if superset is None:
+                self.misses += 1
+                return None
+            superset_key, entry = superset
+            self._entries.move_to_end(superset_key)
+            self.range_hits += 1
+
+        return self._slice(entry.frame, key, superset_key)
+
+    def _find_superset(self, key: CacheKey) -> Optional[Tuple[CacheKey, _CacheEntry]]:
+        """查找能覆盖请求的完整缓存项（取占用最小的一个）"""
+        start_time, end_time, vehicle_id, columns = key
+        best = None
+        for entry_key, entry in self._entries.items():
+            entry_start, entry_end, entry_vehicle, entry_columns = entry_key
+            if not entry.complete or entry_start > start_time or entry_end < end_time:
+                continue
+            if entry_vehicle is not None and entry_vehicle != vehicle_id:
+                continue
+            available = set(entry.frame.columns)
+            if 'UTC' not in available or (entry_vehicle is None and vehicle_id and 'COMMADDR' not in available):
+                continue
+            if columns is not None and not set(columns) <= available:
+                continue
+            if entry_columns is not None and columns is None:
+                continue
+            if best is None or entry.nbytes < best[1].nbytes:
+                best = (entry_key, entry)
+        return best
+
+    @staticmethod
+    def _slice(frame: pd.DataFrame, key: CacheKey, superset_key: CacheKey) -> pd.DataFrame:
+        """从超集缓存项中切出请求的时间范围、车辆和列"""
+        start_time, end_time, vehicle_id, columns = key
+        result = frame
+        if vehicle_id and superset_key[2] is None:
+            result = select_vehicle(result, vehicle_id)
+        if start_time > superset_key[0] or end_time < superset_key[1]:
+            utc = result['UTC']
+            attrs = dict(result.attrs)
+            result = result[(utc >= start_time) & (utc <= end_time)]
+            result.attrs = attrs
+        if columns is not None:
+            attrs = dict(result.attrs)
+            result = result[[col for col in frame.columns if col in columns]]
+            result.attrs = attrs
+        return result.copy(deep=False) if result is frame else result
+
+    def put(self, start_time: float, end_time: float, frame: pd.DataFrame, vehicle_id: str = None,
+            columns: List[str] = None, complete: bool = True, sampled: bool = False):
+        """
+        加入缓存
+
+        Args:
+            start_time: 开始时间戳
+            end_time: 结束时间戳
+            frame: 查询结果
+            vehicle_id: 车辆ID
+            columns: 请求的列
+            complete: 结果是否完整（采样过的结果不能用于回答子范围查询）
+            sampled: 结果是否来自已采样的预处理数据（只回答接受采样数据的精确命中）
+        """
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        key = self.make_key(start_time, end_time, vehicle_id, columns)
+        # 缓存自己的浅拷贝，调用方之后对传入对象增删列不影响缓存
+        entry = _CacheEntry(frame.copy(deep=False), nbytes, complete, sampled)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.nbytes
+            self._entries[key] = entry
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def invalidate_ranges(self, ranges: List[Tuple[float, float]]) -> int:
+        """
+        删除时间范围与任一给定范围相交的缓存项
+
+        Returns:
+            删除的缓存项数
+        """
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if any(key[0] <= range_end and key[1] >= range_start for range_start, range_end in ranges)
+            ]
+            for key in stale:
+                self.current_bytes -= self._entries.pop(key).nbytes
+        return len(stale)
+
+    def clear(self):
+        """清空缓存（计数器保留）"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计：命中、子范围命中、未命中、淘汰次数及当前占用"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'range_hits': self.range_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -5,13 +5,19 @@ from typing import List, Dict, Optional, Any, Tuple
 import math
 from datetime import datetime
 from .data_processor import TrafficDataProcessor
+from .vehicle_index import iter_vehicle_groups
 
 class HeatmapGenerator:
     """热力图生成器，提供热力图数据处理功能"""
     
-    def __init__(self):
-        """初始化热力图生成器"""
-        self.data_processor = TrafficDataProcessor()
+    def __init__(self, data_processor: TrafficDataProcessor = None):
+        """
+        初始化热力图生成器
+        
+        Args:
+            data_processor: 共享的数据处理器，为None时单独创建一个
+        """
+        self.data_processor = data_processor or TrafficDataProcessor()
     
     def generate_heatmap(self, start_time: float, end_time: float, 
                          resolution: float = 0.001, 
@@ -36,21 +42,14 @@ class HeatmapGenerator:
         if df.empty:
             return []
         
-        # 生成热力图数据
-        heatmap_points = self.data_processor.generate_heatmap_data(df, resolution)
-        
-        # 过滤低计数点
-        filtered_points = [point for point in heatmap_points if point.count >= min_count]
+        # 生成热力图网格计数，过滤低计数点
+        grid = self.data_processor.heatmap_grid(df, resolution).filter(min_count)
         
-        # 如果点数过多，进行采样
-        if len(filtered_points) > max_points:
-            # 按计数排序
-            filtered_points.sort(key=lambda x: x.count, reverse=True)
-            # 取前max_points个点
-            filtered_points = filtered_points[:max_points]
+        # 如果点数过多，只保留计数最高的max_points个点
+        grid = grid.top(max_points)
         
         # 转换为字典列表
-        return [point.dict() for point in filtered_points]
+        return grid.to_records()
     
     def generate_time_filtered_heatmap(self, start_time: float, end_time: float,
                                       time_segments: List[Tuple[int, int]] = None,
@@ -82,7 +81,8 @@ class HeatmapGenerator:
         if df.empty:
             return {f"{seg[0]}-{seg[1]}": [] for seg in time_segments}
         
-        # 添加小时列
+        # 添加小时列（在浅拷贝上添加，不修改缓存中的数据）
+        df = df.copy(deep=False)
         df['datetime'] = pd.to_datetime(df['UTC'], unit='s')
         df['hour'] = df['datetime'].dt.hour
         
@@ -105,10 +105,7 @@ class HeatmapGenerator:
                 continue
             
             # 生成热力图数据
-            heatmap_points = self.data_processor.generate_heatmap_data(segment_df, resolution)
-            
-            # 转换为字典列表
-            result[segment_name] = [point.dict() for point in heatmap_points]
+            result[segment_name] = self.data_processor.generate_heatmap_data(segment_df, resolution)
         
         return result
     
@@ -126,7 +123,7 @@ class HeatmapGenerator:
             上客点热力图数据
         """
         # 加载数据
-        df = self.data_processor.load_data(start_time, end_time)
+        df = self.data_processor.load_data(start_time, end_time, full_rows=True)
         
         if df.empty:
             return []
@@ -139,10 +136,7 @@ class HeatmapGenerator:
             return []
         
         # 生成热力图数据
-        heatmap_points = self.data_processor.generate_heatmap_data(pickup_points, resolution)
-        
-        # 转换为字典列表
-        return [point.dict() for point in heatmap_points]
+        return self.data_processor.generate_heatmap_data(pickup_points, resolution)
     
     def _identify_pickup_points(self, df: pd.DataFrame, 
                                min_stop_time: float = 60,  # 最小停留时间（秒）
@@ -159,14 +153,11 @@ class HeatmapGenerator:
         Returns:
             上客点DataFrame
         """
-        # 确保数据按车辆ID和时间排序
-        df = df.sort_values(['COMMADDR', 'UTC'])
-        
         # 存储上客点
         pickup_points = []
         
-        # 按车辆分组处理
-        for vehicle_id, group in df.groupby('COMMADDR'):
+        # 按车辆逐段处理（数据按车辆ID和时间排序，每辆车是一段连续切片）
+        for vehicle_id, group in iter_vehicle_groups(df):
             # 如果轨迹点太少，跳过
             if len(group) < 3:
                 continue
@@ -0,0 +1,327 @@
+"""
+热力图引擎
+坐标按分辨率映射为整数网格单元索引，在点的包围盒内用 np.bincount 计数
+（包围盒相对点数过大、单元很稀疏时改为排序去重后计数），
+结果为列式数组 (纬度单元, 经度单元, 计数)，不为每个网格单元创建 Python 对象。
+SparseGrid 用它构建和合并网格计数。
+核密度估计（KDE）在细网格计数上用 FFT 做高斯卷积，按输出分辨率取样并按阈值稀疏化
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 包围盒单元数上限：不超过此值且不超过点数的 DENSE_RATIO 倍时使用 bincount
+DENSE_CELL_LIMIT = 1 << 22
+DENSE_RATIO = 8
+# 点数很少时也允许使用 bincount 的包围盒单元数
+DENSE_MIN_CELLS = 1 << 16
+
+# 原始数据中经纬度的放大倍数
+COORD_SCALE = 1e5
+
+# 核密度估计：细网格相对输出分辨率的倍数、高斯核截断半径（标准差的倍数）、卷积栅格的单元数上限
+KDE_OVERSAMPLE = 4
+KDE_TRUNCATE = 3.0
+KDE_MAX_CELLS = 1 << 24
+
+
+def cell_indices(lat: np.ndarray, lng: np.ndarray, resolution: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    经纬度（度）映射为网格单元索引 round(坐标 / 分辨率)，缺失或非法坐标的点被丢弃
+
+    Returns:
+        (纬度单元索引, 经度单元索引)，int64
+    """
+    lat = np.asarray(lat, dtype=np.float64) / resolution
+    lng = np.asarray(lng, dtype=np.float64) / resolution
+    valid = np.isfinite(lat) & np.isfinite(lng)
+    if not valid.all():
+        lat, lng = lat[valid], lng[valid]
+    # np.rint 与 pandas 的 round() 相同，都是四舍六入五取偶
+    return np.rint(lat).astype(np.int64), np.rint(lng).astype(np.int64)
+
+
+def _count_keys(keys: np.ndarray, size: int,
+                weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对 [0, size) 内的整数键计数（或对权重求和）
+
+    键空间相对键数不大时用 bincount，否则排序去重后计数
+
+    Returns:
+        (有值的键（升序）, 计数)；给出权重时计数为权重之和（float64）
+    """
+    if size <= min(DENSE_CELL_LIMIT, max(len(keys) * DENSE_RATIO, DENSE_MIN_CELLS)):
+        presence = np.bincount(keys, minlength=size)
+        occupied = np.flatnonzero(presence)
+        if weights is None:
+            counts = presence[occupied]
+        else:
+            counts = np.bincount(keys, weights=weights, minlength=size)[occupied]
+    else:
+        occupied, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(occupied))
+    return occupied, counts if weights is not None else counts.astype(np.int64)
+
+
+def _flat_cells(lat_idx: np.ndarray, lng_idx: np.ndarray) -> Tuple[np.ndarray, int, int, int, int]:
+    """把二维网格单元映射为包围盒内的一维下标，返回 (下标, 包围盒单元数, 包围盒宽度, 纬度起点, 经度起点)"""
+    lat_idx = np.asarray(lat_idx, dtype=np.int64)
+    lng_idx = np.asarray(lng_idx, dtype=np.int64)
+    lat0, lng0 = int(lat_idx.min()), int(lng_idx.min())
+    width = int(lng_idx.max()) - lng0 + 1
+    cells = (int(lat_idx.max()) - lat0 + 1) * width
+    return (lat_idx - lat0) * width + (lng_idx - lng0), cells, width, lat0, lng0
+
+
+def count_cells(lat_idx: np.ndarray, lng_idx: np.ndarray,
+                weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按网格单元计数（或对权重求和）
+
+    Args:
+        lat_idx: 纬度单元索引
+        lng_idx: 经度单元索引
+        weights: 每个点的权重，为None时每个点计1
+
+    Returns:
+        (纬度单元索引, 经度单元索引, 计数)，按纬度、经度排序，只包含有点的单元
+    """
+    if len(lat_idx) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    flat, cells, width, lat0, lng0 = _flat_cells(lat_idx, lng_idx)
+    occupied, counts = _count_keys(flat, cells, weights)
+    return lat0 + occupied // width, lng0 + occupied % width, counts.astype(np.int64)
+
+
+def smoothing_kernel(kind: str = 'boxcar', window: int = 3) -> np.ndarray:
+    """
+    时间平滑的卷积核
+
+    Args:
+        kind: 'boxcar'（等权移动平均）或 'gaussian'（高斯权重，sigma = 窗口 / 4）
+        window: 窗口大小（帧数，正奇数）
+
+    Returns:
+        长度为 window 的权重数组，中心为当前帧
+    """
+    if window < 1 or window % 2 == 0:
+        raise ValueError(f"平滑窗口必须为正奇数: {window}")
+    offsets = np.arange(window) - window // 2
+    if kind == 'boxcar':
+        return np.ones(window)
+    if kind == 'gaussian':
+        sigma = window / 4
+        return np.exp(-0.5 * (offsets / sigma) ** 2)
+    raise ValueError(f"不支持的平滑核: {kind}")
+
+
+def gaussian_kernel(sigma: float) -> np.ndarray:
+    """
+    二维高斯核
+
+    Args:
+        sigma: 标准差（网格单元数）
+
+    Returns:
+        (2r+1, 2r+1) 的权重矩阵，r = ceil(KDE_TRUNCATE * sigma)，权重和为1
+    """
+    if not sigma > 0:
+        raise ValueError(f"核密度带宽必须为正数: {sigma}")
+    radius = max(int(math.ceil(KDE_TRUNCATE * sigma)), 1)
+    offsets = np.arange(-radius, radius + 1)
+    profile = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel = np.outer(profile, profile)
+    return kernel / kernel.sum()
+
+
+def kernel_density(lat_idx: np.ndarray, lng_idx: np.ndarray, counts: np.ndarray, sigma: float,
+                   stride: int = 1, threshold: float = 0.05) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    网格计数的核密度估计
+
+    计数铺到包围盒（四周留出核半径）的栅格上，用 FFT 与高斯核卷积；
+    结果每隔 stride 个单元取样（即输出分辨率为细网格的 stride 倍），只保留不低于最大密度 threshold 倍的单元
+
+    Args:
+        lat_idx: 细网格纬度单元索引（不重复）
+        lng_idx: 细网格经度单元索引
+        counts: 每个单元的计数
+        sigma: 高斯核标准差（细网格单元数）
+        stride: 输出单元相对细网格单元的倍数
+        threshold: 相对最大密度的阈值，[0, 1)
+
+    Returns:
+        (输出网格纬度单元索引, 输出网格经度单元索引, 密度)，密度为每个输出单元的期望点数，按纬度、经度排序
+    """
+    if not 0 <= threshold < 1:
+        raise ValueError(f"核密度阈值必须在 [0, 1) 内: {threshold}")
+    kernel = gaussian_kernel(sigma)
+    empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    if len(counts) == 0:
+        return empty
+    # 导入较慢，只在使用核密度估计时导入
+    from scipy.signal import fftconvolve
+
+    radius = kernel.shape[0] // 2
+    lat_idx = np.asarray(lat_idx, dtype=np.int64)
+    lng_idx = np.asarray(lng_idx, dtype=np.int64)
+    lat0, lng0 = int(lat_idx.min()) - radius, int(lng_idx.min()) - radius
+    height = int(lat_idx.max()) + radius - lat0 + 1
+    width = int(lng_idx.max()) + radius - lng0 + 1
+    if height * width > KDE_MAX_CELLS:
+        raise ValueError(f"核密度估计的栅格过大（{height} x {width}），请增大分辨率或缩小范围")
+
+    raster = np.zeros((height, width), dtype=np.float64)
+    raster[lat_idx - lat0, lng_idx - lng0] = counts
+    density = fftconvolve(raster, kernel, mode='same')
+
+    # 取样位置为全局索引是 stride 倍数的单元，不同范围的结果网格对齐
+    row0, col0 = (-lat0) % stride, (-lng0) % stride
+    sampled = density[row0::stride, col0::stride] * (stride * stride)
+    if sampled.size == 0 or sampled.max() <= 0:
+        return empty
+    # FFT 的舍入误差会在空白处留下极小的非零值，阈值至少取最大密度的 1e-9 倍
+    rows, cols = np.nonzero(sampled >= max(threshold, 1e-9) * sampled.max())
+    return ((lat0 + row0 + rows * stride) // stride, (lng0 + col0 + cols * stride) // stride,
+            sampled[rows, cols])
+
+
+class SpaceTimeCube:
+    """
+    稀疏时空立方体：(时间桶, 纬度单元, 经度单元) 的计数（平滑后为强度）
+
+    一次遍历数据构建，按 (时间桶, 纬度, 经度) 排序存放，
+    每个时间桶的网格是连续的一段，取某一帧只需按下标切片
+    """
+
+    def __init__(self, resolution: float, time_idx: np.ndarray, lat_idx: np.ndarray,
+                 lng_idx: np.ndarray, counts: np.ndarray, buckets: np.ndarray):
+        """
+        Args:
+            resolution: 空间分辨率（度）
+            time_idx: 每个单元的时间桶
+            lat_idx: 纬度单元索引
+            lng_idx: 经度单元索引
+            counts: 计数（平滑后为 float64 强度）
+            buckets: 有数据的时间桶（升序，包括只有缺失坐标的桶）
+        """
+        self.resolution = resolution
+        self.time_idx = time_idx
+        self.lat_idx = lat_idx
+        self.lng_idx = lng_idx
+        self.counts = counts
+        self.buckets = buckets
+        self._starts = np.searchsorted(time_idx, buckets, side='left')
+        self._ends = np.searchsorted(time_idx, buckets, side='right')
+
+    @classmethod
+    def from_points(cls, time_idx: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+                    resolution: float) -> 'SpaceTimeCube':
+        """
+        由时间桶和经纬度（度）构建立方体
+
+        Args:
+            time_idx: 每个点的时间桶（非负整数）
+            lat: 纬度数组（度）
+            lng: 经度数组（度）
+            resolution: 空间分辨率（度）
+        """
+        time_idx = np.asarray(time_idx, dtype=np.int64)
+        buckets = np.unique(time_idx)
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        valid = np.isfinite(lat) & np.isfinite(lng)
+        if not valid.all():
+            time_idx, lat, lng = time_idx[valid], lat[valid], lng[valid]
+        if len(time_idx) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(resolution, empty, empty, empty, empty, buckets)
+
+        lat_idx, lng_idx = cell_indices(lat, lng, resolution)
+        flat, cells, width, lat0, lng0 = _flat_cells(lat_idx, lng_idx)
+        occupied, counts = _count_keys(time_idx * cells + flat, (int(time_idx.max()) + 1) * cells)
+        cell = occupied % cells
+        return cls(resolution, occupied // cells, lat0 + cell // width, lng0 + cell % width, counts, buckets)
+
+    def frame(self, position: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        第 position 个有数据的时间桶的网格
+
+        Returns:
+            (纬度单元索引, 经度单元索引, 计数)
+        """
+        start, end = self._starts[position], self._ends[position]
+        return self.lat_idx[start:end], self.lng_idx[start:end], self.counts[start:end]
+
+    def frame_sizes(self) -> np.ndarray:
+        """每个有数据的时间桶中的非空单元数"""
+        return self._ends - self._starts
+
+    def frame_records(self, position: int, value_key: str = 'intensity') -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        第 position 个有数据的时间桶的热力图点字典列表和总强度
+        """
+        lat_idx, lng_idx, counts = self.frame(position)
+        values = counts.tolist()
+        records = [
+            {'lat': lat, 'lng': lng, value_key: value}
+            for lat, lng, value in zip((lat_idx * self.resolution).tolist(),
+                                       (lng_idx * self.resolution).tolist(), values)
+        ]
+        return records, sum(values)
+
+    def smooth(self, window: int = 3, kernel: str = 'boxcar') -> 'SpaceTimeCube':
+        """
+        沿时间轴（相邻的有数据帧之间）做加权移动平均
+
+        每个单元的平滑强度 = 窗口内各帧强度的加权和 / 窗口内该单元有数据的帧的权重和，
+        即没有数据的帧视为未观测而不是0；前后各 window // 2 帧不平滑。
+        以稀疏形式计算：每个非空单元向窗口内的目标帧各贡献一次，代价与非空单元数 × 窗口大小成正比
+
+        Args:
+            window: 窗口大小（帧数，正奇数）
+            kernel: 卷积核，'boxcar' 或 'gaussian'
+
+        Returns:
+            平滑后的立方体（强度为 float64）；帧数不超过 2 * (window // 2) 时不平滑
+        """
+        weights = smoothing_kernel(kernel, window)
+        half = window // 2
+        frame_count = len(self.buckets)
+        values = self.counts.astype(np.float64)
+        if frame_count <= 2 * half or len(self.counts) == 0:
+            return SpaceTimeCube(self.resolution, self.time_idx, self.lat_idx, self.lng_idx, values, self.buckets)
+
+        flat, cells, width, lat0, lng0 = _flat_cells(self.lat_idx, self.lng_idx)
+        position = np.searchsorted(self.buckets, self.time_idx)
+
+        # 边界帧保持原值：只以权重1贡献给自身
+        edge = (position < half) | (position >= frame_count - half)
+        targets, cell_keys = [position[edge]], [flat[edge]]
+        contributions, masses = [values[edge]], [np.ones(int(edge.sum()))]
+        # 内部第 i 帧取第 i + offset 帧的值乘以 weights[offset + half]，
+        # 即位于第 p 帧的单元以该权重贡献给第 p - offset 帧
+        for offset, weight in zip(range(-half, half + 1), weights):
+            target = position - offset
+            inside = (target >= half) & (target < frame_count - half)
+            targets.append(target[inside])
+            cell_keys.append(flat[inside])
+            contributions.append(values[inside] * weight)
+            masses.append(np.full(int(inside.sum()), weight))
+        keys = np.concatenate(targets) * cells + np.concatenate(cell_keys)
+        size = frame_count * cells
+        occupied, weighted = _count_keys(keys, size, np.concatenate(contributions))
+        _, mass = _count_keys(keys, size, np.concatenate(masses))
+
+        cell = occupied % cells
+        return SpaceTimeCube(
+            self.resolution,
+            self.buckets[occupied // cells],
+            lat0 + cell // width,
+            lng0 + cell % width,
+            weighted / mass,
+            self.buckets,
+        )
@@ -0,0 +1,231 @@
+"""
+热力图瓦片
+按 XYZ（Web 墨卡托，与 Leaflet/OpenLayers 等前端地图库相同）瓦片切分热力图：
+每个缩放级别对应一个网格分辨率（瓦片跨度 / TILE_CELLS，不细于 MIN_TILE_RESOLUTION），
+整个时间桶的数据在该分辨率下只统计一次（层级网格），每个瓦片只返回网格中心落在瓦片内的单元。
+层级网格和瓦片都保存在有容量上限的 LRU 缓存中，平移、缩放只取小而可缓存的瓦片，不再重算全城
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .sparse_grid import SparseGrid
+
+# 每个瓦片每边的网格单元数，可通过环境变量 TRAFFIC_TILE_CELLS 调整
+TILE_CELLS = int(os.environ.get("TRAFFIC_TILE_CELLS", "64"))
+# 最细的网格分辨率（度），原始坐标精度为 1e-5 度，约 11 米
+MIN_TILE_RESOLUTION = 1e-4
+# 支持的最大缩放级别
+MAX_ZOOM = 22
+# 时间桶长度（秒），请求的时间范围向外取整到桶边界，可通过环境变量 TRAFFIC_TILE_TIME_BUCKET 调整，0 表示不取整
+DEFAULT_TIME_BUCKET = int(os.environ.get("TRAFFIC_TILE_TIME_BUCKET", "900"))
+# 瓦片缓存容量（瓦片数），可通过环境变量 TRAFFIC_TILE_CACHE_SIZE 调整
+DEFAULT_MAX_TILES = int(os.environ.get("TRAFFIC_TILE_CACHE_SIZE", "4096"))
+# 层级网格缓存容量（(时间桶, 缩放级别) 的个数），可通过环境变量 TRAFFIC_TILE_LEVEL_CACHE_SIZE 调整
+DEFAULT_MAX_LEVELS = int(os.environ.get("TRAFFIC_TILE_LEVEL_CACHE_SIZE", "16"))
+
+TimeBucket = Tuple[float, float]
+LevelKey = Tuple[float, float, int]
+TileKey = Tuple[float, float, int, int, int]
+
+
+def validate_tile(z: int, x: int, y: int):
+    """检查瓦片坐标，非法时抛出 ValueError"""
+    if z < 0 or z > MAX_ZOOM:
+        raise ValueError(f"缩放级别必须在 0 到 {MAX_ZOOM} 之间: {z}")
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"瓦片坐标超出范围: {z}/{x}/{y}")
+
+
+def _tile_latitude(y: int, n: int) -> float:
+    """瓦片行号 y 上边缘的纬度"""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    瓦片的经纬度范围
+
+    Returns:
+        (南, 西, 北, 东)，单位为度
+    """
+    n = 1 << z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    return _tile_latitude(y + 1, n), west, _tile_latitude(y, n), east
+
+
+def tile_resolution(z: int) -> float:
+    """缩放级别对应的网格分辨率（度）：瓦片经度跨度 / TILE_CELLS，不细于 MIN_TILE_RESOLUTION"""
+    return max(360.0 / (1 << z) / TILE_CELLS, MIN_TILE_RESOLUTION)
+
+
+def time_bucket(start_time: float, end_time: float, bucket: int = DEFAULT_TIME_BUCKET) -> TimeBucket:
+    """请求的时间范围向外取整到时间桶边界，相近的时间范围共用同一组瓦片"""
+    if bucket <= 0:
+        return float(start_time), float(end_time)
+    return float(math.floor(start_time / bucket) * bucket), float(math.ceil(end_time / bucket) * bucket)
+
+
+def tile_cells(grid: SparseGrid, z: int, x: int, y: int) -> SparseGrid:
+    """
+    层级网格中属于某个瓦片的单元
+
+    以网格中心判断归属（西、南边界含、东、北边界不含），每个单元只属于一个瓦片
+    """
+    south, west, north, east = tile_bounds(z, x, y)
+    lats, lngs, _ = grid.to_points()
+    inside = (lngs >= west) & (lngs < east) & (lats >= south) & (lats < north)
+    if y == 0:
+        # 最北一行包含北边界
+        inside |= (lngs >= west) & (lngs < east) & (lats >= north)
+    return SparseGrid(grid.resolution, grid.lat_idx[inside], grid.lng_idx[inside], grid.counts[inside])
+
+
+class TileCache:
+    """
+    热力图瓦片缓存
+
+    - 瓦片以 (时间桶开始, 时间桶结束, z, x, y) 为键，层级网格以 (时间桶开始, 时间桶结束, z) 为键，
+      各自按最近最少使用淘汰
+    - 同一层级网格的并发请求只统计一次，其余请求等待结果
+    """
+
+    def __init__(self, max_tiles: int = DEFAULT_MAX_TILES, max_levels: int = DEFAULT_MAX_LEVELS):
+        """
+        初始化缓存
+
+        Args:
+            max_tiles: 瓦片数上限
+            max_levels: 层级网格数上限
+        """
+        self.max_tiles = max_tiles
+        self.max_levels = max_levels
+        self.hits = 0
+        self.misses = 0
+        self.level_hits = 0
+        self.level_misses = 0
+        self.evictions = 0
+        self._tiles: 'OrderedDict[TileKey, Dict[str, Any]]' = OrderedDict()
+        self._levels: 'OrderedDict[LevelKey, SparseGrid]' = OrderedDict()
+        self._level_locks: Dict[LevelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_tile(self, key: TileKey) -> Optional[Dict[str, Any]]:
+        """查询瓦片，未命中返回None"""
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put_tile(self, key: TileKey, tile: Dict[str, Any]):
+        """加入瓦片"""
+        with self._lock:
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+                self.evictions += 1
+
+    def level(self, key: LevelKey, compute: Callable[[], SparseGrid]) -> SparseGrid:
+        """
+        取层级网格，不在缓存中时调用 compute 统计
+
+        Args:
+            key: (时间桶开始, 时间桶结束, z)
+            compute: 统计该层级网格的函数
+        """
+        with self._lock:
+            grid = self._levels.get(key)
+            if grid is not None:
+                self._levels.move_to_end(key)
+                self.level_hits += 1
+                return grid
+            level_lock = self._level_locks.setdefault(key, threading.Lock())
+        with level_lock:
+            with self._lock:
+                grid = self._levels.get(key)
+                if grid is not None:
+                    # 等待期间已由其他请求统计完成
+                    self._levels.move_to_end(key)
+                    self.level_hits += 1
+                    return grid
+                self.level_misses += 1
+            grid = compute()
+            with self._lock:
+                self._levels[key] = grid
+                while len(self._levels) > self.max_levels:
+                    self._levels.popitem(last=False)
+                self._level_locks.pop(key, None)
+        return grid
+
+    def invalidate_ranges(self, ranges: List[Tuple[float, float]]) -> int:
+        """
+        删除时间桶与任一给定范围相交的瓦片和层级网格
+
+        Returns:
+            删除的瓦片数
+        """
+        def stale(key) -> bool:
+            return any(key[0] <= range_end and key[1] >= range_start for range_start, range_end in ranges)
+
+        with self._lock:
+            stale_tiles = [key for key in self._tiles if stale(key)]
+            for key in stale_tiles:
+                del self._tiles[key]
+            for key in [key for key in self._levels if stale(key)]:
+                del self._levels[key]
+        return len(stale_tiles)
+
+    def clear(self):
+        """清空缓存（计数器保留）"""
+        with self._lock:
+            self._tiles.clear()
+            self._levels.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计：瓦片和层级网格的命中、未命中、淘汰次数及当前数量"""
+        with self._lock:
+            return {
+                'tiles': len(self._tiles),
+                'max_tiles': self.max_tiles,
+                'levels': len(self._levels),
+                'max_levels': self.max_levels,
+                'hits': self.hits,
+                'misses': self.misses,
+                'level_hits': self.level_hits,
+                'level_misses': self.level_misses,
+                'evictions': self.evictions,
+            }
+
+
+def build_tile(grid: SparseGrid, z: int, x: int, y: int, bucket: TimeBucket) -> Dict[str, Any]:
+    """
+    由层级网格生成瓦片响应数据
+
+    Returns:
+        {'z', 'x', 'y', 'bounds', 'resolution', 'start_time', 'end_time', 'points', 'total', 'level_max'}，
+        level_max 为整个层级的最大单元计数，前端可据此在各瓦片间统一配色
+    """
+    cells = tile_cells(grid, z, x, y)
+    south, west, north, east = tile_bounds(z, x, y)
+    return {
+        'z': z,
+        'x': x,
+        'y': y,
+        'bounds': [south, west, north, east],
+        'resolution': grid.resolution,
+        'start_time': bucket[0],
+        'end_time': bucket[1],
+        'points': cells.to_records(),
+        'total': cells.total(),
+        'level_max': int(grid.counts.max()) if len(grid) else 0,
+    }
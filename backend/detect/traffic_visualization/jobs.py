@@ -0,0 +1,250 @@
+"""
+后台分析任务
+OD分析、路段分析、综合时空分析、聚类参数优化等耗时分析以任务方式提交：
+提交后立即返回任务ID，之后轮询状态和进度（阶段、已处理行数）、获取结果或取消。
+任务在进程内的队列中执行，相同参数的任务在排队或执行中时直接复用；
+已结束任务的结果由分析函数下层的持久化结果缓存复用（按数据集指纹校验）
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# 同时执行的后台任务数，可通过环境变量 TRAFFIC_JOB_WORKERS 调整
+DEFAULT_JOB_WORKERS = int(os.environ.get("TRAFFIC_JOB_WORKERS", "2"))
+# 保留的已结束任务数，超出后删除最早结束的任务
+MAX_FINISHED_JOBS = 100
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+_local = threading.local()
+
+
+class JobCancelled(BaseException):
+    """
+    任务已被取消
+
+    与 asyncio.CancelledError 一样继承 BaseException，
+    不会被分析代码中的 except Exception 捕获而被当作普通失败
+    """
+
+
+class Job:
+    """一个后台任务及其状态"""
+
+    def __init__(self, kind: str, params: Dict[str, Any], key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = JOB_QUEUED
+        self.stage = '排队中'
+        self.rows_processed = 0
+        self.progress = 0.0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def report(self, stage: str = None, rows: int = None, progress: float = None):
+        """
+        更新任务进度，同时检查取消请求
+
+        Raises:
+            JobCancelled: 任务已被取消
+        """
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+        if stage is not None:
+            self.stage = stage
+        if rows is not None:
+            self.rows_processed = int(rows)
+        if progress is not None:
+            self.progress = max(self.progress, min(float(progress), 1.0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态（不含结果）"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'stage': self.stage,
+            'rows_processed': self.rows_processed,
+            'progress': round(self.progress, 3),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+def report_progress(stage: str = None, rows: int = None, progress: float = None):
+    """
+    在后台任务中报告进度并检查取消请求；不在后台任务中调用时不做任何事
+
+    分析代码在各阶段之间调用，同步接口和后台任务可以共用同一份实现
+    """
+    job = getattr(_local, 'job', None)
+    if job is not None:
+        job.report(stage, rows, progress)
+
+
+def _result_error(result: Any) -> Optional[str]:
+    """结果（字典或响应模型）中 success 为 False 时返回其 message，否则返回None"""
+    if isinstance(result, dict):
+        success, message = result.get('success', True), result.get('message')
+    else:
+        success, message = getattr(result, 'success', True), getattr(result, 'message', None)
+    if success is False:
+        return str(message or '任务失败')
+    return None
+
+
+class JobManager:
+    """进程内的后台任务队列"""
+
+    def __init__(self, workers: int = DEFAULT_JOB_WORKERS, max_finished: int = MAX_FINISHED_JOBS):
+        """
+        初始化任务管理器
+
+        Args:
+            workers: 同时执行的任务数
+            max_finished: 保留的已结束任务数
+        """
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="traffic-job")
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, params: Dict[str, Any]) -> str:
+        """任务类型和参数的规范化键（参数按键排序后序列化）"""
+        return kind + ':' + json.dumps(params, sort_keys=True, default=str)
+
+    def submit(self, kind: str, func: Callable[[], Any], params: Dict[str, Any],
+               reuse: bool = True) -> Job:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型
+            func: 无参数的任务函数，返回值即任务结果
+            params: 任务参数（用于展示和结果复用）
+            reuse: 相同类型和参数的任务排队或执行中时，直接返回该任务
+                （已结束的任务不复用，结果由持久化结果缓存复用，数据集变化后自动失效）
+
+        Returns:
+            任务对象
+        """
+        key = self.make_key(kind, params)
+        with self._lock:
+            if reuse:
+                for job in reversed(self._jobs.values()):
+                    if job.key == key and job.status in (JOB_QUEUED, JOB_RUNNING):
+                        return job
+            job = Job(kind, params, key)
+            self._jobs[job.id] = job
+            self._trim()
+        job.future = self._pool.submit(self._run, job, func)
+        return job
+
+    def _run(self, job: Job, func: Callable[[], Any]):
+        """在任务线程中执行任务"""
+        if job.cancel_requested:
+            self._finish(job, JOB_CANCELLED)
+            return
+        job.status = JOB_RUNNING
+        job.stage = '开始执行'
+        job.started_at = time.time()
+        _local.job = job
+        try:
+            job.result = func()
+            error = _result_error(job.result)
+            if error is not None:
+                # 分析函数自行捕获异常并返回 success=False，按失败处理
+                job.error = error
+                self._finish(job, JOB_FAILED)
+                return
+            job.progress = 1.0
+            job.stage = '完成'
+            self._finish(job, JOB_SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, JOB_CANCELLED)
+        except Exception as e:
+            print(f"后台任务 {job.kind} ({job.id}) 失败: {str(e)}")
+            job.error = str(e)
+            self._finish(job, JOB_FAILED)
+        finally:
+            _local.job = None
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        if status == JOB_CANCELLED:
+            job.stage = '已取消'
+        job.finished_at = time.time()
+        with self._lock:
+            self._trim()
+
+    def _trim(self):
+        """删除最早结束的任务，使已结束任务数不超过上限"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """按ID获取任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """全部任务（按提交顺序）"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        取消任务：排队中的任务直接取消，执行中的任务在下一次报告进度时停止
+
+        Returns:
+            任务对象，不存在时返回None
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, JOB_CANCELLED)
+        return job
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """进程内共享的任务管理器（首次调用时创建）"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager()
+    return _job_manager
@@ -42,6 +42,7 @@ class TrackPoint(Point):
 class HeatmapPoint(Point):
     """热力图点"""
     count: int = 1
+    intensity: Optional[float] = None  # 核密度估计模式下的密度（每个单元的期望点数）
     
 class VehicleTrack(BaseModel):
     """车辆轨迹"""
@@ -74,6 +75,7 @@ class TrafficResponse(BaseModel):
     """交通数据响应基类"""
     success: bool = True
     message: Optional[str] = None
+    data_source: Optional[str] = None  # 数据来源，如 column_store、preprocessed+csv
     
 class TrafficDataResponse(TrafficResponse):
     """交通数据响应"""
@@ -85,6 +87,19 @@ class HeatmapResponse(TrafficResponse):
     """热力图响应"""
     points: List[HeatmapPoint]
     
+class HeatmapTileResponse(TrafficResponse):
+    """热力图瓦片响应"""
+    z: int
+    x: int
+    y: int
+    bounds: List[float] = []  # [南, 西, 北, 东]
+    resolution: float = 0.0
+    start_time: Optional[float] = None  # 取整到时间桶后的时间范围
+    end_time: Optional[float] = None
+    points: List[HeatmapPoint] = []
+    total: int = 0
+    level_max: int = 0  # 该缩放级别所有瓦片中的最大单元计数，用于统一配色
+    
 class TracksResponse(TrafficResponse):
     """轨迹响应"""
     tracks: List[VehicleTrack]
@@ -143,11 +158,19 @@ class ClusteringRequest(BaseModel):
     params: Dict[str, Any] = {}
     data_type: str = "pickup"  # "pickup", "dropoff", "all_points"
 
+class ClusteringOptimizeRequest(BaseModel):
+    """聚类参数优化请求参数"""
+    algorithm: str = "dbscan"  # "dbscan", "kmeans", "hierarchical"
+    data_type: str = "pickup"  # "pickup", "dropoff", "all_points"
+    param_ranges: Optional[Dict[str, List[Any]]] = None  # 为空时使用默认参数范围
+
 class HeatmapRequest(BaseModel):
     """热力图请求参数"""
     temporal_resolution: int = 15  # 时间分辨率（分钟）
     spatial_resolution: float = 0.001  # 空间分辨率（度）
     smoothing: bool = True
+    smoothing_window: int = 3  # 平滑窗口大小（帧数，正奇数）
+    smoothing_kernel: str = "boxcar"  # "boxcar", "gaussian"
     normalization: str = "minmax"  # "minmax", "zscore", "none"
 
 class ODAnalysisRequest(BaseModel):
@@ -192,6 +215,7 @@ class ODFlowResponse(BaseModel):
     flow_matrix: Optional[List[List[int]]] = None
     top_flows: List[Dict[str, Any]]
     statistics: Dict[str, Any]
+    data_source: Optional[str] = None  # 数据来源，含截断、采样说明
 
 # 路段分析相关模型
 
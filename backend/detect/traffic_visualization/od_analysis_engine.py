@@ -9,6 +9,8 @@ from typing import List, Dict, Any, Tuple, Optional
 import math
 from datetime import datetime, timedelta
 
+from .vehicle_index import iter_vehicle_groups
+
 class ODAnalysisEngine:
     """OD对分析引擎主类"""
     
@@ -40,10 +42,8 @@ class ODAnalysisEngine:
         """
         od_pairs = []
         
-        # 按车辆分组处理
-        for vehicle_id, group in df.groupby('COMMADDR'):
-            group = group.sort_values('UTC').reset_index(drop=True)
-            
+        # 按车辆逐段处理（数据按车辆和时间排序，每辆车是一段连续切片）
+        for vehicle_id, group in iter_vehicle_groups(df):
             if len(group) < 2:
                 continue
                 
@@ -0,0 +1,284 @@
+"""
+持久化结果缓存
+分析接口的结果保存在数据目录下的 SQLite 文件中（WAL 模式），重启或重新部署后仍然有效，
+同一主机上的多个 uvicorn worker 进程共享同一个缓存文件。
+
+缓存键由接口名和规范化参数组成，每条结果同时记录生成时的数据集指纹，
+指纹不一致（数据已更新）的结果视为未命中；过期（TTL）的结果不再返回，
+总大小超出上限时按最近访问时间淘汰
+"""
+
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from .singleflight import canonical_key, request_params
+
+RESULT_CACHE_FILENAME = 'result_cache.sqlite'
+# 结果缓存总大小上限（字节），可通过环境变量 TRAFFIC_RESULT_CACHE_MB 调整
+DEFAULT_MAX_BYTES = int(os.environ.get("TRAFFIC_RESULT_CACHE_MB", "256")) * 1024 * 1024
+# 默认有效期（秒）
+DEFAULT_TTL = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_results_expires ON results (expires_at);
+"""
+
+
+class ResultCache:
+    """基于 SQLite 的持久化结果缓存（每个线程使用各自的连接）"""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        初始化结果缓存
+
+        Args:
+            path: SQLite 文件路径
+            max_bytes: 缓存总大小上限（字节，按压缩后的结果计算）
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """当前线程的连接，首次使用时建表；无法打开时停用缓存"""
+        if not self.enabled:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        try:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        except sqlite3.Error as e:
+            print(f"结果缓存不可用（{self.path}）: {str(e)}")
+            self.enabled = False
+            return None
+        self._local.conn = conn
+        return conn
+
+    def get(self, key: str, fingerprint: str) -> Optional[Any]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回结果（JSON 兼容的对象），未命中、过期或数据集指纹不一致时返回None
+        """
+        conn = self._connect()
+        if conn is None:
+            return None
+        now = time.time()
+        try:
+            row = conn.execute(
+                "SELECT value, fingerprint, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] != fingerprint or row[2] < now:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"读取结果缓存失败: {str(e)}")
+            return None
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, key: str, endpoint: str, fingerprint: str, value: Any, ttl: float = DEFAULT_TTL,
+            start_time: float = None, end_time: float = None):
+        """
+        写入缓存并按需淘汰
+
+        Args:
+            key: 缓存键
+            endpoint: 接口名
+            fingerprint: 数据集指纹
+            value: 结果（会先转换为 JSON 兼容的对象）
+            ttl: 有效期（秒）
+            start_time: 结果对应的查询开始时间（用于按时间范围失效），未知时为None
+            end_time: 结果对应的查询结束时间
+        """
+        conn = self._connect()
+        if conn is None:
+            return
+        blob = zlib.compress(json.dumps(jsonable_encoder(value), ensure_ascii=False).encode('utf-8'))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, fingerprint, start_time, end_time, blob, len(blob), now, now + ttl, now)
+            )
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"写入结果缓存失败: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期结果；总大小仍超出上限时按最近访问时间从旧到新删除"""
+        conn.execute("DELETE FROM results WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM results WHERE key = ?", victims)
+
+    def rebase(self, old_fingerprint: str, new_fingerprint: str,
+               ranges: Optional[List[Tuple[float, float]]]) -> Tuple[int, int]:
+        """
+        数据集版本更新后迁移缓存：删除时间范围与变化分区相交（或时间范围未知）的旧版本结果，
+        其余旧版本结果改记为新版本，继续有效
+
+        多个 worker 进程各自检测到同一变化时重复调用也是安全的
+
+        Args:
+            old_fingerprint: 旧数据集指纹
+            new_fingerprint: 新数据集指纹
+            ranges: 变化分区的时间范围列表，None表示范围未知（删除全部旧版本结果）
+
+        Returns:
+            (删除的结果数, 保留的结果数)
+        """
+        conn = self._connect()
+        if conn is None:
+            return 0, 0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if ranges is None:
+                removed = conn.execute("DELETE FROM results WHERE fingerprint = ?", (old_fingerprint,)).rowcount
+            else:
+                removed = conn.execute(
+                    "DELETE FROM results WHERE fingerprint = ? AND (start_time IS NULL OR end_time IS NULL)",
+                    (old_fingerprint,)
+                ).rowcount
+                for range_start, range_end in ranges:
+                    removed += conn.execute(
+                        "DELETE FROM results WHERE fingerprint = ? AND start_time <= ? AND end_time >= ?",
+                        (old_fingerprint, range_end, range_start)
+                    ).rowcount
+            kept = conn.execute(
+                "UPDATE results SET fingerprint = ? WHERE fingerprint = ?", (new_fingerprint, old_fingerprint)
+            ).rowcount
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            print(f"迁移结果缓存失败: {str(e)}")
+            return 0, 0
+        return removed, kept
+
+    def clear(self):
+        """清空缓存"""
+        conn = self._connect()
+        if conn is not None:
+            conn.execute("DELETE FROM results")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：条目数、总大小和本进程的命中/未命中次数"""
+        conn = self._connect()
+        if conn is None:
+            return {'enabled': False}
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {
+            'enabled': True,
+            'path': self.path,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def _is_success(result: Any) -> bool:
+    """只缓存成功的结果"""
+    if isinstance(result, dict):
+        return bool(result.get('success'))
+    return bool(getattr(result, 'success', False))
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    """查询参数中的时间（时间戳或ISO时间字符串），无法解析时返回None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            from datetime import datetime
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def persistent_cache(name: str, ttl: float = DEFAULT_TTL) -> Callable:
+    """
+    同步接口函数的装饰器：结果写入数据处理器的持久化结果缓存
+
+    从参数中找到共享的数据处理器（带 result_cache 属性的对象），
+    以接口名和其余参数的规范化哈希为键、以数据集指纹校验结果是否仍然有效；只缓存成功的结果
+
+    Args:
+        name: 接口名（通常为路由路径）
+        ttl: 有效期（秒）
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            processor = next((v for v in kwargs.values() if hasattr(v, 'result_cache')), None)
+            if processor is None:
+                return func(*args, **kwargs)
+            key = canonical_key(name, request_params(kwargs))
+            fingerprint = processor.dataset_fingerprint()
+
+            cached = processor.result_cache.get(key, fingerprint)
+            if cached is not None:
+                print(f"使用持久化结果缓存: {name}")
+                return cached
+
+            result = func(*args, **kwargs)
+            if _is_success(result):
+                processor.result_cache.put(
+                    key, name, fingerprint, result, ttl,
+                    _timestamp(kwargs.get('start_time')), _timestamp(kwargs.get('end_time'))
+                )
+            return result
+        return wrapper
+    return decorator
@@ -4,16 +4,23 @@ import os
 import datetime
 from collections import defaultdict
 from typing import List, Dict, Optional, Any, Union
-from .data_processor import TrafficDataProcessor
+from .data_processor import TrafficDataProcessor, data_source_of
 from .heatmap import HeatmapGenerator
 from .track import TrackAnalyzer
+from .dataset_service import get_data_processor, get_heatmap_generator, get_track_analyzer, get_dataset_watcher
+from .executor import offload, get_executor
+from .singleflight import coalesce, get_single_flight
+from .result_cache import persistent_cache
+from .jobs import JobManager, get_job_manager, report_progress
+from .vehicle_index import iter_vehicle_groups
+from .aggregation import AggregationSpec
 from .models import (
     TimeRangeRequest, TrafficQueryRequest, HeatmapRequest, 
     TrackQueryRequest, StatisticsRequest, TrafficResponse,
-    TrafficDataResponse, HeatmapResponse, TracksResponse,
+    TrafficDataResponse, HeatmapResponse, HeatmapTileResponse, TracksResponse,
     StatisticsResponse, TrafficOverview, TimeDistribution,
     DynamicHeatmapResponse, ClusteringRequest, ClusteringResponse,
-    ODAnalysisRequest, ODFlowResponse, SpatioTemporalResponse,
+    ClusteringOptimizeRequest, ODAnalysisRequest, ODFlowResponse, SpatioTemporalResponse,
     SpatioTemporalAnalysis, RoadAnalysisRequest, RoadAnalysisResponse,
     RoadSegmentResponse, RoadTrafficResponse, RoadVisualizationResponse,
     RoadSegment, RoadTrafficData, RoadSegmentStatistics, 
@@ -30,10 +37,7 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# 创建数据处理器实例
-data_processor = TrafficDataProcessor()
-heatmap_generator = HeatmapGenerator()
-track_analyzer = TrackAnalyzer()
+# 数据处理器、热力图生成器和轨迹分析器由 dataset_service 在进程内共享，通过依赖注入获取
 
 @router.get("/test")
 async def test_endpoint():
@@ -41,19 +45,25 @@ async def test_endpoint():
     return {"message": "Traffic router is working!", "status": "ok"}
 
 @router.get("/stats", response_model=StatisticsResponse)
-async def get_traffic_stats(
+@coalesce("/stats")
+@offload
+@persistent_cache("/stats")
+def get_traffic_stats(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    group_by: str = Query("hour", description="时间分组方式（hour, day, week, month）")
+    group_by: str = Query("hour", description="时间分组方式（hour, day, week, month）"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取交通数据统计信息。
+    
+    以外存聚合逐批遍历完整时间范围，结果为精确值（不截断到24小时、不采样）
     """
     try:
-        # 加载数据
-        df = data_processor.load_data(start_time, end_time)
+        # 计算统计信息
+        stats = data_processor.calculate_statistics_streaming(start_time, end_time, group_by)
         
-        if df.empty:
+        if stats['total_points'] == 0:
             return StatisticsResponse(
                 success=False,
                 message="未找到符合条件的数据",
@@ -68,12 +78,10 @@ async def get_traffic_stats(
                 time_distribution=[]
             )
         
-        # 计算统计信息
-        stats = data_processor.calculate_statistics(df, group_by)
-        
         # 构造响应
         return StatisticsResponse(
             success=True,
+            data_source=data_processor.describe_sources(start_time, end_time, allow_sampled=False),
             overview=TrafficOverview(
                 total_vehicles=stats['total_vehicles'],
                 total_points=stats['total_points'],
@@ -102,13 +110,51 @@ async def get_traffic_stats(
             time_distribution=[]
         )
 
+@router.get("/aggregate")
+@coalesce("/aggregate")
+@offload
+@persistent_cache("/aggregate")
+def get_traffic_aggregate(
+    start_time: float = Query(..., description="开始时间戳（UTC）"),
+    end_time: float = Query(..., description="结束时间戳（UTC）"),
+    metrics: str = Query("count", description="聚合指标，逗号分隔，如 count,mean:SPEED,distinct:COMMADDR,histogram:SPEED:0:120:12"),
+    group_by: Optional[str] = Query(None, description="时间分组方式（hour, day, week, month），为空表示不分组"),
+    vehicle_id: Optional[str] = Query(None, description="车辆ID，可选"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
+):
+    """
+    外存聚合查询：逐批遍历完整时间范围并合并部分聚合结果，返回精确值
+    
+    支持 count、sum、mean、min、max、distinct、histogram，内存占用与时间跨度无关
+    """
+    try:
+        specs = dict(AggregationSpec.parse(metric) for metric in metrics.split(',') if metric.strip())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if group_by is not None and group_by not in ('hour', 'day', 'week', 'month'):
+        raise HTTPException(status_code=400, detail=f"不支持的分组方式: {group_by}")
+    
+    try:
+        result = data_processor.aggregate(start_time, end_time, specs, group_by, vehicle_id)
+        return {
+            "success": result['rows'] > 0,
+            "message": None if result['rows'] > 0 else "未找到符合条件的数据",
+            "data_source": result['data_source'],
+            "rows": result['rows'],
+            "group_by": group_by,
+            "results": convert_numpy_types(result['results'])
+        }
+    except Exception as e:
+        print(f"聚合查询失败: {str(e)}")
+        return {"success": False, "message": f"聚合查询失败: {str(e)}", "results": {}}
+
 def convert_time_to_timestamp(time_str: str) -> float:
     """将时间字符串转换为UTC时间戳"""
     try:
         if 'T' in time_str:
-            dt = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+            dt = datetime.datetime.fromisoformat(time_str.replace('Z', '+00:00'))
         else:
-            dt = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
+            dt = datetime.datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
         return dt.timestamp()
     except Exception as e:
         logger.error(f"时间转换失败: {time_str}, 错误: {e}")
@@ -135,12 +181,16 @@ def convert_numpy_types(obj):
     return obj
 
 @router.get("/visualization", response_model=TrafficDataResponse)
-async def get_traffic_visualization(
+@coalesce("/visualization")
+@offload
+@persistent_cache("/visualization")
+def get_traffic_visualization(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
     view_type: str = Query("distribution", description="视图类型：distribution, trajectory, heatmap"),
     vehicle_id: Optional[str] = Query(None, description="车辆ID，可选"),
-    map_style: Optional[str] = Query("blue", description="地图样式")
+    map_style: Optional[str] = Query("blue", description="地图样式"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取交通数据可视化所需数据（分布视图、轨迹视图、热力图）。
@@ -149,18 +199,20 @@ async def get_traffic_visualization(
         print(f"=== 开始处理可视化请求 ===")
         print(f"参数: start_time={start_time}, end_time={end_time}, view_type={view_type}, vehicle_id={vehicle_id}")
         
-        # 验证时间范围
-        min_valid_time = 1378944000  # 2013-09-12 00:00:00 UTC
-        max_valid_time = 1379548799  # 2013-09-18 23:59:59 UTC
-        
-        if end_time < min_valid_time or start_time > max_valid_time:
-            print(f"时间范围验证失败: {start_time}-{end_time} 超出有效范围 {min_valid_time}-{max_valid_time}")
-            return TrafficDataResponse(
-                success=False,
-                message="查询时间超出数据集范围（2013年9月12日至9月18日）",
-                view_type=view_type,
-                data=[]
-            )
+        # 验证时间范围（数据集时间范围来自数据集目录）
+        time_range = data_processor.get_time_range()
+        if time_range is not None:
+            min_valid_time, max_valid_time = time_range
+            if end_time < min_valid_time or start_time > max_valid_time:
+                print(f"时间范围验证失败: {start_time}-{end_time} 超出有效范围 {min_valid_time}-{max_valid_time}")
+                first_day = datetime.datetime.fromtimestamp(min_valid_time, tz=datetime.timezone.utc)
+                last_day = datetime.datetime.fromtimestamp(max_valid_time, tz=datetime.timezone.utc)
+                return TrafficDataResponse(
+                    success=False,
+                    message=f"查询时间超出数据集范围（{first_day:%Y年%m月%d日}至{last_day:%m月%d日}）",
+                    view_type=view_type,
+                    data=[]
+                )
         
         # 加载数据
         try:
@@ -191,21 +243,8 @@ async def get_traffic_visualization(
         try:
             print(f"开始处理 {view_type} 视图数据...")
             if view_type == "heatmap":
-                # 生成热力图数据
-                heatmap_points = data_processor.generate_heatmap_data(df)
-                # 确保每个点都被正确序列化
-                data = []
-                for point in heatmap_points:
-                    try:
-                        data.append(point.dict())
-                    except Exception as e:
-                        print(f"序列化热力图点时出错: {e}")
-                        # 使用手动构造的字典作为备选方案
-                        data.append({
-                            "lat": point.lat,
-                            "lng": point.lng,
-                            "count": point.count
-                        })
+                # 生成热力图数据（已是可直接序列化的字典列表）
+                data = data_processor.generate_heatmap_data(df)
                 print(f"生成了 {len(data)} 个热力图点")
             
             elif view_type == "trajectory":
@@ -266,7 +305,8 @@ async def get_traffic_visualization(
                 message="数据获取成功",
                 view_type=view_type,
                 data=convert_numpy_types(data),
-                stats=convert_numpy_types(stats)
+                stats=convert_numpy_types(stats),
+                data_source=data_source_of(df)
             )
         except Exception as stats_error:
             print(f"统计信息计算错误: {str(stats_error)}")
@@ -275,7 +315,8 @@ async def get_traffic_visualization(
                 success=True,
                 message="数据获取成功（统计信息计算失败）",
                 view_type=view_type,
-                data=convert_numpy_types(data)
+                data=convert_numpy_types(data),
+                data_source=data_source_of(df)
             )
         
     except Exception as e:
@@ -292,15 +333,41 @@ async def get_traffic_visualization(
         )
 
 @router.get("/heatmap", response_model=HeatmapResponse)
-async def get_heatmap_data(
+@coalesce("/heatmap")
+@offload
+@persistent_cache("/heatmap")
+def get_heatmap_data(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    resolution: float = Query(0.001, description="热力图分辨率")
+    resolution: float = Query(0.001, description="热力图分辨率"),
+    full_range: bool = Query(False, description="是否流式统计完整时间范围（不截断、不采样）"),
+    mode: str = Query("count", description="热力图模式：count（网格计数）或 kde（核密度估计）"),
+    bandwidth: float = Query(0.002, description="核密度估计的高斯核带宽（度），仅 kde 模式"),
+    threshold: float = Query(0.05, description="核密度估计的阈值（相对最大密度），仅 kde 模式"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取热力图数据。
+    kde 模式先按细网格计数再用高斯核（FFT卷积）平滑，只返回密度不低于阈值的单元。
     """
+    if mode not in ("count", "kde"):
+        raise HTTPException(status_code=400, detail=f"不支持的热力图模式: {mode}")
     try:
+        if full_range:
+            # 逐批读取完整时间范围，增量累计网格计数
+            if mode == "kde":
+                heatmap_points = data_processor.generate_kde_heatmap_streaming(
+                    start_time, end_time, resolution, bandwidth, threshold
+                )
+            else:
+                heatmap_points = data_processor.generate_heatmap_data_streaming(start_time, end_time, resolution)
+            return HeatmapResponse(
+                success=bool(heatmap_points),
+                message=None if heatmap_points else "未找到符合条件的数据",
+                points=heatmap_points,
+                data_source="streaming"
+            )
+        
         # 加载数据
         df = data_processor.load_data(start_time, end_time)
         
@@ -312,12 +379,16 @@ async def get_heatmap_data(
             )
         
         # 生成热力图数据
-        heatmap_points = data_processor.generate_heatmap_data(df, resolution)
+        if mode == "kde":
+            heatmap_points = data_processor.generate_kde_heatmap(df, resolution, bandwidth, threshold)
+        else:
+            heatmap_points = data_processor.generate_heatmap_data(df, resolution)
         
         # 构造响应
         return HeatmapResponse(
             success=True,
-            points=heatmap_points
+            points=heatmap_points,
+            data_source=data_source_of(df)
         )
     except Exception as e:
         return HeatmapResponse(
@@ -326,18 +397,49 @@ async def get_heatmap_data(
             points=[]
         )
 
+@router.get("/heatmap/tiles/{z}/{x}/{y}", response_model=HeatmapTileResponse)
+@coalesce("/heatmap/tiles")
+@offload
+def get_heatmap_tile(
+    z: int,
+    x: int,
+    y: int,
+    start_time: float = Query(..., description="开始时间戳（UTC）"),
+    end_time: float = Query(..., description="结束时间戳（UTC）"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
+):
+    """
+    获取 XYZ 热力图瓦片。
+    网格分辨率随缩放级别变化，只返回该瓦片内的网格单元；时间范围向外取整到时间桶，
+    瓦片按 (时间桶, z, x, y) 缓存在服务端。
+    """
+    try:
+        tile = data_processor.generate_heatmap_tile(start_time, end_time, z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return HeatmapTileResponse(
+            success=False,
+            message=f"获取热力图瓦片失败: {str(e)}",
+            z=z, x=x, y=y
+        )
+    return HeatmapTileResponse(success=True, data_source="streaming", **tile)
+
 @router.get("/track", response_model=TracksResponse)
-async def get_track(
+@coalesce("/track")
+@offload
+def get_track(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    vehicle_id: Optional[str] = Query(None, description="车辆ID，可选")
+    vehicle_id: Optional[str] = Query(None, description="车辆ID，可选"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     按时间段和车辆ID查询车辆轨迹数据。
     """
     try:
         # 加载数据
-        df = data_processor.load_data(start_time, end_time, vehicle_id)
+        df = data_processor.load_data(start_time, end_time, vehicle_id, full_rows=True)
         
         if df.empty:
             return TracksResponse(
@@ -352,7 +454,8 @@ async def get_track(
         # 构造响应
         return TracksResponse(
             success=True,
-            tracks=tracks
+            tracks=tracks,
+            data_source=data_source_of(df)
         )
     except Exception as e:
         return TracksResponse(
@@ -362,17 +465,36 @@ async def get_track(
         )
 
 @router.get("/clear-cache")
-async def clear_cache():
+async def clear_cache(data_processor: TrafficDataProcessor = Depends(get_data_processor)):
     """
     清除数据处理器的缓存。
     """
     data_processor.clear_cache()
     return {"success": True, "message": "缓存已清除"}
 
+@router.get("/cache-stats")
+async def get_cache_stats(data_processor: TrafficDataProcessor = Depends(get_data_processor)):
+    """
+    数据缓存统计：内存缓存、持久化结果缓存和热力图瓦片缓存的命中、淘汰及占用情况，分析执行器和请求合并的计数，以及数据集版本。
+    """
+    return {
+        "success": True,
+        "cache": data_processor.frame_cache.stats(),
+        "result_cache": data_processor.result_cache.stats(),
+        "tile_cache": data_processor.tile_cache.stats(),
+        "executor": get_executor().stats(),
+        "single_flight": get_single_flight().stats(),
+        "dataset": get_dataset_watcher().stats()
+    }
+
 @router.get("/orders/analysis")
-async def get_orders_analysis(
+@coalesce("/orders/analysis")
+@offload
+@persistent_cache("/orders/analysis")
+def get_orders_analysis(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
-    end_time: float = Query(..., description="结束时间戳（UTC）")
+    end_time: float = Query(..., description="结束时间戳（UTC）"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     根据订单起止时间，分析乘客乘车的距离与时间分布。
@@ -380,7 +502,7 @@ async def get_orders_analysis(
     """
     try:
         # 加载数据
-        df = data_processor.load_data(start_time, end_time)
+        df = data_processor.load_data(start_time, end_time, full_rows=True)
         
         if df.empty:
             return {
@@ -393,11 +515,8 @@ async def get_orders_analysis(
         # 这里我们假设每个车辆的连续轨迹点构成一个"订单"
         orders_data = []
         
-        # 按车辆分组处理
-        for vehicle_id, group in df.groupby('COMMADDR'):
-            # 按时间排序
-            group = group.sort_values('UTC')
-            
+        # 按车辆逐段处理（数据按车辆和时间排序，每辆车是一段连续切片）
+        for vehicle_id, group in iter_vehicle_groups(df):
             # 如果轨迹点太少，跳过
             if len(group) < 2:
                 continue
@@ -486,7 +605,8 @@ async def get_orders_analysis(
                 "total_orders": len(orders_data),
                 "avg_duration": round(orders_df['duration_min'].mean(), 1),
                 "avg_distance": round(orders_df['distance_km'].mean(), 1)
-            }
+            },
+            "data_source": data_source_of(df)
         }
     except Exception as e:
         return {
@@ -496,10 +616,13 @@ async def get_orders_analysis(
         }
 
 @router.get("/heatmap/time-filtered")
-async def get_time_filtered_heatmap(
+@coalesce("/heatmap/time-filtered")
+@offload
+def get_time_filtered_heatmap(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    resolution: float = Query(0.001, description="热力图分辨率")
+    resolution: float = Query(0.001, description="热力图分辨率"),
+    heatmap_generator: HeatmapGenerator = Depends(get_heatmap_generator)
 ):
     """
     获取按时间段过滤的热力图数据。
@@ -523,10 +646,13 @@ async def get_time_filtered_heatmap(
         }
 
 @router.get("/heatmap/pickup")
-async def get_pickup_heatmap(
+@coalesce("/heatmap/pickup")
+@offload
+def get_pickup_heatmap(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    resolution: float = Query(0.001, description="热力图分辨率")
+    resolution: float = Query(0.001, description="热力图分辨率"),
+    heatmap_generator: HeatmapGenerator = Depends(get_heatmap_generator)
 ):
     """
     获取上客点热力图数据。
@@ -549,10 +675,13 @@ async def get_pickup_heatmap(
         }
 
 @router.get("/track/metrics")
-async def get_track_metrics(
+@coalesce("/track/metrics")
+@offload
+def get_track_metrics(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    vehicle_id: Optional[str] = Query(None, description="车辆ID，可选")
+    vehicle_id: Optional[str] = Query(None, description="车辆ID，可选"),
+    track_analyzer: TrackAnalyzer = Depends(get_track_analyzer)
 ):
     """
     获取轨迹指标。
@@ -576,11 +705,14 @@ async def get_track_metrics(
         }
 
 @router.get("/track/similar")
-async def get_similar_tracks(
+@coalesce("/track/similar")
+@offload
+def get_similar_tracks(
     track_id: str = Query(..., description="参考轨迹的车辆ID"),
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
-    similarity_threshold: float = Query(0.7, description="相似度阈值（0-1）")
+    similarity_threshold: float = Query(0.7, description="相似度阈值（0-1）"),
+    track_analyzer: TrackAnalyzer = Depends(get_track_analyzer)
 ):
     """
     查找相似轨迹。
@@ -611,15 +743,42 @@ async def get_similar_tracks(
         }
 
 @router.get("/sample-vehicles")
-async def get_sample_vehicles(
+@coalesce("/sample-vehicles")
+@offload
+@persistent_cache("/sample-vehicles")
+def get_sample_vehicles(
     start_time: float = Query(1379030400, description="开始时间戳（UTC，默认2013-09-13 08:00）"),
     end_time: float = Query(1379044800, description="结束时间戳（UTC，默认2013-09-13 12:00）"),
-    limit: int = Query(50, description="返回的车辆数量限制")
+    limit: int = Query(50, description="返回的车辆数量限制"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取指定时间段内的示例车辆ID列表，用于轨迹查询测试
+    
+    有数据集目录时直接汇总目录中各分区文件的车辆行数（按小时分区粒度），不再加载数据
     """
     try:
+        catalog_counts = data_processor.catalog.vehicle_counts(start_time, end_time)
+        if catalog_counts is not None:
+            codes, counts = catalog_counts
+            order = np.argsort(-counts, kind='stable')[:limit]
+            vehicle_ids = data_processor.dataset_store.dictionary.decode(codes[order])
+            vehicles = [
+                {
+                    "vehicle_id": str(vehicle_id),
+                    "data_points": int(count),
+                    "description": f"车辆 {vehicle_id} (共{count}个数据点)"
+                }
+                for vehicle_id, count in zip(vehicle_ids, counts[order])
+            ]
+            return {
+                "success": bool(vehicles),
+                "message": f"找到 {len(vehicles)} 个活跃车辆" if vehicles else "未找到符合条件的数据",
+                "vehicles": vehicles,
+                "time_range": f"{start_time} - {end_time}",
+                "total_vehicles": int(len(codes))
+            }
+        
         # 加载数据
         df = data_processor.load_data(start_time, end_time)
         
@@ -631,7 +790,8 @@ async def get_sample_vehicles(
             }
         
         # 获取车辆ID列表，按照数据点数量排序
-        vehicle_counts = df['COMMADDR'].value_counts().head(limit)
+        vehicle_counts = df['COMMADDR'].value_counts()
+        vehicle_counts = vehicle_counts[vehicle_counts > 0].head(limit)
         
         vehicles = []
         for vehicle_id, count in vehicle_counts.items():
@@ -646,7 +806,7 @@ async def get_sample_vehicles(
             "message": f"找到 {len(vehicles)} 个活跃车辆",
             "vehicles": vehicles,
             "time_range": f"{start_time} - {end_time}",
-            "total_vehicles": len(df['COMMADDR'].unique())
+            "total_vehicles": int(df['COMMADDR'].nunique())
         }
         
     except Exception as e:
@@ -654,11 +814,15 @@ async def get_sample_vehicles(
         return {"success": False, "message": f"获取示例车辆失败: {str(e)}", "vehicles": []}
 
 @router.get("/anomaly/detection", response_model=dict)
-async def detect_anomalies(
+@coalesce("/anomaly/detection")
+@offload
+@persistent_cache("/anomaly/detection")
+def detect_anomalies(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
     detection_types: str = Query("all", description="检测类型：all, long_stop, abnormal_route, speed_anomaly, cluster_anomaly"),
-    threshold_params: Optional[str] = Query(None, description="阈值参数JSON字符串")
+    threshold_params: Optional[str] = Query(None, description="阈值参数JSON字符串"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     异常检测API - 检测各种类型的交通异常
@@ -685,7 +849,7 @@ async def detect_anomalies(
         thresholds = {**default_thresholds, **thresholds}
         
         # 加载数据
-        df = data_processor.load_data(start_time, end_time)
+        df = data_processor.load_data(start_time, end_time, full_rows=True)
         
         if df.empty:
             return {
@@ -706,7 +870,8 @@ async def detect_anomalies(
             "message": f"检测完成，发现 {len(anomalies)} 个异常事件",
             "anomalies": convert_numpy_types(anomalies),
             "statistics": convert_numpy_types(stats),
-            "thresholds_used": thresholds
+            "thresholds_used": thresholds,
+            "data_source": data_source_of(df)
         }
         
     except Exception as e:
@@ -721,9 +886,12 @@ async def detect_anomalies(
         }
 
 @router.get("/anomaly/realtime", response_model=dict)
-async def get_realtime_anomalies(
+@coalesce("/anomaly/realtime")
+@offload
+def get_realtime_anomalies(
     time_window: int = Query(3600, description="时间窗口（秒），默认1小时"),
-    limit: int = Query(50, description="返回异常数量限制")
+    limit: int = Query(50, description="返回异常数量限制"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取实时异常事件
@@ -736,7 +904,7 @@ async def get_realtime_anomalies(
         start_time = end_time - time_window
         
         # 加载数据
-        df = data_processor.load_data(start_time, end_time)
+        df = data_processor.load_data(start_time, end_time, full_rows=True)
         
         if df.empty:
             return {
@@ -757,7 +925,8 @@ async def get_realtime_anomalies(
             "success": True,
             "anomalies": convert_numpy_types(limited_anomalies),
             "total_count": len(anomalies),
-            "time_range": {"start": start_time, "end": end_time}
+            "time_range": {"start": start_time, "end": end_time},
+            "data_source": data_source_of(df)
         }
         
     except Exception as e:
@@ -823,18 +992,22 @@ async def get_anomaly_types():
     }
 
 @router.get("/anomaly/heatmap", response_model=dict)
-async def get_anomaly_heatmap(
+@coalesce("/anomaly/heatmap")
+@offload
+@persistent_cache("/anomaly/heatmap")
+def get_anomaly_heatmap(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
     end_time: float = Query(..., description="结束时间戳（UTC）"),
     anomaly_type: str = Query("all", description="异常类型"),
-    resolution: float = Query(0.002, description="热力图分辨率")
+    resolution: float = Query(0.002, description="热力图分辨率"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取异常事件热力图数据
     """
     try:
         # 加载数据
-        df = data_processor.load_data(start_time, end_time)
+        df = data_processor.load_data(start_time, end_time, full_rows=True)
         
         if df.empty:
             return {
@@ -853,7 +1026,8 @@ async def get_anomaly_heatmap(
             "success": True,
             "heatmap_points": convert_numpy_types(heatmap_points),
             "total_anomalies": len(anomalies),
-            "resolution": resolution
+            "resolution": resolution,
+            "data_source": data_source_of(df)
         }
         
     except Exception as e:
@@ -865,12 +1039,18 @@ async def get_anomaly_heatmap(
         }
 
 @router.get("/spatiotemporal/dynamic-heatmap", response_model=DynamicHeatmapResponse)
-async def get_dynamic_heatmap(
+@coalesce("/spatiotemporal/dynamic-heatmap")
+@offload
+@persistent_cache("/spatiotemporal/dynamic-heatmap")
+def get_dynamic_heatmap(
     start_time: str,
     end_time: str,
     temporal_resolution: int = 15,
     spatial_resolution: float = 0.001,
-    smoothing: bool = True
+    smoothing: bool = True,
+    smoothing_window: int = 3,
+    smoothing_kernel: str = "boxcar",
+    processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取动态热力图数据
@@ -881,6 +1061,8 @@ async def get_dynamic_heatmap(
         temporal_resolution: 时间分辨率（分钟）
         spatial_resolution: 空间分辨率（度）
         smoothing: 是否平滑处理
+        smoothing_window: 平滑窗口大小（帧数，正奇数）
+        smoothing_kernel: 平滑卷积核（boxcar 或 gaussian）
     """
     try:
         logger.info(f"获取动态热力图: {start_time} to {end_time}, 时间分辨率: {temporal_resolution}分钟")
@@ -890,8 +1072,7 @@ async def get_dynamic_heatmap(
         end_timestamp = convert_time_to_timestamp(end_time)
         
         # 获取数据
-        processor = TrafficDataProcessor()
-        df = processor.get_data_by_time_range(start_timestamp, end_timestamp)
+        df = processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
             return DynamicHeatmapResponse(
@@ -907,7 +1088,9 @@ async def get_dynamic_heatmap(
             df,
             temporal_resolution=temporal_resolution,
             spatial_resolution=spatial_resolution,
-            smoothing=smoothing
+            smoothing=smoothing,
+            smoothing_window=smoothing_window,
+            smoothing_kernel=smoothing_kernel
         )
         
         # 计算统计信息
@@ -938,10 +1121,13 @@ async def get_dynamic_heatmap(
         )
 
 @router.post("/spatiotemporal/clustering", response_model=ClusteringResponse)
-async def perform_clustering_analysis(
+@offload
+@persistent_cache("/spatiotemporal/clustering")
+def perform_clustering_analysis(
     start_time: str,
     end_time: str,
-    request: ClusteringRequest
+    request: ClusteringRequest,
+    processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     执行聚类分析
@@ -959,8 +1145,7 @@ async def perform_clustering_analysis(
         end_timestamp = convert_time_to_timestamp(end_time)
         
         # 获取数据
-        processor = TrafficDataProcessor()
-        df = processor.get_data_by_time_range(start_timestamp, end_timestamp)
+        df = processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
             return ClusteringResponse(
@@ -1005,10 +1190,13 @@ async def perform_clustering_analysis(
         )
 
 @router.post("/spatiotemporal/od-analysis", response_model=ODFlowResponse)
-async def perform_od_analysis(
+@offload
+@persistent_cache("/spatiotemporal/od-analysis")
+def perform_od_analysis(
     start_time: str,
     end_time: str,
-    request: ODAnalysisRequest
+    request: ODAnalysisRequest,
+    processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     执行OD对分析
@@ -1026,8 +1214,8 @@ async def perform_od_analysis(
         end_timestamp = convert_time_to_timestamp(end_time)
         
         # 获取数据
-        processor = TrafficDataProcessor()
-        df = processor.get_data_by_time_range(start_timestamp, end_timestamp)
+        report_progress('加载数据')
+        df = processor.load_data(start_timestamp, end_timestamp, full_rows=True)
         
         if df.empty:
             return ODFlowResponse(
@@ -1052,7 +1240,8 @@ async def perform_od_analysis(
                 message="未找到符合条件的OD对",
                 od_pairs=[],
                 top_flows=[],
-                statistics={}
+                statistics={},
+                data_source=data_source_of(df)
             )
         
         # OD流量分析
@@ -1085,7 +1274,8 @@ async def perform_od_analysis(
             od_pairs=od_pairs,
             flow_matrix=flow_matrix,
             top_flows=top_flows,
-            statistics=statistics
+            statistics=statistics,
+            data_source=data_source_of(df)
         )
         
     except Exception as e:
@@ -1099,10 +1289,13 @@ async def perform_od_analysis(
         )
 
 @router.post("/spatiotemporal/comprehensive", response_model=SpatioTemporalResponse)
-async def perform_comprehensive_analysis(
+@offload
+@persistent_cache("/spatiotemporal/comprehensive")
+def perform_comprehensive_analysis(
     start_time: str,
     end_time: str,
-    heatmap_request: HeatmapRequest
+    heatmap_request: HeatmapRequest,
+    processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     执行综合时空分析
@@ -1120,8 +1313,8 @@ async def perform_comprehensive_analysis(
         end_timestamp = convert_time_to_timestamp(end_time)
         
         # 获取数据
-        processor = TrafficDataProcessor()
-        df = processor.get_data_by_time_range(start_timestamp, end_timestamp)
+        report_progress('加载数据')
+        df = processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
             return SpatioTemporalResponse(
@@ -1139,11 +1332,15 @@ async def perform_comprehensive_analysis(
             )
         
         # 生成时空热力图分析
+        report_progress('生成时空热力图', rows=len(df))
         analysis_result = processor.generate_spatiotemporal_heatmap(
             df,
             analysis_type="comprehensive",
             temporal_resolution=heatmap_request.temporal_resolution,
-            spatial_resolution=heatmap_request.spatial_resolution
+            spatial_resolution=heatmap_request.spatial_resolution,
+            smoothing=heatmap_request.smoothing,
+            smoothing_window=heatmap_request.smoothing_window,
+            smoothing_kernel=heatmap_request.smoothing_kernel
         )
         
         # 构造响应数据
@@ -1218,7 +1415,9 @@ async def get_available_algorithms():
 # 路段分析相关API接口
 
 @router.post("/api/road/analysis", response_model=RoadAnalysisResponse)
-async def analyze_road_segments(request: RoadAnalysisRequest):
+@offload
+@persistent_cache("/api/road/analysis", ttl=300)
+def analyze_road_segments(request: RoadAnalysisRequest, data_processor: TrafficDataProcessor = Depends(get_data_processor)):
     """
     路段分析API
     分析道路网络的通行状况、速度分布、拥堵情况等
@@ -1232,7 +1431,7 @@ async def analyze_road_segments(request: RoadAnalysisRequest):
         end_timestamp = current_time
         
         # 加载数据
-        data_processor = TrafficDataProcessor()
+        report_progress('加载数据')
         df = data_processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
@@ -1342,7 +1541,9 @@ async def analyze_road_segments(request: RoadAnalysisRequest):
         )
 
 @router.get("/api/road/segments", response_model=RoadSegmentResponse)
-async def get_road_segments():
+@coalesce("/api/road/segments")
+@offload
+def get_road_segments(data_processor: TrafficDataProcessor = Depends(get_data_processor)):
     """
     获取路段信息API
     返回当前系统识别的所有路段基础信息
@@ -1353,7 +1554,6 @@ async def get_road_segments():
         start_timestamp = current_time - 3600  # 1小时前
         end_timestamp = current_time
         
-        data_processor = TrafficDataProcessor()
         df = data_processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
@@ -1403,7 +1603,8 @@ async def get_road_segments():
         )
 
 @router.post("/api/road/traffic", response_model=RoadTrafficResponse)
-async def get_road_traffic_data(time_range: Dict[str, float]):
+@offload
+def get_road_traffic_data(time_range: Dict[str, float], data_processor: TrafficDataProcessor = Depends(get_data_processor)):
     """
     获取路段交通数据API
     返回指定时间范围内的路段交通状况数据
@@ -1412,7 +1613,6 @@ async def get_road_traffic_data(time_range: Dict[str, float]):
         start_timestamp = time_range.get("start", time.time() - 3600)
         end_timestamp = time_range.get("end", time.time())
         
-        data_processor = TrafficDataProcessor()
         df = data_processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
@@ -1478,7 +1678,8 @@ async def get_road_traffic_data(time_range: Dict[str, float]):
         )
 
 @router.post("/api/road/visualization", response_model=RoadVisualizationResponse)
-async def get_road_visualization_data(request: Dict[str, Any]):
+@offload
+def get_road_visualization_data(request: Dict[str, Any], data_processor: TrafficDataProcessor = Depends(get_data_processor)):
     """
     获取路段可视化数据API
     生成用于地图展示的路段可视化数据
@@ -1490,7 +1691,6 @@ async def get_road_visualization_data(request: Dict[str, Any]):
         start_timestamp = time_range.get("start", time.time() - 3600)
         end_timestamp = time_range.get("end", time.time())
         
-        data_processor = TrafficDataProcessor()
         df = data_processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
@@ -1556,7 +1756,9 @@ async def get_road_visualization_data(request: Dict[str, Any]):
         )
 
 @router.get("/api/road/metrics", response_model=Dict[str, Any])
-async def get_road_network_metrics():
+@coalesce("/api/road/metrics")
+@offload
+def get_road_network_metrics(data_processor: TrafficDataProcessor = Depends(get_data_processor)):
     """
     获取路网整体指标API
     返回道路网络的综合性能指标
@@ -1567,7 +1769,6 @@ async def get_road_network_metrics():
         start_timestamp = current_time - 24 * 3600  # 24小时前
         end_timestamp = current_time
         
-        data_processor = TrafficDataProcessor()
         df = data_processor.load_data(start_timestamp, end_timestamp)
         
         if df.empty:
@@ -1612,9 +1813,13 @@ async def get_road_network_metrics():
         }
 
 @router.get("/weekly-passenger-flow", response_model=Dict[str, Any])
-async def get_weekly_passenger_flow_analysis(
+@coalesce("/weekly-passenger-flow")
+@offload
+@persistent_cache("/weekly-passenger-flow")
+def get_weekly_passenger_flow_analysis(
     start_time: float = Query(..., description="开始时间戳（UTC）"),
-    end_time: float = Query(..., description="结束时间戳（UTC）")
+    end_time: float = Query(..., description="结束时间戳（UTC）"),
+    data_processor: TrafficDataProcessor = Depends(get_data_processor)
 ):
     """
     获取周客流量分析数据
@@ -1639,7 +1844,6 @@ async def get_weekly_passenger_flow_analysis(
             }
         
         # 加载数据
-        data_processor = TrafficDataProcessor()
         df = data_processor.load_data(start_time, end_time)
         
         if df.empty:
@@ -1688,4 +1892,123 @@ async def get_weekly_passenger_flow_analysis(
             "success": False,
             "message": f"分析失败: {str(e)}",
             "data": {}
-        }
\ No newline at end of file
+        }
+
+# 后台任务API
+# 耗时分析提交为后台任务：提交后返回任务ID，之后轮询状态和进度、获取结果或取消
+
+def _job_response(job) -> Dict[str, Any]:
+    """任务状态响应"""
+    return {"success": True, "job": job.to_dict()}
+
+@router.post("/jobs/od-analysis")
+async def submit_od_analysis_job(
+    start_time: str,
+    end_time: str,
+    request: ODAnalysisRequest,
+    processor: TrafficDataProcessor = Depends(get_data_processor),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """提交OD分析任务（参数与 /spatiotemporal/od-analysis 相同）"""
+    job = job_manager.submit(
+        "od-analysis",
+        lambda: perform_od_analysis.__wrapped__(
+            start_time=start_time, end_time=end_time, request=request, processor=processor
+        ),
+        {"start_time": start_time, "end_time": end_time, **request.dict()}
+    )
+    return _job_response(job)
+
+@router.post("/jobs/comprehensive")
+async def submit_comprehensive_job(
+    start_time: str,
+    end_time: str,
+    heatmap_request: HeatmapRequest,
+    processor: TrafficDataProcessor = Depends(get_data_processor),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """提交综合时空分析任务（参数与 /spatiotemporal/comprehensive 相同）"""
+    job = job_manager.submit(
+        "comprehensive",
+        lambda: perform_comprehensive_analysis.__wrapped__(
+            start_time=start_time, end_time=end_time, heatmap_request=heatmap_request, processor=processor
+        ),
+        {"start_time": start_time, "end_time": end_time, **heatmap_request.dict()}
+    )
+    return _job_response(job)
+
+@router.post("/jobs/road-analysis")
+async def submit_road_analysis_job(
+    request: RoadAnalysisRequest,
+    data_processor: TrafficDataProcessor = Depends(get_data_processor),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """提交路段分析任务（参数与 /api/road/analysis 相同）"""
+    job = job_manager.submit(
+        "road-analysis",
+        lambda: analyze_road_segments.__wrapped__(request=request, data_processor=data_processor),
+        request.dict()
+    )
+    return _job_response(job)
+
+@router.post("/jobs/clustering-optimize")
+async def submit_clustering_optimize_job(
+    start_time: str,
+    end_time: str,
+    request: ClusteringOptimizeRequest,
+    processor: TrafficDataProcessor = Depends(get_data_processor),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """提交聚类参数优化任务：在指定时间范围的数据上搜索最佳聚类参数"""
+    def run():
+        start_timestamp = convert_time_to_timestamp(start_time)
+        end_timestamp = convert_time_to_timestamp(end_time)
+        report_progress('加载数据')
+        df = processor.load_data(start_timestamp, end_timestamp)
+        if df.empty:
+            raise ValueError("指定时间范围内没有数据")
+        result = processor.optimize_clustering_params(
+            df,
+            data_type=request.data_type,
+            algorithm=request.algorithm,
+            param_ranges=request.param_ranges
+        )
+        return convert_numpy_types(result)
+
+    job = job_manager.submit(
+        "clustering-optimize",
+        run,
+        {"start_time": start_time, "end_time": end_time, **request.dict()}
+    )
+    return _job_response(job)
+
+@router.get("/jobs")
+async def list_jobs(job_manager: JobManager = Depends(get_job_manager)):
+    """列出全部后台任务的状态"""
+    return {"success": True, "jobs": [job.to_dict() for job in job_manager.list()]}
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """查询任务状态和进度（阶段、已处理行数、进度比例）"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """获取已完成任务的结果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    if job.status != "succeeded":
+        return {"success": False, "message": f"任务尚未完成（{job.status}）", "job": job.to_dict()}
+    return {"success": True, "job": job.to_dict(), "result": job.result}
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """取消任务：排队中的任务立即取消，执行中的任务在下一个阶段开始前停止"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return _job_response(job)
@@ -0,0 +1,104 @@
+"""
+相同请求合并（single-flight）
+以接口名和参数的规范化哈希为键，同一时刻到达的相同查询只计算一次，
+其余请求等待这次计算并共享结果，突发的重复请求不再重复扫描数据
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+from pydantic import BaseModel
+
+
+def _canonical(value: Any) -> Any:
+    """把参数值转换为可稳定序列化的形式"""
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, float) and value.is_integer():
+        # 1379030400 与 1379030400.0 视为同一参数
+        return int(value)
+    return value
+
+
+def request_params(kwargs: Dict[str, Any], exclude: tuple = ()) -> Dict[str, Any]:
+    """接口参数中参与计算键的部分：去掉依赖注入对象（数据处理器等非JSON值）和 exclude 中的参数"""
+    return {
+        key: value for key, value in kwargs.items()
+        if key not in exclude and (
+            value is None or isinstance(value, (str, int, float, bool, list, dict, BaseModel))
+        )
+    }
+
+
+def canonical_key(name: str, params: Dict[str, Any]) -> str:
+    """接口名和参数的规范化哈希（参数按名称排序，值统一序列化）"""
+    payload = json.dumps(
+        {'name': name, 'params': {key: _canonical(value) for key, value in params.items()}},
+        sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """进行中的计算表：键相同的并发调用共享同一个计算"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入计算
+
+        Args:
+            key: 请求键
+            factory: 返回协程的函数，只在没有相同键的计算进行中时调用
+
+        Returns:
+            计算结果（异常同样传递给所有等待者）
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # 发起者断开连接时计算继续，其他等待者仍能拿到结果
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """进行中的计算数、发起计算次数和共享结果次数"""
+        return {'inflight': len(self._inflight), 'leaders': self.leaders, 'shared': self.shared}
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """进程内共享的请求合并表"""
+    return _single_flight
+
+
+def coalesce(name: str, exclude: tuple = ()) -> Callable:
+    """
+    接口装饰器：相同接口名和参数的并发请求只执行一次
+
+    参数中的依赖注入对象（数据处理器等非JSON值）和 exclude 中的参数不参与计算键
+
+    Args:
+        name: 接口名（通常为路由路径）
+        exclude: 不参与计算键的参数名
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = canonical_key(name, request_params(kwargs, exclude))
+            return await _single_flight.do(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
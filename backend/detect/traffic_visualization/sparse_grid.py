@@ -0,0 +1,151 @@
+"""
+稀疏网格
+网格以整数单元索引 (round(lat/分辨率), round(lng/分辨率)) 加计数的形式存放，
+保存为 .npz，合并多个网格只需数组拼接和一次按键求和
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .heatmap_engine import COORD_SCALE, cell_indices, count_cells, kernel_density
+
+
+class SparseGrid:
+    """某一分辨率下的稀疏网格计数"""
+
+    def __init__(self, resolution: float, lat_idx: np.ndarray = None,
+                 lng_idx: np.ndarray = None, counts: np.ndarray = None):
+        """
+        初始化稀疏网格
+
+        Args:
+            resolution: 网格分辨率（度）
+            lat_idx: 纬度单元索引
+            lng_idx: 经度单元索引
+            counts: 每个单元的计数
+        """
+        self.resolution = float(resolution)
+        self.lat_idx = np.zeros(0, dtype=np.int32) if lat_idx is None else np.asarray(lat_idx, dtype=np.int32)
+        self.lng_idx = np.zeros(0, dtype=np.int32) if lng_idx is None else np.asarray(lng_idx, dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @staticmethod
+    def _reduce(resolution: float, lat_idx: np.ndarray, lng_idx: np.ndarray,
+                counts: np.ndarray) -> 'SparseGrid':
+        """把可能重复的单元按 (lat_idx, lng_idx) 合并求和"""
+        if len(counts) == 0:
+            return SparseGrid(resolution)
+        return SparseGrid(resolution, *count_cells(lat_idx, lng_idx, counts))
+
+    @classmethod
+    def from_points(cls, lat: np.ndarray, lng: np.ndarray, resolution: float) -> 'SparseGrid':
+        """
+        由经纬度点构建网格计数
+
+        Args:
+            lat: 纬度数组（度）
+            lng: 经度数组（度）
+            resolution: 网格分辨率（度）
+        """
+        lat_idx, lng_idx = cell_indices(lat, lng, resolution)
+        return cls(resolution, *count_cells(lat_idx, lng_idx))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, resolution: float) -> 'SparseGrid':
+        """
+        由交通数据（LAT/LON 为放大 1e5 倍的坐标）构建网格计数，缺少经纬度列时返回空网格
+        """
+        if df.empty or 'LAT' not in df.columns or 'LON' not in df.columns:
+            return cls(resolution)
+        return cls.from_points(
+            df['LAT'].to_numpy(dtype=np.float64) / COORD_SCALE,
+            df['LON'].to_numpy(dtype=np.float64) / COORD_SCALE,
+            resolution
+        )
+
+    @classmethod
+    def combine(cls, grids: Iterable['SparseGrid'], resolution: float) -> 'SparseGrid':
+        """合并多个同分辨率的网格（一次拼接后求和）"""
+        grids = [grid for grid in grids if len(grid)]
+        if any(grid.resolution != float(resolution) for grid in grids):
+            raise ValueError("只能合并相同分辨率的网格")
+        if not grids:
+            return cls(resolution)
+        return cls._reduce(
+            resolution,
+            np.concatenate([grid.lat_idx for grid in grids]),
+            np.concatenate([grid.lng_idx for grid in grids]),
+            np.concatenate([grid.counts for grid in grids]),
+        )
+
+    def __add__(self, other: 'SparseGrid') -> 'SparseGrid':
+        return SparseGrid.combine([self, other], self.resolution)
+
+    def total(self) -> int:
+        """总计数"""
+        return int(self.counts.sum())
+
+    def filter(self, min_count: int) -> 'SparseGrid':
+        """只保留计数不低于 min_count 的单元"""
+        keep = self.counts >= min_count
+        return SparseGrid(self.resolution, self.lat_idx[keep], self.lng_idx[keep], self.counts[keep])
+
+    def top(self, n: int) -> 'SparseGrid':
+        """计数最高的 n 个单元（按计数从高到低，计数相同保持原顺序）"""
+        if len(self) <= n:
+            return self
+        order = np.argsort(-self.counts, kind='stable')[:n]
+        return SparseGrid(self.resolution, self.lat_idx[order], self.lng_idx[order], self.counts[order])
+
+    def to_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """返回网格中心的 (纬度, 经度, 计数) 数组"""
+        return self.lat_idx * self.resolution, self.lng_idx * self.resolution, self.counts
+
+    def to_records(self, value_key: str = 'count') -> List[Dict[str, Any]]:
+        """转换为热力图点字典列表 [{'lat', 'lng', value_key}]，用于接口响应"""
+        lats, lngs, counts = self.to_points()
+        return [
+            {'lat': lat, 'lng': lng, value_key: count}
+            for lat, lng, count in zip(lats.tolist(), lngs.tolist(), counts.tolist())
+        ]
+
+    def kde_records(self, bandwidth: float, stride: int = 1, threshold: float = 0.05) -> List[Dict[str, Any]]:
+        """
+        核密度估计的热力图点字典列表 [{'lat', 'lng', 'count', 'intensity'}]
+
+        Args:
+            bandwidth: 高斯核带宽（度）
+            stride: 输出分辨率相对本网格分辨率的倍数
+            threshold: 相对最大密度的阈值，低于此值的单元不返回
+
+        Returns:
+            输出网格（分辨率为 resolution * stride）的点，intensity 为每个单元的期望点数，count 为其四舍五入值
+        """
+        output_resolution = self.resolution * stride
+        lat_idx, lng_idx, density = kernel_density(
+            self.lat_idx, self.lng_idx, self.counts, bandwidth / self.resolution, stride, threshold
+        )
+        return [
+            {'lat': lat, 'lng': lng, 'count': int(round(value)), 'intensity': value}
+            for lat, lng, value in zip((lat_idx * output_resolution).tolist(),
+                                       (lng_idx * output_resolution).tolist(), density.tolist())
+        ]
+
+    def save(self, path: str):
+        """保存为 .npz（先写临时文件再替换）"""
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, resolution=self.resolution, lat_idx=self.lat_idx,
+                 lng_idx=self.lng_idx, counts=self.counts)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SparseGrid':
+        """从 .npz 加载"""
+        with np.load(path) as arrays:
+            return cls(float(arrays['resolution']), arrays['lat_idx'], arrays['lng_idx'], arrays['counts'])
@@ -0,0 +1,90 @@
+"""
+流式累加器
+逐批消费 TrafficDataProcessor.iter_chunks 产生的数据块，内存占用与数据总量无关
+"""
+
+from typing import Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+from .sparse_grid import SparseGrid
+
+# 时间分组方式 -> 显示格式
+TIME_GROUP_FORMATS = {
+    'hour': '{:02d}时',
+    'day': '{:02d}日',
+    'week': '第{:02d}周',
+    'month': '{:02d}月',
+}
+
+
+def time_groups(utc: pd.Series, group_by: str) -> np.ndarray:
+    """计算每行所属的时间分组（与 calculate_statistics 的分组方式一致）"""
+    if group_by not in TIME_GROUP_FORMATS or group_by == 'hour':
+        return (utc.to_numpy() // 3600 % 24).astype(np.int64)
+    datetimes = pd.to_datetime(utc, unit='s')
+    if group_by == 'day':
+        return datetimes.dt.day.to_numpy()
+    if group_by == 'week':
+        return datetimes.dt.isocalendar().week.to_numpy().astype(np.int64)
+    return datetimes.dt.month.to_numpy()
+
+
+class HeatmapAccumulator:
+    """流式热力图网格计数，网格划分与 generate_heatmap_data 相同"""
+
+    def __init__(self, resolution: float = 0.001):
+        self.resolution = resolution
+        self.grid = SparseGrid(resolution)
+
+    def update(self, chunk: pd.DataFrame):
+        """累加一个数据块"""
+        if chunk.empty:
+            return
+        self.grid += SparseGrid.from_frame(chunk, self.resolution)
+
+    def result(self) -> List[Dict[str, Any]]:
+        """热力图点字典列表"""
+        return self.grid.to_records()
+
+
+class SpeedAnomalyCounter:
+    """流式统计速度异常点数，阈值和严重程度划分与 _detect_speed_anomalies 相同"""
+
+    def __init__(self, low_threshold: float = 5, high_threshold: float = 80):
+        self.low_threshold = low_threshold
+        self.high_threshold = high_threshold
+        self.total_points = 0
+        self.counts = {'low_speed': 0, 'high_speed': 0}
+        self.severity = {'low': 0, 'medium': 0, 'high': 0}
+
+    def update(self, chunk: pd.DataFrame):
+        """累加一个数据块"""
+        if chunk.empty or 'SPEED' not in chunk.columns:
+            return
+        self.total_points += len(chunk)
+        speed = chunk['SPEED'].to_numpy(dtype=np.float64)
+        # 缺失值和速度为0的点不参与判断
+        speed = speed[~np.isnan(speed) & (speed != 0)]
+
+        low = speed[speed < self.low_threshold]
+        high = speed[speed > self.high_threshold]
+        self.counts['low_speed'] += len(low)
+        self.counts['high_speed'] += len(high)
+
+        low_medium = int((low < 2).sum())
+        high_high = int((high > 100).sum())
+        self.severity['medium'] += low_medium + (len(high) - high_high)
+        self.severity['low'] += len(low) - low_medium
+        self.severity['high'] += high_high
+
+    def result(self) -> Dict[str, Any]:
+        """异常计数结果"""
+        return {
+            'total_points': self.total_points,
+            'total_anomalies': sum(self.counts.values()),
+            'by_type': dict(self.counts),
+            'by_severity': dict(self.severity),
+            'thresholds': {'low': self.low_threshold, 'high': self.high_threshold},
+        }
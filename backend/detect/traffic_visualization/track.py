@@ -9,9 +9,14 @@ from .data_processor import TrafficDataProcessor
 class TrackAnalyzer:
     """轨迹分析类，提供轨迹查询和分析功能"""
     
-    def __init__(self):
-        """初始化轨迹分析器"""
-        self.data_processor = TrafficDataProcessor()
+    def __init__(self, data_processor: TrafficDataProcessor = None):
+        """
+        初始化轨迹分析器
+        
+        Args:
+            data_processor: 共享的数据处理器，为None时单独创建一个
+        """
+        self.data_processor = data_processor or TrafficDataProcessor()
     
     def query_track(self, start_time: float, end_time: float, vehicle_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
@@ -26,7 +31,7 @@ class TrackAnalyzer:
             轨迹数据列表
         """
         # 加载数据
-        df = self.data_processor.load_data(start_time, end_time, vehicle_id)
+        df = self.data_processor.load_data(start_time, end_time, vehicle_id, full_rows=True)
         
         if df.empty:
             return []
@@ -0,0 +1,139 @@
+"""
+车辆ID字典
+在导入时为每个车辆ID分配连续的 int32 编码，内部的分组、去重计数、车辆索引都基于整数编码，
+只在接口返回时解码为字符串
+"""
+
+import os
+import json
+import threading
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 字典文件名（位于数据目录下）
+DICTIONARY_FILENAME = 'vehicle_dictionary.json'
+
+
+class VehicleDictionary:
+    """车辆ID字符串与 int32 编码之间的双向映射，编码即 ids 列表中的下标"""
+
+    def __init__(self, ids: Iterable[str] = ()):
+        self._ids: List[str] = []
+        self._codes = {}
+        self._categories = None
+        # 分析任务在线程池中并发执行，追加新ID需要加锁以保证编码唯一
+        self._lock = threading.Lock()
+        self.add(ids)
+
+    @staticmethod
+    def default_path(data_dir: str) -> str:
+        """数据目录下的字典文件路径"""
+        return os.path.join(data_dir, DICTIONARY_FILENAME)
+
+    @classmethod
+    def load(cls, path: str) -> 'VehicleDictionary':
+        """从文件加载字典，文件不存在时返回空字典"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def save(self, path: str):
+        """保存字典（先写临时文件再替换）"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._ids, f)
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, vehicle_id) -> bool:
+        return str(vehicle_id) in self._codes
+
+    @property
+    def ids(self) -> List[str]:
+        """按编码顺序排列的车辆ID"""
+        return self._ids
+
+    @property
+    def categories(self) -> pd.Index:
+        """按编码顺序排列的车辆ID索引，用作 Categorical 的类别"""
+        categories = self._categories
+        if categories is None:
+            with self._lock:
+                if self._categories is None:
+                    self._categories = pd.Index(self._ids, dtype=object)
+                categories = self._categories
+        return categories
+
+    def add(self, ids: Iterable[str]) -> int:
+        """
+        加入新的车辆ID，已有ID的编码保持不变，新ID按字符串顺序追加
+
+        Returns:
+            新增的车辆数
+        """
+        candidates = {str(v) for v in ids}
+        if candidates <= self._codes.keys():
+            return 0
+        with self._lock:
+            new_ids = sorted(candidates - self._codes.keys())
+            for vehicle_id in new_ids:
+                self._codes[vehicle_id] = len(self._ids)
+                self._ids.append(vehicle_id)
+            if new_ids:
+                self._categories = None
+        return len(new_ids)
+
+    def code_of(self, vehicle_id) -> Optional[int]:
+        """单个车辆ID的编码，不存在时返回None"""
+        return self._codes.get(str(vehicle_id))
+
+    def encode(self, ids) -> np.ndarray:
+        """
+        向量化编码车辆ID
+
+        Args:
+            ids: 车辆ID数组或Series
+
+        Returns:
+            int32 编码数组，未知ID编码为 -1
+        """
+        values = pd.Series(ids).astype(str).to_numpy()
+        return self.categories.get_indexer(values).astype(np.int32)
+
+    def decode(self, codes) -> np.ndarray:
+        """将编码数组解码为车辆ID字符串数组"""
+        return np.asarray(self._ids, dtype=object)[np.asarray(codes)]
+
+    def to_categorical(self, codes: np.ndarray) -> pd.Categorical:
+        """以编码构造 Categorical，类别为整个字典（编码不会被重新分配）"""
+        return pd.Categorical.from_codes(np.asarray(codes), categories=self.categories)
+
+    def categorize(self, ids, extend: bool = True) -> pd.Categorical:
+        """
+        把车辆ID转换为以本字典为类别的 Categorical
+
+        先在局部做一次因子化，只对去重后的ID查字典，再把局部编码映射为字典编码；
+        输入本身是 Categorical（如Parquet字典列）时直接复用其编码
+
+        Args:
+            ids: 车辆ID数组、Series 或 Categorical
+            extend: 是否把未知ID加入字典（只在内存中，不写回文件）
+
+        Returns:
+            Categorical，其 codes 即字典编码
+        """
+        if isinstance(getattr(ids, 'dtype', None), pd.CategoricalDtype):
+            local = pd.Categorical(ids)
+            local_codes, uniques = local.codes, local.categories.astype(str)
+        else:
+            local_codes, uniques = pd.factorize(pd.Series(ids).astype(str))
+        if extend:
+            self.add(uniques)
+        # 末尾追加 -1，使缺失值的局部编码 -1 仍映射为 -1
+        mapping = np.append(self.categories.get_indexer(uniques), -1).astype(np.int32)
+        return self.to_categorical(mapping[local_codes])
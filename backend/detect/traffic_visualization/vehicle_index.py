@@ -0,0 +1,132 @@
+"""
+按车辆排序的数据布局工具
+数据按 (COMMADDR, UTC) 排好序后，每辆车的轨迹是一段连续的行区间，
+逐车处理只需按偏移量切片，不再需要 groupby 哈希和逐组排序
+"""
+
+from typing import Iterator, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+# DataFrame.attrs 中记录排序方式的键
+SORTED_BY_ATTR = 'sorted_by'
+VEHICLE_SORT_KEYS = ['COMMADDR', 'UTC']
+
+
+def vehicle_offsets(vehicle_ids: np.ndarray) -> np.ndarray:
+    """
+    计算已按车辆排序的车辆ID数组中每辆车的起止偏移
+
+    Args:
+        vehicle_ids: 已按车辆排序的车辆ID数组
+
+    Returns:
+        长度为 车辆数+1 的偏移数组，第i辆车的行区间为 [offsets[i], offsets[i+1])
+    """
+    n = len(vehicle_ids)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    boundaries = np.flatnonzero(vehicle_ids[1:] != vehicle_ids[:-1]) + 1
+    return np.concatenate(([0], boundaries, [n])).astype(np.int64)
+
+
+def vehicle_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    车辆列的整数键：COMMADDR 为字典编码的 Categorical 时直接返回 int32 编码，
+    否则返回原始值
+    """
+    column = df['COMMADDR']
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return column.to_numpy()
+
+
+def select_vehicle(df: pd.DataFrame, vehicle_id) -> pd.DataFrame:
+    """
+    筛选单辆车的数据
+
+    字典编码的车辆列只做一次类别查找，再在整数编码上比较，不再整列转换为字符串
+
+    Args:
+        df: 交通数据DataFrame
+        vehicle_id: 车辆ID
+
+    Returns:
+        该车辆的数据（保留原有排序标记）
+    """
+    column = df['COMMADDR']
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        code = column.cat.categories.get_indexer([str(vehicle_id)])[0]
+        mask = column.cat.codes.to_numpy() == code if code >= 0 else np.zeros(len(df), dtype=bool)
+    else:
+        mask = column.astype(str).to_numpy() == str(vehicle_id)
+    result = df[mask]
+    result.attrs = dict(df.attrs)
+    return result
+
+
+def is_vehicle_sorted(df: pd.DataFrame) -> bool:
+    """
+    DataFrame 是否已标记为按 (COMMADDR, UTC) 排序
+
+    pandas 在排序、筛选等操作后会保留 attrs，标记可能已经过时；
+    因此有标记时再对车辆键和UTC做一次向量化的单调性检查（O(n)，远低于重新排序）
+    """
+    if df.attrs.get(SORTED_BY_ATTR) != VEHICLE_SORT_KEYS:
+        return False
+    if len(df) < 2:
+        return True
+    keys = vehicle_keys(df)
+    if not np.all(keys[1:] >= keys[:-1]):
+        return False
+    if 'UTC' not in df.columns:
+        return True
+    utc = df['UTC'].to_numpy()
+    same_vehicle = keys[1:] == keys[:-1]
+    return bool(np.all(utc[1:][same_vehicle] >= utc[:-1][same_vehicle]))
+
+
+def mark_vehicle_sorted(df: pd.DataFrame) -> pd.DataFrame:
+    """标记 DataFrame 已按 (COMMADDR, UTC) 排序"""
+    df.attrs[SORTED_BY_ATTR] = list(VEHICLE_SORT_KEYS)
+    return df
+
+
+def ensure_vehicle_sorted(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    返回按 (COMMADDR, UTC) 排序的数据
+
+    已排序的数据（如来自列存储）直接返回，否则整体排序一次；
+    字典编码的车辆列按编码顺序排序
+    """
+    if is_vehicle_sorted(df):
+        return df
+    sorted_df = df.sort_values(VEHICLE_SORT_KEYS, kind='stable').reset_index(drop=True)
+    return mark_vehicle_sorted(sorted_df)
+
+
+def iter_vehicle_groups(df: pd.DataFrame) -> Iterator[Tuple[Any, pd.DataFrame]]:
+    """
+    按车辆遍历数据，每辆车返回一段按UTC排序的连续切片
+
+    Args:
+        df: 交通数据DataFrame
+
+    Yields:
+        (车辆ID字符串, 该车辆的数据切片)
+    """
+    if df.empty:
+        return
+    df = ensure_vehicle_sorted(df)
+    keys = vehicle_keys(df)
+    offsets = vehicle_offsets(keys)
+    column = df['COMMADDR']
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # 只对每辆车的编码解码一次
+        categories = column.cat.categories
+        decode = lambda key: str(categories[key])
+    else:
+        decode = str
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        yield decode(keys[start]), df.iloc[start:end]
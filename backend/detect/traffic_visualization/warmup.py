@@ -0,0 +1,128 @@
+"""
+交通数据预热
+按预热配置的 traffic 一节，在服务启动后预加载热点时间窗口的数据（进入内存缓存），
+并以与真实请求相同的参数调用接口函数，预先计算热力图和分析结果（进入持久化结果缓存）
+
+配置示例：
+
+    {
+        "windows": [{"start": "2013-09-13T08:00:00", "end": "2013-09-13T10:00:00"}, {"last_hours": 6}],
+        "heatmap_resolutions": [0.001, 0.005],
+        "analyses": [
+            {"path": "/stats", "params": {"group_by": "hour"}},
+            {"path": "/spatiotemporal/dynamic-heatmap", "params": {"temporal_resolution": 15}},
+            {"path": "/spatiotemporal/od-analysis", "params": {"request": {"min_trip_duration": 60}}}
+        ]
+    }
+
+- windows: 时间窗口，start/end 为时间戳或 ISO 时间字符串；last_hours 表示数据集最后 N 小时
+- heatmap_resolutions: 对每个窗口预先计算 /heatmap 的分辨率
+- analyses: 对每个窗口预先计算的接口（路由路径）及其参数，请求体参数以参数名为键给出
+"""
+
+import asyncio
+import datetime
+import inspect
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import params as fastapi_params
+from pydantic import BaseModel
+from pydantic.fields import FieldInfo
+
+from .dataset_service import get_data_processor
+from .data_processor import TrafficDataProcessor
+
+TimeWindow = Tuple[float, float, str, str]
+
+
+def _to_timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    # 与 service.convert_time_to_timestamp 一致：不带时区的时间按本地时间解析
+    return datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+def _to_iso(timestamp: float) -> str:
+    # 与前端传入的时间格式一致（YYYY-MM-DDTHH:MM:SS）
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def resolve_windows(processor: TrafficDataProcessor, windows: List[Dict[str, Any]]) -> List[TimeWindow]:
+    """
+    把窗口配置解析为 (开始时间戳, 结束时间戳, 开始ISO时间, 结束ISO时间)
+
+    以 ISO 字符串配置的窗口保留原字符串，预先计算的结果与前端用相同字符串发出的请求命中同一缓存键
+    """
+    resolved = []
+    for window in windows:
+        if 'last_hours' in window:
+            time_range = processor.get_time_range()
+            if time_range is None:
+                print(f"数据集时间范围未知，跳过预热窗口: {window}")
+                continue
+            end = float(time_range[1])
+            start = max(float(time_range[0]), end - float(window['last_hours']) * 3600)
+            resolved.append((start, end, _to_iso(start), _to_iso(end)))
+            continue
+        start, end = _to_timestamp(window['start']), _to_timestamp(window['end'])
+        start_iso = window['start'] if isinstance(window['start'], str) else _to_iso(start)
+        end_iso = window['end'] if isinstance(window['end'], str) else _to_iso(end)
+        resolved.append((start, end, start_iso, end_iso))
+    return resolved
+
+
+def _endpoint(path: str) -> Callable:
+    """按路由路径找到接口，返回最内层的同步函数（带持久化结果缓存，不经过执行器和请求合并）"""
+    from .service import router
+
+    for route in router.routes:
+        if getattr(route, 'path', None) == path:
+            return inspect.unwrap(route.endpoint, stop=lambda f: not asyncio.iscoroutinefunction(f))
+    raise ValueError(f"未知的接口: {path}")
+
+
+def call_endpoint(path: str, window: TimeWindow, params: Dict[str, Any],
+                  processor: TrafficDataProcessor) -> Any:
+    """
+    以与真实请求相同的参数调用接口：时间按参数类型传时间戳或 ISO 字符串，
+    未给出的查询参数使用接口的默认值，请求体参数由字典构造，依赖注入参数传共享的数据处理器
+    """
+    func = _endpoint(path)
+    start, end, start_iso, end_iso = window
+    kwargs = {}
+    for name, param in inspect.signature(func).parameters.items():
+        default = param.default
+        if isinstance(default, fastapi_params.Depends):
+            kwargs[name] = processor
+        elif name in ('start_time', 'end_time'):
+            is_str = param.annotation is str
+            kwargs[name] = (start_iso if is_str else start) if name == 'start_time' else (end_iso if is_str else end)
+        elif inspect.isclass(param.annotation) and issubclass(param.annotation, BaseModel):
+            kwargs[name] = param.annotation(**params.get(name, {}))
+        elif name in params:
+            kwargs[name] = params[name]
+        elif isinstance(default, FieldInfo):
+            kwargs[name] = default.default
+        elif default is not inspect.Parameter.empty:
+            kwargs[name] = default
+        else:
+            raise ValueError(f"接口 {path} 缺少参数: {name}")
+    return func(**kwargs)
+
+
+def warmup(config: Dict[str, Any]):
+    """执行交通数据预热"""
+    processor = get_data_processor()
+    windows = resolve_windows(processor, config.get('windows', []))
+    analyses = [{'path': '/heatmap', 'params': {'resolution': resolution}}
+                for resolution in config.get('heatmap_resolutions', [])]
+    analyses += [item if isinstance(item, dict) else {'path': item} for item in config.get('analyses', [])]
+
+    for window in windows:
+        print(f"预热时间窗口: {window[2]} ~ {window[3]}")
+        processor.load_data(window[0], window[1])
+        for analysis in analyses:
+            try:
+                call_endpoint(analysis['path'], window, analysis.get('params', {}), processor)
+            except Exception as e:
+                print(f"预热 {analysis['path']} 失败: {str(e)}")
@@ -1,8 +1,18 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from detect.routes import router as detect_router
-from app.api import user, log, road, traffic, face, admin # Import all routers
-from database.database import Base, engine
+from app.core import startup
+from app.core.startup import phase
+
+with phase("导入 FastAPI"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+
+# --- 导入路由（各阶段耗时计入启动报告，重型依赖在首次使用时才加载）---
+with phase("导入检测模块路由"):
+    from detect.routes import router as detect_router
+with phase("导入业务模块路由"):
+    from app.api import user, log, road, traffic, face, admin # Import all routers
+with phase("初始化数据库引擎"):
+    from database.database import Base, engine
 
 
 app = FastAPI()
@@ -29,6 +39,26 @@ app.include_router(traffic.router, prefix="/api/traffic", tags=["traffic"])
 app.include_router(face.router, prefix="/api/face", tags=["face"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
+# --- 启动耗时 ---
+@app.on_event("startup")
+async def on_startup():
+    """记录启动耗时，按预热配置在后台预热模块、模型和热点数据"""
+    startup.mark_started()
+
+@app.get("/api/startup-report", tags=["system"])
+async def get_startup_report():
+    """
+    启动耗时报告：启动总耗时、各启动阶段耗时、首次使用时延迟加载的模块和模型耗时以及后台预热情况。
+    """
+    return startup.startup_report()
+
+@app.get("/api/ready", tags=["system"])
+async def get_readiness():
+    """
+    就绪检查：预热完成前返回 503，供负载均衡判断是否向该 worker 转发流量。
+    """
+    return JSONResponse(startup.readiness(), status_code=200 if startup.is_ready() else 503)
+
 # --- 启动服务 ---
 if __name__ == "__main__":
     import uvicorn